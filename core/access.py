@@ -0,0 +1,139 @@
+from django.utils.functional import cached_property
+
+
+class AccessScope:
+    """
+    What the request's user may see, as plain ids: role, school id, teacher
+    access level and, for teachers, the ids of their assigned classes.
+
+    Built once per request by get_access_scope() and shared by permission
+    classes, querysets and caches, so none of them load `teacher_profile`,
+    `obj.school.admin` or the school itself. Each part is looked up the
+    first time it is needed (at most one query each).
+    """
+
+    def __init__(self, user, school=None):
+        self.user = user
+        self._school = school
+
+    @property
+    def is_authenticated(self):
+        return bool(self.user and self.user.is_authenticated)
+
+    @property
+    def role(self):
+        return self.user.role if self.is_authenticated else None
+
+    @property
+    def is_superuser(self):
+        return self.is_authenticated and self.user.is_superuser
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    @property
+    def is_teacher(self):
+        return self.role == 'teacher'
+
+    @cached_property
+    def _teacher(self):
+        # (teacher id, school id, access level) or None
+        if not self.is_teacher:
+            return None
+        from teachers.models import Teacher
+        return Teacher.objects.filter(user_id=self.user.pk).values_list(
+            'id', 'school_id', 'access_level'
+        ).first()
+
+    @property
+    def teacher_id(self):
+        return self._teacher[0] if self._teacher else None
+
+    @property
+    def access_level(self):
+        return self._teacher[2] if self._teacher else None
+
+    @cached_property
+    def school_id(self):
+        if not self.is_authenticated:
+            return None
+        if self._school is not None:
+            return self._school.id
+        if self._teacher:
+            return self._teacher[1]
+        if self.role == 'student':
+            from students.models import Student
+            return Student.objects.filter(user_id=self.user.pk).values_list('school_id', flat=True).first()
+        from schools.models import School
+        return School.objects.filter(admin_id=self.user.pk).values_list('id', flat=True).first()
+
+    @cached_property
+    def class_ids(self):
+        """Ids of the classes assigned to the teacher (empty for everyone else)."""
+        if self.teacher_id is None:
+            return frozenset()
+        from teachers.models import TeacherClassAssignment
+        return frozenset(
+            TeacherClassAssignment.objects.filter(teacher_id=self.teacher_id)
+            .values_list('assigned_class_id', flat=True)
+        )
+
+    @property
+    def is_class_only(self):
+        return self.access_level == 'class_only'
+
+    def can_see_class(self, class_id):
+        """Class-only teachers see their own classes; everyone else the whole school."""
+        return not self.is_class_only or class_id in self.class_ids
+
+    def administers(self, school_id):
+        return self.is_admin and school_id is not None and school_id == self.school_id
+
+    @property
+    def cache_key(self):
+        """
+        The part of the scope that changes what an endpoint returns.
+        Users with the same key in the same school share cached responses.
+        """
+        if self.is_superuser:
+            return 'superuser'
+        if self.is_teacher:
+            if self._teacher is None:
+                return 'teacher'
+            if self.is_class_only:
+                # Sees only their own classes, so nothing to share
+                return f'teacher:class_only:{self.teacher_id}'
+            return f'teacher:{self.access_level}'
+        return self.role
+
+
+def get_object_school_id(obj):
+    """
+    School id of a model instance, read from foreign key ids. Attendance
+    records go through their student/teacher, so their querysets should
+    select_related() it.
+    """
+    if hasattr(obj, 'school_id'):
+        return obj.school_id
+    for relation in ('student', 'teacher'):
+        related = getattr(obj, relation, None)
+        if related is not None:
+            return related.school_id
+    return None
+
+
+def get_access_scope(request):
+    """
+    The request's AccessScope, created on first use. Accepts a DRF Request or
+    a Django HttpRequest; both share the same scope.
+    """
+    http_request = getattr(request, '_request', request)
+    scope = getattr(http_request, '_access_scope', None)
+    user = request.user
+    # DRF replaces the middleware's lazy user with its own instance; the
+    # scope only depends on who the user is
+    if scope is None or getattr(scope.user, 'pk', None) != getattr(user, 'pk', None):
+        scope = AccessScope(user, school=getattr(http_request, 'school', None))
+        http_request._access_scope = scope
+    return scope
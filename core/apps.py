@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Connect the caches, the invalidation bus, the sync tombstones and the
+        # live attendance feed to school_data_changed
+        from . import authentication, autocomplete, bus, cache, live, sync, tokens  # noqa: F401
+        from . import checks  # noqa: F401
@@ -0,0 +1,255 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from core.bus import invalidation_bus
+from core.signals import school_data_changed
+
+
+class AuthUserCache:
+    """
+    Bounded, TTL'd per-worker cache of authenticated users.
+
+    Users are kept as their column values and rebuilt into a fresh instance
+    on every hit, so requests never share (and mutate) one User object.
+    API tokens map by digest to a user id. Entries are dropped when the
+    user changes (password, is_active, role...), their token is deleted or
+    they log out, in every worker through the invalidation bus; the TTL
+    bounds staleness for writes that bypass signals (queryset.update()).
+    Without a cross-worker bus, other workers' changes only show up when
+    entries expire, so the TTL is capped at AUTH_USER_CACHE_LOCAL_TTL.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._users = OrderedDict()
+        self._tokens = OrderedDict()
+        self._token_digests = {}
+        # Bumped by every invalidation so a load that raced one isn't stored
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_entries(self):
+        if self._max_entries is None:
+            return getattr(settings, 'AUTH_USER_CACHE_MAX_ENTRIES', 10000)
+        return self._max_entries
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        ttl = getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+        if not invalidation_bus.transport.enabled:
+            # Deactivations and password changes in other workers never reach
+            # this one; reload the user from the database this often instead
+            ttl = min(ttl, getattr(settings, 'AUTH_USER_CACHE_LOCAL_TTL', 5))
+        return ttl
+
+    @staticmethod
+    def _fields():
+        return [field.attname for field in get_user_model()._meta.concrete_fields]
+
+    @staticmethod
+    def token_digest(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _get(self, entries, key):
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            entries.pop(key, None)
+            return None
+        entries.move_to_end(key)
+        return value
+
+    def _put(self, entries, key, value):
+        entries[key] = (time.monotonic() + self.ttl, value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def _build(self, values):
+        User = get_user_model()
+        return User.from_db('default', self._fields(), values)
+
+    def _store_user(self, user, generation):
+        values = tuple(getattr(user, field) for field in self._fields())
+        with self._lock:
+            if generation == self._generation:
+                self._put(self._users, user.pk, values)
+
+    def get_user(self, user_id):
+        """The user with this pk, or None if there is none."""
+        with self._lock:
+            values = self._get(self._users, user_id)
+            generation = self._generation
+        if values is not None:
+            return self._build(values)
+
+        User = get_user_model()
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            self._store_user(user, generation)
+        return user
+
+    def get_token_user(self, key):
+        """The user owning this API token key, or None if the key is unknown."""
+        digest = self.token_digest(key)
+        with self._lock:
+            user_id = self._get(self._tokens, digest)
+            generation = self._generation
+        if user_id is not None:
+            return self.get_user(user_id)
+
+        token = Token.objects.select_related('user').filter(key=key).first()
+        if token is None:
+            return None
+        with self._lock:
+            if generation == self._generation:
+                self._put(self._tokens, digest, token.user_id)
+                self._token_digests.setdefault(token.user_id, set()).add(digest)
+        self._store_user(token.user, generation)
+        return token.user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._users.pop(user_id, None)
+            for digest in self._token_digests.pop(user_id, ()):
+                self._tokens.pop(digest, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._users.clear()
+            self._tokens.clear()
+            self._token_digests.clear()
+
+
+auth_user_cache = AuthUserCache()
+
+
+class ReuseMiddlewareAuthMixin:
+    """
+    Reuse the result get_api_user() already produced for this request in
+    middleware, so the credentials aren't checked twice.
+    """
+
+    def authenticate(self, request):
+        resolved = getattr(getattr(request, '_request', request), '_api_auth', None)
+        if resolved is not None and resolved[0] is type(self):
+            return resolved[1]
+        return super().authenticate(request)
+
+
+class CachedJWTAuthentication(ReuseMiddlewareAuthMixin, JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from auth_user_cache
+    instead of querying the users table on every request.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_FIELD != get_user_model()._meta.pk.name:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = auth_user_cache.get_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+class CachedTokenAuthentication(ReuseMiddlewareAuthMixin, TokenAuthentication):
+    """
+    TokenAuthentication that resolves the token's user from auth_user_cache,
+    keyed by a digest of the token, instead of joining authtoken_token and
+    the users table on every request.
+    """
+
+    def authenticate_credentials(self, key):
+        user = auth_user_cache.get_token_user(key)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, Token(key=key, user=user))
+
+
+def get_api_user(request):
+    """
+    The user the DRF authentication classes resolve for a plain Django
+    request, or AnonymousUser. Errors are left for the view to report.
+    """
+    for authentication_class in drf_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except exceptions.APIException:
+            return AnonymousUser()
+        if result is not None:
+            request._api_auth = (authentication_class, result)
+            return result[0]
+    return AnonymousUser()
+
+
+def forget_user(user_id):
+    """
+    Drop a user from the auth cache of every worker, e.g. on logout, when
+    nothing about the user row itself changed.
+    """
+    school_data_changed.send(
+        sender=get_user_model(), pk=user_id, school_id=None, deleted=False, instance=None
+    )
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    forget_user(instance.user_id)
+
+
+@receiver(school_data_changed)
+def invalidate_auth_user(sender, pk, **kwargs):
+    if sender is not get_user_model():
+        return
+    # Now, and again after commit so a request that reloaded the user in
+    # between doesn't keep the old row
+    auth_user_cache.invalidate(pk)
+    transaction.on_commit(lambda: auth_user_cache.invalidate(pk))
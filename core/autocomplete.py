@@ -0,0 +1,203 @@
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import receiver
+
+from core.signals import school_data_changed
+from core.utils import normalize_text as normalize
+
+
+def _student_entry(row):
+    label = f"{row['first_name']} {row['last_name']}"
+    return label, row['registration_number'], {'class_id': row['class_assigned_id']}
+
+
+def _teacher_entry(row):
+    label = f"{row['first_name']} {row['last_name']}"
+    return label, row['employee_id'], {}
+
+
+def _class_entry(row):
+    return row['class_name'], None, {'class_id': row['pk']}
+
+
+# model label -> (result type, columns to load, entry builder)
+INDEXED_MODELS = {
+    'students.Student': (
+        'student', ('first_name', 'last_name', 'registration_number', 'class_assigned_id'), _student_entry
+    ),
+    'teachers.Teacher': ('teacher', ('first_name', 'last_name', 'employee_id'), _teacher_entry),
+    'students.Class': ('class', ('class_name',), _class_entry),
+}
+
+RESULT_TYPES = {kind for kind, _, _ in INDEXED_MODELS.values()}
+
+
+class PrefixIndex:
+    """
+    Sorted array of (term, type, pk) tuples for one school.
+
+    Every record is indexed under its full label, each word of the label and
+    its detail value (registration number, employee id), so "doe", "john d"
+    and "stu/20" all find the same student.
+    """
+
+    def __init__(self):
+        self._terms = []
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, kind, pk, custom_id, label, detail=None, extra=None):
+        terms = {normalize(label), normalize(detail)}
+        terms.update(normalize(label).split())
+        terms.discard('')
+        result = {'type': kind, 'id': pk, 'custom_id': custom_id, 'label': label, 'detail': detail}
+        with self._lock:
+            self.remove(kind, pk)
+            self._entries[(kind, pk)] = (result, extra or {}, terms)
+            for term in terms:
+                insort(self._terms, (term, kind, pk))
+
+    def remove(self, kind, pk):
+        with self._lock:
+            entry = self._entries.pop((kind, pk), None)
+            if entry is None:
+                return
+            for term in entry[2]:
+                position = bisect_left(self._terms, (term, kind, pk))
+                if position < len(self._terms) and self._terms[position] == (term, kind, pk):
+                    del self._terms[position]
+
+    def search(self, query, types=None, limit=10, predicate=None):
+        query = normalize(query)
+        if not query:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._terms, (query,))
+            while position < len(self._terms) and len(results) < limit:
+                term, kind, pk = self._terms[position]
+                position += 1
+                if not term.startswith(query):
+                    break
+                if (kind, pk) in seen or (types and kind not in types):
+                    continue
+                seen.add((kind, pk))
+                result, extra, _ = self._entries[(kind, pk)]
+                if predicate is not None and not predicate(kind, extra):
+                    continue
+                results.append(dict(result))
+        return results
+
+
+def build_index(school_id):
+    """Load the searchable columns of one school into a new PrefixIndex."""
+    from django.apps import apps
+
+    index = PrefixIndex()
+    for model_label, (kind, columns, build_entry) in INDEXED_MODELS.items():
+        model = apps.get_model(model_label)
+        rows = model.objects.filter(school_id=school_id).values('pk', 'custom_id', *columns)
+        for row in rows.iterator(chunk_size=2000):
+            label, detail, extra = build_entry(row)
+            index.add(kind, row['pk'], row['custom_id'], label, detail, extra)
+    return index
+
+
+class AutocompleteRegistry:
+    """
+    Per-school prefix indexes, built on first use and kept in a bounded LRU
+    so memory stays flat however many schools a worker has served.
+    """
+
+    def __init__(self, max_schools=None):
+        self._max_schools = max_schools
+        self._indexes = OrderedDict()
+        self._building = set()
+        self._stale = set()
+        self._lock = threading.Lock()
+
+    @property
+    def max_schools(self):
+        if self._max_schools is None:
+            return getattr(settings, 'AUTOCOMPLETE_MAX_SCHOOLS', 100)
+        return self._max_schools
+
+    def get_index(self, school_id):
+        with self._lock:
+            index = self._indexes.get(school_id)
+            if index is not None:
+                self._indexes.move_to_end(school_id)
+                return index
+            self._building.add(school_id)
+            self._stale.discard(school_id)
+
+        try:
+            index = build_index(school_id)
+        finally:
+            with self._lock:
+                self._building.discard(school_id)
+
+        with self._lock:
+            # A change that landed while we were loading may be missing from
+            # the new index; serve it once but build a fresh one next time.
+            if school_id in self._stale:
+                self._stale.discard(school_id)
+                return index
+            self._indexes[school_id] = index
+            self._indexes.move_to_end(school_id)
+            while len(self._indexes) > self.max_schools:
+                self._indexes.popitem(last=False)
+        return self._indexes.get(school_id, index)
+
+    def search(self, school_id, query, types=None, limit=10, predicate=None):
+        return self.get_index(school_id).search(query, types=types, limit=limit, predicate=predicate)
+
+    def invalidate(self, school_id=None):
+        with self._lock:
+            if school_id is None:
+                self._indexes.clear()
+                self._stale.update(self._building)
+            else:
+                self._indexes.pop(school_id, None)
+                if school_id in self._building:
+                    self._stale.add(school_id)
+
+    def apply_change(self, model_label, pk, school_id, deleted=False, instance=None):
+        kind, columns, build_entry = INDEXED_MODELS[model_label]
+        with self._lock:
+            index = self._indexes.get(school_id)
+            if index is None:
+                if school_id in self._building:
+                    self._stale.add(school_id)
+                return
+        if deleted:
+            index.remove(kind, pk)
+        elif instance is None:
+            # Changed elsewhere; we don't have the new values so reload lazily
+            self.invalidate(school_id)
+        else:
+            row = {column: getattr(instance, column) for column in columns}
+            row['pk'] = pk
+            label, detail, extra = build_entry(row)
+            index.add(kind, pk, instance.custom_id, label, detail, extra)
+
+
+autocomplete_registry = AutocompleteRegistry()
+
+
+@receiver(school_data_changed)
+def update_autocomplete_index(sender, pk, school_id, deleted=False, instance=None, **kwargs):
+    model_label = sender._meta.label
+    if model_label not in INDEXED_MODELS:
+        return
+    transaction.on_commit(
+        lambda: autocomplete_registry.apply_change(model_label, pk, school_id, deleted, instance)
+    )
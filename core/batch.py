@@ -0,0 +1,191 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+BATCH_PATH = '/api/batch/'
+
+# Headers of the batch request that mustn't reach its sub-requests
+_DROPPED_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE')
+
+
+class SubRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'], default='GET')
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False, allow_null=True)
+
+    def validate_path(self, value):
+        if not value.startswith('/api/') or value.split('?', 1)[0] == BATCH_PATH:
+            raise serializers.ValidationError('Must be an API path other than the batch endpoint.')
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = SubRequestSerializer(many=True, allow_empty=False)
+    parallel = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(f'At most {settings.BATCH_MAX_REQUESTS} requests per batch.')
+        return value
+
+
+def build_sub_request(request, method, path, body=None):
+    """
+    An HttpRequest for `path` that shares the batch request's user, token,
+    school and access scope, so the views don't authenticate again.
+    """
+    http_request = request._request
+    path_info, _, query_string = path.partition('?')
+    data = b'' if body is None else orjson.dumps(body)
+
+    sub_request = HttpRequest()
+    sub_request.method = method
+    sub_request.path = sub_request.path_info = path_info
+    sub_request.META = {
+        key: value for key, value in http_request.META.items() if key not in _DROPPED_HEADERS
+    }
+    sub_request.META.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': query_string,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(data)),
+        'HTTP_ACCEPT': 'application/json',
+    })
+    sub_request.GET = QueryDict(query_string)
+    sub_request.COOKIES = http_request.COOKIES
+    sub_request._stream = io.BytesIO(data)
+    sub_request._read_started = False
+
+    sub_request.user = request.user
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    sub_request.school = getattr(http_request, 'school', None)
+    if hasattr(http_request, '_access_scope'):
+        sub_request._access_scope = http_request._access_scope
+    return sub_request
+
+
+def _error(status_code, detail):
+    return {'status': status_code, 'headers': {}, 'body': {'detail': detail}}
+
+
+def run_sub_request(request, method, path, body=None):
+    """{status, headers, body} of one sub-request, run in this thread."""
+    sub_request = build_sub_request(request, method, path, body)
+    try:
+        match = resolve(sub_request.path_info)
+    except Resolver404:
+        return _error(status.HTTP_404_NOT_FOUND, 'Not found.')
+    sub_request.resolver_match = match
+
+    view = match.func
+    try:
+        if iscoroutinefunction(view):
+            response = async_to_sync(view)(sub_request, *match.args, **match.kwargs)
+        else:
+            response = view(sub_request, *match.args, **match.kwargs)
+        if response.streaming:
+            response.close()
+            return _error(status.HTTP_400_BAD_REQUEST, "Streaming responses can't be batched.")
+        if hasattr(response, 'render'):
+            response.render()
+    except Exception:
+        logger.exception('Batch: %s %s failed', method, path)
+        return _error(status.HTTP_500_INTERNAL_SERVER_ERROR, 'Server error.')
+
+    content = response.content
+    if not content:
+        data = None
+    elif response.get('Content-Type', '').startswith('application/json'):
+        data = orjson.loads(content)
+    else:
+        data = content.decode(response.charset or 'utf-8', errors='replace')
+    headers = {name: value for name, value in response.items() if name not in ('Content-Type', 'Content-Length')}
+    return {'status': response.status_code, 'headers': headers, 'body': data}
+
+
+def _run_isolated(request, method, path, body):
+    try:
+        return run_sub_request(request, method, path, body)
+    finally:
+        # The pool's threads don't outlive the batch, so neither may their connections
+        connections.close_all()
+
+
+def run_batch(request, sub_requests, parallel=False):
+    """
+    Results of `sub_requests` (dicts of method, path and body), in order.
+    Each one runs on its own, as if sent separately: an error in one doesn't
+    undo the ones before it. With `parallel`, runs of consecutive GETs go
+    concurrently on up to BATCH_MAX_WORKERS threads (each with a database
+    connection of its own); anything else waits for what comes before it,
+    so reads after a write see it.
+    """
+    results = [None] * len(sub_requests)
+    pending = []
+
+    def flush():
+        if len(pending) > 1:
+            workers = min(len(pending), settings.BATCH_MAX_WORKERS)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as executor:
+                futures = [
+                    (index, executor.submit(_run_isolated, request, item['method'], item['path'], item.get('body')))
+                    for index, item in pending
+                ]
+                for index, future in futures:
+                    results[index] = future.result()
+        elif pending:
+            index, item = pending[0]
+            results[index] = run_sub_request(request, item['method'], item['path'], item.get('body'))
+        pending.clear()
+
+    for index, item in enumerate(sub_requests):
+        if parallel and item['method'] == 'GET':
+            pending.append((index, item))
+            continue
+        flush()
+        pending.append((index, item))
+        flush()
+    flush()
+    return results
+
+
+class BatchView(APIView):
+    """
+    Several API requests in one round trip, for screens that need a few
+    endpoints to render:
+
+        POST /api/batch/
+        {"requests": [{"method": "GET", "path": "/api/users/profile/"},
+                      {"method": "GET", "path": "/api/schools/detail/"}],
+         "parallel": true}
+
+    The batch is authenticated once and every sub-request runs in-process
+    as that user, through the usual view, permissions and throttles.
+    Responses come back in order as {status, headers, body}; a failing
+    sub-request doesn't fail the batch. Streaming responses (`?format=stream`,
+    live feeds) can't be batched.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = run_batch(
+            request, serializer.validated_data['requests'], serializer.validated_data['parallel']
+        )
+        return Response({'responses': results})
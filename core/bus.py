@@ -0,0 +1,226 @@
+import atexit
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections, transaction
+from django.dispatch import receiver
+
+from core.signals import school_data_changed
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'school_data_changed'
+
+
+class LocalTransport:
+    """Single-process setups: nothing to forward, nothing to listen to."""
+    enabled = False
+
+    def publish(self, payload):
+        pass
+
+    def listen(self, callback):
+        pass
+
+
+class SocketTransport:
+    """
+    Workers on one host each bind a Unix datagram socket in a shared
+    directory; publishing sends the event to every other socket there.
+    Sockets left behind by dead workers are removed on the first failed send.
+    """
+    enabled = True
+    max_size = 8192
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = None
+        self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        # Never let a slow worker block the request that made the change
+        self._send_sock.setblocking(False)
+
+    def publish(self, payload):
+        data = payload.encode()
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.sock') or path == self.path:
+                continue
+            try:
+                self._send_sock.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            except BlockingIOError:
+                logger.warning('Invalidation bus: %s is not keeping up, event dropped', path)
+
+    def _unlink(self):
+        try:
+            os.unlink(self.path)
+        except (FileNotFoundError, TypeError):
+            pass
+
+    def listen(self, callback):
+        os.makedirs(self.directory, exist_ok=True)
+        self._unlink()
+        self.path = os.path.join(self.directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.path)
+        atexit.register(self._unlink)
+        try:
+            while True:
+                callback(sock.recv(self.max_size).decode())
+        finally:
+            sock.close()
+
+
+class PostgresTransport:
+    """
+    PostgreSQL LISTEN/NOTIFY. Notifications are sent on the regular Django
+    connection and received on a dedicated connection owned by the
+    listener thread.
+    """
+    enabled = True
+    poll_interval = 30
+
+    def __init__(self, using='default', channel=CHANNEL):
+        self.using = using
+        self.channel = channel
+
+    def publish(self, payload):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def listen(self, callback):
+        import psycopg2
+
+        params = connections[self.using].get_connection_params()
+        params.pop('cursor_factory', None)
+        conn = psycopg2.connect(**params)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.channel}')
+            while True:
+                if not select.select([conn], [], [], self.poll_interval)[0]:
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    callback(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+
+def get_transport():
+    name = getattr(settings, 'INVALIDATION_BUS', 'local')
+    if name == 'socket':
+        return SocketTransport(settings.INVALIDATION_BUS_SOCKET_DIR)
+    if name == 'postgres':
+        return PostgresTransport()
+    return LocalTransport()
+
+
+class InvalidationBus:
+    """
+    Forwards school_data_changed events to the other workers and replays
+    theirs in this one, so in-process caches see every change no matter
+    which worker made it. Replayed events carry `instance=None` and
+    `remote=True`.
+    """
+    retry_delay = 1
+
+    def __init__(self, transport=None):
+        self.origin = uuid.uuid4().hex
+        self._transport = transport
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def transport(self):
+        if self._transport is None:
+            self._transport = get_transport()
+        return self._transport
+
+    def start(self):
+        """Start the listener thread once per process."""
+        if not self.transport.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            # A forked worker inherits the parent's state but not its threads
+            self.origin = uuid.uuid4().hex
+            self._thread = threading.Thread(target=self._run, name='invalidation-bus', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.transport.listen(self._receive)
+            except Exception:
+                logger.exception('Invalidation bus listener failed, reconnecting')
+            time.sleep(self.retry_delay)
+
+    def publish(self, model_label, pk, school_id, deleted=False):
+        if not self.transport.enabled:
+            return
+        payload = json.dumps({
+            'origin': self.origin,
+            'model': model_label,
+            'pk': pk,
+            'school_id': school_id,
+            'deleted': deleted,
+        })
+        try:
+            self.transport.publish(payload)
+        except Exception:
+            logger.exception('Invalidation bus: could not publish %s', payload)
+
+    def _receive(self, payload):
+        event = json.loads(payload)
+        if event['origin'] == self.origin:
+            return
+        try:
+            model = apps.get_model(event['model'])
+        except LookupError:
+            return
+        school_data_changed.send(
+            sender=model,
+            pk=event['pk'],
+            school_id=event['school_id'],
+            deleted=event['deleted'],
+            instance=None,
+            remote=True,
+        )
+
+
+invalidation_bus = InvalidationBus()
+
+
+@receiver(school_data_changed)
+def publish_school_data_change(sender, pk, school_id, deleted=False, remote=False, **kwargs):
+    if remote or not invalidation_bus.transport.enabled:
+        return
+    model_label = sender._meta.label
+    transaction.on_commit(
+        lambda: invalidation_bus.publish(model_label, pk, school_id, deleted)
+    )
+
+
+@receiver(request_started)
+def start_invalidation_bus(sender, **kwargs):
+    invalidation_bus.start()
@@ -0,0 +1,162 @@
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from core.access import get_access_scope
+from core.signals import school_data_changed
+
+RESPONSE_CACHE_ALIAS = 'responses'
+GENERATION_CACHE_ALIAS = 'generations'
+
+
+def get_response_cache():
+    return caches[RESPONSE_CACHE_ALIAS]
+
+
+def get_generation_cache():
+    # Shared by the workers even when the responses themselves aren't, so
+    # a write in one makes every worker's entries and ETags unreachable
+    return caches[GENERATION_CACHE_ALIAS]
+
+
+def _generation_key(school_id):
+    return f'school-generation:{school_id}'
+
+
+def _new_generation():
+    # Start from the clock rather than 1 so a counter that was evicted never
+    # comes back with a value that old cache entries were stored under
+    return time.time_ns()
+
+
+def get_school_generation(school_id):
+    """Current data generation of a school; part of every cache key."""
+    cache = get_generation_cache()
+    key = _generation_key(school_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _new_generation(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_school_generation(school_id):
+    """Invalidate every cached response of a school in O(1)."""
+    cache = get_generation_cache()
+    key = _generation_key(school_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_generation(), timeout=None)
+
+
+def get_request_signature(request):
+    """
+    (school id, access scope, digest of path, query and media type) for an
+    authenticated request, or None when it can't be tied to a school.
+    Requests with equal signatures get equal responses.
+    """
+    scope = get_access_scope(request)
+    if not scope.is_authenticated or scope.school_id is None:
+        return None
+    query = sorted(
+        (key, sorted(values)) for key, values in request.query_params.lists()
+    )
+    digest = hashlib.sha1(
+        repr((request.path, query, getattr(request, 'accepted_media_type', None))).encode()
+    ).hexdigest()
+    return scope.school_id, scope.cache_key, digest
+
+
+class CachedResponseMixin:
+    """
+    Cache rendered GET responses per school, access scope, path and query.
+
+    Keys include the school's data generation, so any change to the school's
+    records makes every older entry unreachable without deleting anything.
+    A hit returns the stored bytes and skips querysets, serializers and
+    rendering entirely.
+
+    The key also serves as the response's ETag: a request whose
+    If-None-Match still matches gets a 304 after one cache read, without
+    even fetching the stored body.
+    """
+    response_cache_timeout = DEFAULT_TIMEOUT
+
+    def get_response_cache_key(self, request):
+        # The browsable API embeds the user's name and forms in the page
+        if getattr(request.accepted_renderer, 'format', None) == 'api':
+            return None
+        # Streamed responses are never held whole
+        if getattr(request.accepted_renderer, 'streaming', False):
+            return None
+        signature = get_request_signature(request)
+        if signature is None:
+            return None
+        school_id, scope, digest = signature
+        generation = get_school_generation(school_id)
+        return f'response:{school_id}:{generation}:{scope}:{digest}'
+
+    def get_etag(self, key):
+        return '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+
+    def set_validators(self, key, response):
+        response['ETag'] = self.get_etag(key)
+        # Responses depend on who asks; clients revalidate every time
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_cached_response(self, request):
+        """
+        (cache key, cached or 304 response, or None); the key is None if
+        uncacheable.
+        """
+        key = self.get_response_cache_key(request)
+        if key is None:
+            return None, None
+        not_modified = get_conditional_response(request, etag=self.get_etag(key))
+        if not_modified is not None:
+            return key, self.set_validators(key, not_modified)
+        cached = get_response_cache().get(key)
+        if cached is None:
+            return key, None
+        content, content_type = cached
+        response = HttpResponse(content, content_type=content_type)
+        response['X-Cache'] = 'HIT'
+        return key, self.set_validators(key, response)
+
+    def cache_response(self, key, response):
+        if response.status_code == 200:
+            cache = get_response_cache()
+            timeout = self.response_cache_timeout
+            response.add_post_render_callback(
+                lambda rendered: cache.set(key, (rendered.content, rendered['Content-Type']), timeout)
+            )
+            response['X-Cache'] = 'MISS'
+            self.set_validators(key, response)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        key, cached = self.get_cached_response(request)
+        if cached is not None:
+            return cached
+        response = super().get(request, *args, **kwargs)
+        if key is None:
+            return response
+        return self.cache_response(key, response)
+
+
+@receiver(school_data_changed)
+def invalidate_school_responses(sender, school_id, remote=False, **kwargs):
+    # The generations are shared, so the worker that wrote has bumped it
+    if school_id is None or remote:
+        return
+    # After commit, so a concurrent request can't cache pre-commit data
+    # under the new generation
+    transaction.on_commit(lambda: bump_school_generation(school_id))
@@ -0,0 +1,58 @@
+import os
+import pickle
+import zlib
+from contextlib import contextmanager
+from hashlib import md5
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+
+class LockingFileBasedCache(FileBasedCache):
+    """
+    FileBasedCache whose add() and incr() are atomic across every process
+    on the host, so it can hold counters (see core.throttling). Keys are
+    spread over a fixed set of lock files; incr() keeps the key's expiry.
+    """
+    lock_stripes = 64
+
+    @contextmanager
+    def _key_lock(self, key, version):
+        self._createdir()
+        stripe = int(md5(self.make_key(key, version).encode(), usedforsecurity=False).hexdigest(), 16)
+        path = os.path.join(self._dir, f'lock-{stripe % self.lock_stripes}')
+        with open(path, 'ab') as f:
+            locks.lock(f, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(f)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._key_lock(key, version):
+            return super().add(key, value, timeout, version)
+
+    def get(self, key, default=None, version=None):
+        # incr() rewrites files in place, so readers take the lock too
+        with self._key_lock(key, version):
+            return super().get(key, default, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self._key_lock(key, version):
+            try:
+                with open(self._key_to_file(key, version), 'r+b') as f:
+                    if self._is_expired(f):
+                        raise ValueError(f"Key '{key}' not found")
+                    f.seek(0)
+                    expiry = pickle.load(f)
+                    value = pickle.loads(zlib.decompress(f.read())) + delta
+                    # In place, like touch(): cheaper than set()'s temp file
+                    # and rename, and keeps the expiry
+                    f.seek(0)
+                    f.write(pickle.dumps(expiry, self.pickle_protocol))
+                    f.write(zlib.compress(pickle.dumps(value, self.pickle_protocol)))
+                    f.truncate()
+                    return value
+            except FileNotFoundError:
+                raise ValueError(f"Key '{key}' not found")
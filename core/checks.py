@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+
+from core.singleflight import SINGLE_FLIGHT_CACHE_ALIAS
+
+
+@register()
+def check_single_flight_cache(app_configs, **kwargs):
+    """SINGLE_FLIGHT_CROSS_PROCESS shares results through a cache every worker must see."""
+    if not getattr(settings, 'SINGLE_FLIGHT_CROSS_PROCESS', False):
+        return []
+    if isinstance(caches[SINGLE_FLIGHT_CACHE_ALIAS], LocMemCache):
+        return [Error(
+            "SINGLE_FLIGHT_CROSS_PROCESS needs a cache shared by the workers, not LocMemCache.",
+            hint="Set SINGLE_FLIGHT_CACHE_BACKEND to 'file', 'db' or a shared backend.",
+            obj=SINGLE_FLIGHT_CACHE_ALIAS,
+            id='core.E001',
+        )]
+    return []
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins in progress, please try again shortly.'
+    default_code = 'hashing_busy'
+    # Sent as Retry-After by DRF's exception handler
+    wait = 1
+
+
+class HashingExecutor:
+    """
+    Bounded thread pool for password hashing, so PBKDF2 never runs on the
+    event loop (or the request thread of the async views). hashlib releases
+    the GIL while hashing, so the workers use every core.
+
+    At most PASSWORD_HASHING_WORKERS hashes run at once and
+    PASSWORD_HASHING_MAX_QUEUE wait; past that submit() raises HashingBusy
+    (503 + Retry-After) right away, so under a burst logins get slower up to
+    a bound and the rest are turned away instead of stalling other requests.
+    stats() reports the queue depth and wait times of this process.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._running = 0
+        self._in_flight = 0
+        self._submitted = 0
+        self._started = 0
+        self._completed = 0
+        self._rejected = 0
+        self._max_queued = 0
+        self._wait_total = 0.0
+        self._last_warning = 0
+
+    @property
+    def workers(self):
+        return getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or os.cpu_count() or 1
+
+    @property
+    def max_queue(self):
+        max_queue = getattr(settings, 'PASSWORD_HASHING_MAX_QUEUE', None)
+        return 4 * self.workers if max_queue is None else max_queue
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hashing')
+        return self._executor
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the pool; a Future, or HashingBusy if it's full."""
+        with self._lock:
+            executor = self._get_executor()
+            if self._in_flight >= self.workers + self.max_queue:
+                self._rejected += 1
+                warn = time.monotonic() - self._last_warning > 60
+                if warn:
+                    self._last_warning = time.monotonic()
+            else:
+                warn = None
+                self._in_flight += 1
+                self._submitted += 1
+                self._max_queued = max(self._max_queued, self._in_flight - self._running)
+        if warn is not None:
+            if warn:
+                logger.warning('Password hashing queue full, rejecting requests: %s', self.stats())
+            raise HashingBusy()
+
+        submitted_at = time.monotonic()
+
+        def task():
+            with self._lock:
+                self._running += 1
+                self._started += 1
+                self._wait_total += time.monotonic() - submitted_at
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+
+        def done(future):
+            # Also runs for tasks cancelled before they started
+            with self._lock:
+                self._in_flight -= 1
+
+        future = executor.submit(task)
+        future.add_done_callback(done)
+        return future
+
+    async def run(self, fn, *args):
+        """Await fn(*args) on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'running': self._running,
+                'queued': self._in_flight - self._running,
+                'max_queued': self._max_queued,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'avg_wait_ms': round(1000 * self._wait_total / self._started, 2) if self._started else 0,
+            }
+
+
+hashing_executor = HashingExecutor()
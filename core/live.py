@@ -0,0 +1,329 @@
+import asyncio
+import datetime
+import logging
+import queue
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Q
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.bus import InvalidationBus, PostgresTransport, invalidation_bus
+from core.renderers import render_event
+from core.signals import school_data_changed
+from core.sync import SYNCED_TYPES, _from_micros, _to_micros
+
+logger = logging.getLogger(__name__)
+
+# Attendance tables on the live feed: (sync type, model label, the person
+# it records, key in the summaries). Marks have the delta sync's format.
+ATTENDANCE_TYPES = (
+    ('student_attendance', 'students.StudentAttendance', 'student', 'students'),
+    ('teacher_attendance', 'teachers.TeacherAttendance', 'teacher', 'teachers'),
+)
+
+ATTENDANCE_MODELS = {label: kind for kind, label, _, _ in ATTENDANCE_TYPES}
+
+_SYNC_INDEX = {kind: index for index, (kind, *_) in enumerate(SYNCED_TYPES)}
+
+# Comment line that keeps idle connections open through proxies
+HEARTBEAT = b': heartbeat\n\n'
+
+# LISTEN/NOTIFY channel of the feed's own bus (see get_feed_bus())
+FEED_CHANNEL = 'attendance_feed'
+
+
+class FeedUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The live feed is only served by the ASGI server.'
+    default_code = 'feed_unavailable'
+
+
+def make_event_id(moment, kind, pk):
+    # Ordered by time, so a reconnecting client's last id says where to resume
+    return f'{_to_micros(moment)}-{kind}-{pk}'
+
+
+def parse_event_id(event_id):
+    """The time in a make_event_id() id, or None."""
+    try:
+        return _from_micros(int(event_id.split('-', 1)[0]))
+    except (ValueError, OverflowError):
+        return None
+
+
+def get_summary(school_id, date):
+    """Present, absent and total students and teachers of a school on a date."""
+    summary = {'date': date.isoformat()}
+    for _, label, person, key in ATTENDANCE_TYPES:
+        model = apps.get_model(label)
+        counts = model._default_manager.filter(**{f'{person}__school_id': school_id, 'date': date}).aggregate(
+            present=Count('pk', filter=Q(is_present=True)),
+            absent=Count('pk', filter=Q(is_present=False)),
+        )
+        person_model = model._meta.get_field(person).related_model
+        counts['total'] = person_model._default_manager.filter(school_id=school_id).count()
+        summary[key] = counts
+    return summary
+
+
+def summary_message(school_id, date):
+    return render_event('summary', get_summary(school_id, date))
+
+
+def _load_marks(school_id, kind, label, pks, since=None):
+    """(updated_at, date, message) of the marks of `kind` with these pks, or changed since `since`."""
+    _, _, serializer_path, _, prepare = SYNCED_TYPES[_SYNC_INDEX[kind]]
+    person = next(person for _, model_label, person, _ in ATTENDANCE_TYPES if model_label == label)
+    serializer_class = import_string(serializer_path)
+    queryset = apps.get_model(label)._default_manager.filter(**{f'{person}__school_id': school_id})
+    if since is None:
+        queryset = queryset.filter(pk__in=pks)
+    else:
+        queryset = queryset.filter(updated_at__gte=since).order_by('updated_at', 'pk')[:settings.LIVE_FEED_REPLAY_LIMIT + 1]
+    objects = list(prepare(queryset, serializer_class))
+    data = serializer_class(objects, many=True).data
+    return [
+        (obj.updated_at, obj.date, render_event(
+            'mark', {'type': kind, 'op': 'upsert', 'id': obj.pk, 'data': representation},
+            make_event_id(obj.updated_at, kind, obj.pk),
+        ))
+        for obj, representation in zip(objects, data)
+    ]
+
+
+def delete_message(kind, pk, moment=None):
+    moment = moment or timezone.now()
+    return render_event('mark', {'type': kind, 'op': 'delete', 'id': pk}, make_event_id(moment, kind, pk))
+
+
+def get_replay(school_id, last_event_id):
+    """
+    Messages for the marks written after `last_event_id`, oldest first, or
+    None when the client has to reload: the id is unknown or too much
+    changed.
+    """
+    moment = parse_event_id(last_event_id)
+    retention = datetime.timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    if moment is None or moment < timezone.now() - retention:
+        return None
+    return get_marks_since(school_id, moment)
+
+
+def get_marks_since(school_id, moment):
+    """
+    Messages for the marks written after `moment`, oldest first, or None
+    when too much changed. Starts SYNC_SETTLE_SECONDS early so a transaction
+    that committed late isn't missed; clients skip ids they already applied.
+    """
+    since = moment - datetime.timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+
+    replay = []
+    for kind, label, _, _ in ATTENDANCE_TYPES:
+        replay += [(moment, message) for moment, _, message in _load_marks(school_id, kind, label, None, since)]
+    Tombstone = apps.get_model('core', 'Tombstone')
+    tombstones = Tombstone.objects.filter(
+        school_id=school_id, kind__in=ATTENDANCE_MODELS.values(), deleted_at__gte=since
+    ).order_by('deleted_at', 'pk')[:settings.LIVE_FEED_REPLAY_LIMIT + 1]
+    replay += [
+        (tombstone.deleted_at, delete_message(tombstone.kind, tombstone.object_id, tombstone.deleted_at))
+        for tombstone in tombstones
+    ]
+    if len(replay) > settings.LIVE_FEED_REPLAY_LIMIT:
+        return None
+    replay.sort(key=lambda item: item[0])
+    return [message for _, message in replay]
+
+
+class Subscription:
+    """
+    One connected client's queue of messages. A client that falls
+    LIVE_FEED_QUEUE_SIZE messages behind is `overflowed`: its stream ends and
+    it reconnects with Last-Event-ID. Pass the event loop for async clients.
+    """
+
+    def __init__(self, school_id, loop=None):
+        self.school_id = school_id
+        self.overflowed = False
+        self._loop = loop
+        size = settings.LIVE_FEED_QUEUE_SIZE
+        self._queue = queue.Queue(size) if loop is None else asyncio.Queue(size)
+
+    def put(self, message):
+        if self._loop is None:
+            self._put(message)
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The loop has closed
+            self.overflowed = True
+
+    def _put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except (queue.Full, asyncio.QueueFull):
+            self.overflowed = True
+
+    def get(self, timeout):
+        """The next message, or None after `timeout` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class AttendanceFeed:
+    """
+    Fans attendance changes out to the live feed clients of each school.
+
+    Every worker learns about the changes once, from school_data_changed
+    (its own writes after they commit, the others' through core.bus or,
+    without INVALIDATION_BUS, the feed's own bus), and
+    one thread loads each batch of marks, renders it once and hands the
+    bytes to every client watching that school. Summaries are recomputed
+    at most every LIVE_FEED_SUMMARY_INTERVAL seconds per school and date,
+    so a roll call costs a few queries a second however many dashboards
+    are open. Schools nobody watches cost nothing.
+    """
+    retry_delay = 1
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._changes = queue.Queue()
+        self._thread = None
+
+    def subscribe(self, school_id, loop=None):
+        feed_bus = get_feed_bus()
+        if feed_bus is not None:
+            # Hear about the other workers' marks
+            feed_bus.start()
+        subscription = Subscription(school_id, loop)
+        with self._lock:
+            self._subscriptions.setdefault(school_id, set()).add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='attendance-feed', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.school_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.school_id]
+
+    def is_watched(self, school_id):
+        return school_id in self._subscriptions
+
+    def notify(self, model_label, pk, school_id, deleted, date=None):
+        """Queue a committed change; `date` is only needed for deletions."""
+        if self.is_watched(school_id):
+            self._changes.put((model_label, pk, school_id, deleted, date))
+
+    def broadcast(self, school_id, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(school_id, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def _run(self):
+        while True:
+            try:
+                self._process()
+            except Exception:
+                logger.exception('Attendance feed failed, restarting')
+                connection.close()
+            time.sleep(self.retry_delay)
+
+    def _process(self):
+        # (school, date) whose summary has changed, sent at next_summary
+        dirty = set()
+        next_summary = 0
+        while True:
+            timeout = max(0, next_summary - time.monotonic()) if dirty else None
+            batch = []
+            try:
+                batch.append(self._changes.get(timeout=timeout))
+                while True:
+                    batch.append(self._changes.get_nowait())
+            except queue.Empty:
+                pass
+
+            for school_id, date, message in self._load(batch):
+                self.broadcast(school_id, message)
+                dirty.add((school_id, date))
+
+            if dirty and time.monotonic() >= next_summary:
+                for school_id, date in dirty:
+                    if self.is_watched(school_id):
+                        self.broadcast(school_id, summary_message(school_id, date))
+                dirty.clear()
+                next_summary = time.monotonic() + settings.LIVE_FEED_SUMMARY_INTERVAL
+            close_old_connections()
+
+    def _load(self, batch):
+        """(school, date, message) for a batch of changes, one query per school and table."""
+        upserts = {}
+        for label, pk, school_id, deleted, date in batch:
+            kind = ATTENDANCE_MODELS[label]
+            if deleted:
+                # Other workers' deletions don't say which day they were
+                yield school_id, date or timezone.localdate(), delete_message(kind, pk)
+            else:
+                upserts.setdefault((school_id, kind, label), set()).add(pk)
+        for (school_id, kind, label), pks in upserts.items():
+            for _, date, message in _load_marks(school_id, kind, label, pks):
+                yield school_id, date, message
+
+
+attendance_feed = AttendanceFeed()
+
+_feed_bus = None
+
+
+def get_feed_bus():
+    """
+    The bus that carries attendance changes to the other workers' feeds when
+    INVALIDATION_BUS doesn't: LISTEN/NOTIFY on FEED_CHANNEL, on PostgreSQL
+    only. None when INVALIDATION_BUS already does, or can't be had.
+    """
+    global _feed_bus
+    if invalidation_bus.transport.enabled or connection.vendor != 'postgresql':
+        return None
+    if _feed_bus is None:
+        _feed_bus = InvalidationBus(PostgresTransport(channel=FEED_CHANNEL))
+    return _feed_bus
+
+
+@receiver(school_data_changed)
+def feed_attendance_change(sender, pk, school_id, deleted, instance=None, remote=False, **kwargs):
+    label = sender._meta.label
+    if label not in ATTENDANCE_MODELS:
+        return
+    feed_bus = None if remote else get_feed_bus()
+    if feed_bus is not None:
+        # Another worker may be watching the school
+        transaction.on_commit(lambda: feed_bus.publish(label, pk, school_id, deleted))
+    if not attendance_feed.is_watched(school_id):
+        return
+    date = getattr(instance, 'date', None)
+    if remote:
+        attendance_feed.notify(label, pk, school_id, deleted, date)
+    else:
+        transaction.on_commit(lambda: attendance_feed.notify(label, pk, school_id, deleted, date))
@@ -0,0 +1,74 @@
+import datetime
+import io
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import MessagePackParser, ORJSONParser
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+
+def teacher_row(i, raw):
+    """A teacher list item, as serializers output it or (raw) with Python values."""
+    joined = datetime.date(2020, 1, 1) + datetime.timedelta(days=i % 1000)
+    created = timezone.now() - datetime.timedelta(minutes=i)
+    salary = Decimal('1000.50') + i
+    return {
+        'custom_id': f'TE{i:06X}', 'uuid': uuid.UUID(int=i) if raw else str(uuid.UUID(int=i)),
+        'user': {'custom_id': f'US{i:06X}', 'email': f'teacher{i}@school.ng', 'full_name': f'Teacher Número {i}',
+                 'role': 'teacher', 'is_verified': True},
+        'school': 1, 'employee_id': f'EMP{i}', 'first_name': 'Adaeze', 'last_name': 'Okafor',
+        'date_of_birth': datetime.date(1990, 1, 1) if raw else '1990-01-01', 'gender': 'female',
+        'profile_image': None, 'phone_number': '+234 803 123 4567', 'address': '12 Marina Road, Lagos',
+        'graduation_year': 2012, 'joining_date': joined if raw else joined.isoformat(),
+        'salary': salary if raw else str(salary), 'is_active': True, 'access_level': 'full',
+        'assigned_classes': [{'id': i * 3 + n, 'assigned_class': n, 'is_primary': n == 0} for n in range(3)],
+        'created_at': created if raw else created.isoformat().replace('+00:00', 'Z'),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the JSON (stdlib and orjson) and MessagePack renderers and parsers '
+        'on a teacher-list-shaped payload.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='List items (default: 5000)')
+        parser.add_argument('--repeat', type=int, default=5, help='Best of this many runs (default: 5)')
+
+    def best(self, repeat, fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        for raw in (False, True):
+            data = [teacher_row(i, raw) for i in range(rows)]
+            label = 'Python values (Decimal, date, datetime, UUID)' if raw else 'serializer output'
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{rows} rows, {label}'))
+
+            baseline = None
+            for renderer, parser in ((JSONRenderer(), JSONParser()), (ORJSONRenderer(), ORJSONParser()),
+                                     (MessagePackRenderer(), MessagePackParser())):
+                render_time, body = self.best(repeat, lambda: renderer.render(data))
+                parse_time, _ = self.best(repeat, lambda: parser.parse(io.BytesIO(body)))
+                if baseline is None:
+                    baseline = render_time, parse_time
+                note = ''
+                if isinstance(renderer, ORJSONRenderer):
+                    note = ', same bytes as JSONRenderer' if body == JSONRenderer().render(data) else ', OUTPUT DIFFERS'
+                self.stdout.write(
+                    f'  {type(renderer).__name__:20} render {render_time * 1000:7.1f} ms '
+                    f'({baseline[0] / render_time:4.1f}x)  parse {parse_time * 1000:7.1f} ms '
+                    f'({baseline[1] / parse_time:4.1f}x)  {len(body) / 1024:7.0f} KB{note}'
+                )
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Tombstone
+from users.management.commands.purge_expired_auth_data import delete_in_batches
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete delta sync tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS, in batches. '
+        'Clients with older cursors start over, so nothing still needs them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows deleted per statement (default: 1000)')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between batches (default: 0)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        total = 0
+        for deleted, seconds in delete_in_batches(
+            Tombstone.objects.filter(deleted_at__lt=cutoff), options['batch_size'], options['pause']
+        ):
+            total += deleted
+            self.stdout.write(f'Tombstone: deleted {deleted} rows in {seconds:.3f}s')
+        self.stdout.write(self.style.SUCCESS(f'Tombstone: {total} rows deleted'))
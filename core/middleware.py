@@ -1,6 +1,66 @@
+from django.conf import settings
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from django.middleware import csrf
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
 from django.http import HttpResponseForbidden
 
+from core.access import get_access_scope
+from core.authentication import get_api_user
+
+
+def is_stateless_path(path):
+    """API paths authenticate with tokens and never use sessions, CSRF or messages."""
+    return path.startswith(tuple(getattr(settings, 'STATELESS_PATH_PREFIXES', ('/api/',))))
+
+
+class StatelessPathMixin:
+    """
+    Skip the wrapped middleware entirely on stateless (API) paths; elsewhere,
+    e.g. /admin/, it runs as usual. Subclassing the original keeps Django's
+    checks for the admin's required middleware happy.
+    """
+
+    def __call__(self, request):
+        if is_stateless_path(request.path_info):
+            return self.get_response(request)
+        return super().__call__(request)
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if is_stateless_path(request.path_info):
+            return None
+        parent = getattr(super(), 'process_view', None)
+        if parent is None:
+            return None
+        return parent(request, callback, callback_args, callback_kwargs)
+
+
+class SessionMiddleware(StatelessPathMixin, sessions_middleware.SessionMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(StatelessPathMixin, csrf.CsrfViewMiddleware):
+    pass
+
+
+class MessageMiddleware(StatelessPathMixin, messages_middleware.MessageMiddleware):
+    pass
+
+
+class AuthenticationMiddleware(auth_middleware.AuthenticationMiddleware):
+    """
+    Session authentication off stateless paths; on them, request.user comes
+    lazily from the DRF authentication classes (JWT/Token), so middleware
+    such as TenantMiddleware sees the same user the API views do.
+    """
+
+    def process_request(self, request):
+        if is_stateless_path(request.path_info):
+            request.user = SimpleLazyObject(lambda: get_api_user(request))
+            return None
+        return super().process_request(request)
 
 
 class TenantMiddleware(MiddlewareMixin):
@@ -20,6 +80,18 @@ class TenantMiddleware(MiddlewareMixin):
         if not request.user.is_authenticated:
             return None
         
+        # API requests: resolve the school id from the access scope (shared
+        # with the views) and only load the School row if a view uses it.
+        # Users without a school are left to the views' permissions.
+        if is_stateless_path(path):
+            school_id = get_access_scope(request).school_id
+            if school_id is None:
+                request.school = None
+            else:
+                from schools.models import School
+                request.school = SimpleLazyObject(lambda: School.objects.get(pk=school_id))
+            return None
+        
         # Add debug print
        # print(f"TenantMiddleware: Processing request for user {request.user.email}, role: {request.user.role}")
         
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-19 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tombstone',
+            name='class_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,3 +1,24 @@
 from django.db import models
 
-# Create your models here.
+
+class Tombstone(models.Model):
+    """
+    A deleted record, kept so delta sync (core.sync) can tell clients that
+    synced it to drop it. Purged after SYNC_TOMBSTONE_RETENTION_DAYS.
+    """
+    # Plain ids: the school and the record may already be gone
+    school_id = models.BigIntegerField()
+    kind = models.CharField(max_length=40)
+    object_id = models.BigIntegerField()
+    custom_id = models.CharField(max_length=20, blank=True, null=True)
+    # The class the record belonged to, for the records class-only teachers see by class
+    class_id = models.BigIntegerField(blank=True, null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['school_id', 'deleted_at'], name='tombstone_school_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} (deleted {self.deleted_at})"
@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from core.access import get_access_scope
+
 class IsTeacherOrAdmin(permissions.BasePermission):
     """
     Permission to only allow teachers or admins to access the view.
@@ -11,7 +13,7 @@ class IsTeacherOrAdmin(permissions.BasePermission):
             return False
         
         # Allow if user is admin or teacher
-        return request.user.role in ['admin', 'teacher']
+        return get_access_scope(request).role in ['admin', 'teacher']
 
 class IsAdminOnly(permissions.BasePermission):
     """
@@ -24,7 +26,7 @@ class IsAdminOnly(permissions.BasePermission):
             return False
         
         # Allow if user is admin
-        return request.user.role == 'admin'
+        return get_access_scope(request).is_admin
 
 class IsTeacherWithFullAccess(permissions.BasePermission):
     """
@@ -37,7 +39,7 @@ class IsTeacherWithFullAccess(permissions.BasePermission):
             return False
         
         # Check if teacher has full access
-        return hasattr(request.user, 'teacher_profile') and request.user.teacher_profile.access_level == 'full'
+        return get_access_scope(request).access_level == 'full'
 
 class IsTeacherWithLimitedAccess(permissions.BasePermission):
     """
@@ -50,7 +52,7 @@ class IsTeacherWithLimitedAccess(permissions.BasePermission):
             return False
         
         # Check if teacher has at least limited access
-        return hasattr(request.user, 'teacher_profile') and request.user.teacher_profile.access_level in ['limited', 'full']
+        return get_access_scope(request).access_level in ['limited', 'full']
 
 class IsTeacherWithClassOnlyAccess(permissions.BasePermission):
     """
@@ -63,7 +65,7 @@ class IsTeacherWithClassOnlyAccess(permissions.BasePermission):
             return False
         
         # All teachers can access their own classes
-        return hasattr(request.user, 'teacher_profile')
+        return get_access_scope(request).teacher_id is not None
 
 class IsOwnProfileOrAdmin(permissions.BasePermission):
     """
@@ -71,12 +73,14 @@ class IsOwnProfileOrAdmin(permissions.BasePermission):
     """
     
     def has_object_permission(self, request, view, obj):
+        scope = get_access_scope(request)
+        
         # Admin can edit any profile
-        if request.user.role == 'admin':
+        if scope.is_admin:
             return True
         
         # Teachers can only edit their own profile
-        if hasattr(request.user, 'teacher_profile'):
-            return obj.id == request.user.teacher_profile.id
+        if scope.teacher_id is not None:
+            return obj.id == scope.teacher_id
         
         return False
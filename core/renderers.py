@@ -0,0 +1,105 @@
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Values orjson and msgpack don't encode natively (Decimal, lazy strings,
+# querysets... and, for msgpack, dates and times) as DRF's JSON encoder does
+encode_default = JSONEncoder().default
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer on orjson, with the same output: compact UTF-8, 'Z' for
+    UTC datetimes, Decimals as numbers, U+2028/U+2029 escaped. Indented
+    (`Accept: application/json; indent=4`), ASCII-only or non-compact
+    output, and data orjson rejects (e.g. integers over 64 bits), go
+    through JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.ensure_ascii or not self.compact \
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack, for clients that send `Accept: application/msgpack`.
+    Values that aren't native to it are encoded as in the JSON responses:
+    dates and times as ISO 8601 strings, Decimals as floats, UUIDs as
+    strings.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=False)
+
+
+class StreamingJSONRenderer(ORJSONRenderer):
+    """
+    JSON for export-style list requests (`?format=stream`): views with
+    core.views.StreamingListMixin pass an iterator of items to stream() and
+    the array goes out in pieces as it is serialized, with the same bytes
+    JSONRenderer would produce for the whole list. Anything else renders
+    as plain JSON.
+    """
+    format = 'stream'
+    streaming = True
+    # Bytes gathered before each write to the client
+    buffer_size = 64 * 1024
+
+    def stream(self, items):
+        buffer = [b'[']
+        size = 1
+        for index, item in enumerate(items):
+            encoded = self.render(item)
+            if index:
+                buffer.append(b',')
+            buffer.append(encoded)
+            size += len(encoded) + 1
+            if size >= self.buffer_size:
+                yield b''.join(buffer)
+                buffer = []
+                size = 0
+        buffer.append(b']')
+        yield b''.join(buffer)
+
+
+def render_event(event, data, event_id=None):
+    """One server-sent event, as bytes."""
+    lines = [] if event_id is None else [f'id: {event_id}'.encode()]
+    lines.append(f'event: {event}'.encode())
+    lines.append(b'data: ' + ORJSONRenderer().render(data))
+    return b'\n'.join(lines) + b'\n\n'
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    text/event-stream, for live feeds that return their own streaming
+    response. Anything else (e.g. an error) goes out as one `error` event.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return render_event('error', data)
@@ -0,0 +1,355 @@
+import hashlib
+from collections import namedtuple
+from itertools import islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.fields import empty
+
+FRAGMENT_CACHE_ALIAS = 'fragments'
+
+
+def get_fragment_cache():
+    return caches[FRAGMENT_CACHE_ALIAS]
+
+
+class CachedListSerializer(serializers.ListSerializer):
+    """
+    List serializer that fetches every child's cached representation in one
+    get_many call and only serializes the objects that changed.
+    """
+
+    def to_representation(self, data):
+        if not getattr(settings, 'SERIALIZER_FRAGMENT_CACHE', True):
+            return super().to_representation(data)
+
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+        keys = [self.child.get_fragment_key(item) for item in items]
+
+        cache = get_fragment_cache()
+        cached = cache.get_many([key for key in keys if key])
+        representations = []
+        misses = {}
+        for item, key in zip(items, keys):
+            if key in cached:
+                representations.append(cached[key])
+                continue
+            representation = self.child.serialize_uncached(item)
+            representations.append(representation)
+            if key:
+                misses[key] = representation
+        if misses:
+            cache.set_many(misses)
+        return representations
+
+
+class CachedRepresentationMixin:
+    """
+    Cache a ModelSerializer's output per object, keyed by
+    (serializer, model, pk, version). The version defaults to the object's
+    `updated_at`; override get_fragment_version() when the representation
+    depends on more than the row itself, and return None to skip caching.
+
+    Add `list_serializer_class = CachedListSerializer` to the serializer's
+    Meta so list responses use a single multi-get.
+    """
+    # Model fields get_fragment_version() reads, kept by narrowed querysets
+    fragment_version_fields = ('updated_at',)
+
+    def get_fragment_version(self, instance):
+        return getattr(instance, 'updated_at', None)
+
+    def get_fragment_key(self, instance):
+        version = self.get_fragment_version(instance)
+        if version is None or instance.pk is None:
+            return None
+        # File and image fields render absolute URLs from the request host,
+        # and the selected fields can vary per request
+        request = self.context.get('request')
+        host = request.get_host() if request is not None else ''
+        digest = hashlib.sha1(repr((version, host, tuple(self.fields))).encode()).hexdigest()
+        serializer = f'{type(self).__module__}.{type(self).__qualname__}'
+        return f'fragment:{serializer}:{instance._meta.label}:{instance.pk}:{digest}'
+
+    def serialize_uncached(self, instance):
+        return super().to_representation(instance)
+
+    def to_representation(self, instance):
+        if not getattr(settings, 'SERIALIZER_FRAGMENT_CACHE', True):
+            return self.serialize_uncached(instance)
+        key = self.get_fragment_key(instance)
+        if key is None:
+            return self.serialize_uncached(instance)
+
+        cache = get_fragment_cache()
+        representation = cache.get(key)
+        if representation is None:
+            representation = self.serialize_uncached(instance)
+            cache.set(key, representation)
+        return representation
+
+
+class ValuesUnsupported(Exception):
+    """The serializer has a field the values() fast path can't reproduce."""
+
+
+# Fields whose to_representation() returns database values unchanged
+_PASSTHROUGH_FIELDS = (serializers.CharField, serializers.EmailField, serializers.BooleanField, serializers.IntegerField)
+
+
+class _RowPlan:
+    """
+    A serializer compiled against its model: the columns to fetch and, per
+    output field, a function from a fetched row to the field's output.
+    Reverse foreign keys (`many`) are only allowed at the top level.
+    """
+
+    def __init__(self, serializer, model, prefix='', top_level=True):
+        self.columns = []
+        self.related = []
+        self.many = []
+        self.pk_index = self.column(prefix + model._meta.pk.attname)
+        steps = [self.compile(field, model, prefix) for field in serializer._readable_fields]
+        # (name, function), where function None marks a reverse relation
+        self.steps = [step for step in steps if step is not None]
+        if self.many and not top_level:
+            raise ValuesUnsupported(serializer)
+
+    def column(self, path):
+        if path not in self.columns:
+            self.columns.append(path)
+        return self.columns.index(path)
+
+    def compile(self, field, model, prefix):
+        name = field.field_name
+
+        if isinstance(field, serializers.SerializerMethodField):
+            method = getattr(field.parent, field.method_name)
+            attrs = getattr(field.parent.Meta, 'values_method_fields', {}).get(name)
+            if attrs is None:
+                raise ValuesUnsupported(name)
+            row_class = namedtuple(f'{model.__name__}Row', attrs)
+            getters = [self.model_value(model, prefix, attr) for attr in attrs]
+            return name, lambda row: method(row_class._make([get(row) for get in getters]))
+
+        if len(field.source_attrs) != 1:
+            return self.compile_unresolvable(field, model)
+        source = field.source_attrs[0]
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            return self.compile_unresolvable(field, model)
+
+        if isinstance(field, serializers.ListSerializer):
+            # Reverse foreign key, fetched for all rows in one more query
+            if not model_field.one_to_many or not model_field.field.target_field.primary_key:
+                raise ValuesUnsupported(name)
+            child_model = model_field.related_model
+            plan = _RowPlan(field.child, child_model, top_level=False)
+            fk = model_field.field.attname
+            self.many.append((name, plan, child_model, fk, plan.column(fk), source))
+            return name, None
+
+        if isinstance(field, serializers.BaseSerializer):
+            # Forward relation, fetched with the row
+            if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+                raise ValuesUnsupported(name)
+            fk = self.column(prefix + model_field.attname)
+            plan = _RowPlan(field, model_field.related_model, prefix=f'{prefix}{source}__', top_level=False)
+            offset = len(self.columns)
+            self.columns.extend(plan.columns)
+            self.related += [prefix + source] + plan.related
+            build = plan.build
+            return name, lambda row: None if row[fk] is None else build(row[offset:])
+
+        if model_field.is_relation:
+            if not isinstance(field, serializers.PrimaryKeyRelatedField) or not model_field.concrete \
+                    or model_field.many_to_many or field.pk_field is not None:
+                raise ValuesUnsupported(name)
+            return name, itemgetter(self.column(prefix + model_field.attname))
+
+        if isinstance(model_field, models.FileField):
+            # FieldFile is never None; to_representation() handles empty names
+            get = self.model_value(model, prefix, source)
+            return name, lambda row: field.to_representation(get(row))
+
+        index = self.column(prefix + model_field.attname)
+        if type(field) in _PASSTHROUGH_FIELDS:
+            return name, itemgetter(index)
+        convert = field.to_representation
+        return name, lambda row: None if row[index] is None else convert(row[index])
+
+    def compile_unresolvable(self, field, model):
+        """
+        Sources that raise AttributeError on every row (naming an attribute
+        the model doesn't have) are skipped by DRF for read-only fields;
+        anything else is left to the regular path.
+        """
+        target = model
+        for attr in field.source_attrs:
+            try:
+                target = target._meta.get_field(attr).related_model
+            except FieldDoesNotExist:
+                if hasattr(target, attr):
+                    raise ValuesUnsupported(field.field_name)
+                break
+            if target is None:
+                raise ValuesUnsupported(field.field_name)
+        else:
+            raise ValuesUnsupported(field.field_name)
+        if field.default is not empty or field.allow_null or field.required:
+            raise ValuesUnsupported(field.field_name)
+        return None
+
+    def model_value(self, model, prefix, attr):
+        model_field = model._meta.get_field(attr)
+        index = self.column(prefix + model_field.attname)
+        if isinstance(model_field, models.FileField):
+            return lambda row: model_field.attr_class(None, model_field, row[index] or '')
+        return itemgetter(index)
+
+    def build(self, row, nested=None):
+        representation = {}
+        for name, get in self.steps:
+            if get is None:
+                representation[name] = nested[name].get(row[self.pk_index], [])
+            else:
+                representation[name] = get(row)
+        return representation
+
+    def fetch_many(self, pks):
+        """The built children of these rows, by field name and parent pk."""
+        nested = {}
+        for name, plan, child_model, fk, fk_index, source in self.many:
+            children = child_model._default_manager.filter(**{f'{fk}__in': pks}).values_list(*plan.columns)
+            if not child_model._meta.ordering:
+                children = children.order_by('pk')
+            nested[name] = {}
+            for child in children:
+                nested[name].setdefault(child[fk_index], []).append(plan.build(child))
+        return nested
+
+    def iterate(self, queryset, chunk_size):
+        rows = queryset.prefetch_related(None).values_list(*self.columns).iterator(chunk_size=chunk_size)
+        if not self.many:
+            for row in rows:
+                yield self.build(row)
+            return
+        while chunk := list(islice(rows, chunk_size)):
+            nested = self.fetch_many([row[self.pk_index] for row in chunk])
+            for row in chunk:
+                yield self.build(row, nested)
+
+
+class ValuesSerializerMixin:
+    """
+    Read-only fast path for ModelSerializer lists: serialize_values() fetches
+    just the columns the output needs with values_list() and maps each row
+    through a plan compiled from the serializer's own fields, producing the
+    same data as `Serializer(queryset, many=True).data` without building
+    model instances. Nested serializers over forward relations come with
+    the row; reverse foreign keys (many=True) take one query per chunk of
+    rows.
+
+    SerializerMethodFields are called with a namedtuple row; list the model
+    fields each one reads in Meta.values_method_fields. Serializers with
+    fields the plan can't reproduce return None, for the regular path.
+    """
+    values_chunk_size = 2000
+
+    @classmethod
+    def iter_values(cls, queryset, context=None, chunk_size=None):
+        """Like serialize_values(), but an iterator reading chunk_size rows at a time."""
+        serializer = cls(context=context or {})
+        try:
+            plan = _RowPlan(serializer, queryset.model)
+        except ValuesUnsupported:
+            return None
+        return plan.iterate(queryset, chunk_size or cls.values_chunk_size)
+
+    @classmethod
+    def serialize_values(cls, queryset, context=None):
+        items = cls.iter_values(queryset, context)
+        return None if items is None else list(items)
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class SparseFieldsMixin:
+    """
+    Client-selected fields for a ModelSerializer (see
+    core.views.SparseFieldsViewMixin): `?fields=a,b` outputs just those
+    fields, and the relations in Meta.expandable_fields are only output
+    when named in `fields` or `?expand=`. Without either parameter the
+    output is unchanged.
+
+    Only the top-level serializer is pruned, from the 'fieldset' in its
+    context; narrow_queryset() fetches just what the pruned fields read.
+    """
+
+    @classmethod
+    def get_fieldset(cls, query_params):
+        """The field names a request selects, or None for all of them."""
+        fields = query_params.get('fields')
+        expand = query_params.get('expand')
+        if fields is None and expand is None:
+            return None
+
+        available = list(cls.Meta.fields)
+        expandable = set(getattr(cls.Meta, 'expandable_fields', ()))
+        requested = _split(fields) if fields is not None else None
+        expanded = _split(expand or '')
+        errors = {}
+        unknown = [name for name in requested or () if name not in available]
+        if unknown:
+            errors['fields'] = f"Unknown field(s): {', '.join(unknown)}."
+        unknown = [name for name in expanded if name not in expandable]
+        if unknown:
+            errors['expand'] = f"Unknown or unexpandable field(s): {', '.join(unknown)}."
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        selected = set(requested) if requested is not None else set(available) - expandable
+        selected.update(expanded)
+        return frozenset(selected)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset')
+        is_top_level = self.parent is None or (
+            isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None
+        )
+        if fieldset is None or not is_top_level:
+            return fields
+        return {name: field for name, field in fields.items() if name in fieldset}
+
+    @classmethod
+    def narrow_queryset(cls, queryset, context):
+        """
+        queryset with only() the columns the selected fields read,
+        select_related() for nested forward relations and
+        prefetch_related() for nested reverse ones.
+        """
+        try:
+            plan = _RowPlan(cls(context=context), queryset.model)
+        except ValuesUnsupported:
+            return queryset
+
+        columns = list(plan.columns)
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        columns += [name for name in getattr(cls, 'fragment_version_fields', ()) if name in model_fields]
+        queryset = queryset.only(*columns)
+        if plan.related:
+            queryset = queryset.select_related(*plan.related)
+        for name, child_plan, child_model, fk, fk_index, source in plan.many:
+            children = child_model._default_manager.only(*child_plan.columns)
+            queryset = queryset.prefetch_related(Prefetch(source, queryset=children))
+        return queryset
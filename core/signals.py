@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+
+# Sent after a record that belongs to a school is created, updated or deleted.
+# The sender is the model class and receivers get `pk`, `school_id` (None for
+# users without a school) and `deleted`. `instance` is passed when the change
+# was made in this process; changes replayed from other workers by core.bus
+# have `instance=None` and `remote=True`, so receivers must be able to work
+# from the ids alone.
+school_data_changed = Signal()
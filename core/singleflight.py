@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from rest_framework.response import Response
+
+from core.access import get_access_scope
+from core.cache import get_request_signature, get_school_generation
+
+SINGLE_FLIGHT_CACHE_ALIAS = 'single_flight'
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+@contextmanager
+def cross_process_lock(key):
+    """
+    Serialize a computation across workers with a PostgreSQL advisory lock.
+    A no-op on other databases.
+    """
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    lock_id = int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], 'big', signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s)', [lock_id])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [lock_id])
+
+
+class SingleFlight:
+    """
+    Let concurrent identical computations share one result.
+
+    The first thread to ask for `key` runs the function; threads asking for
+    the same key while it runs wait for and receive the same result (or
+    exception). Nothing is kept once the call finishes.
+
+    With SINGLE_FLIGHT_CROSS_PROCESS enabled, a call for a school also takes
+    a cross-process lock and shares its result for SINGLE_FLIGHT_RESULT_TTL
+    seconds through the 'single_flight' cache, so workers queued behind it
+    reuse the result instead of recomputing. The result is kept under the
+    school's data generation, so a write makes it unreachable at once. The
+    cache has to be shared by the workers (see core.checks).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, school_id=None):
+        """fn()'s result, shared with concurrent callers; `school_id` lets other workers share it too."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, fn, school_id)
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, fn):
+        """
+        do() for coroutines on one event loop: `fn` returns an awaitable and
+        concurrent callers await the same task. Always in-process.
+        """
+        calls_key = (asyncio.get_running_loop(), key)
+        task = self._async_calls.get(calls_key)
+        if task is None:
+            task = self._async_calls[calls_key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._async_done(calls_key, done))
+        # A caller that goes away (e.g. its client disconnects) doesn't cancel
+        # the computation the others are waiting for
+        return await asyncio.shield(task)
+
+    def _async_done(self, calls_key, task):
+        if self._async_calls.get(calls_key) is task:
+            del self._async_calls[calls_key]
+        if not task.cancelled():
+            # Mark it retrieved in case every caller went away
+            task.exception()
+
+    def _run(self, key, fn, school_id):
+        if school_id is None or not getattr(settings, 'SINGLE_FLIGHT_CROSS_PROCESS', False):
+            return fn()
+
+        cache = caches[SINGLE_FLIGHT_CACHE_ALIAS]
+        cache_key = f'single-flight:{school_id}:{get_school_generation(school_id)}:{key}'
+        with cross_process_lock(cache_key):
+            result = cache.get(cache_key)
+            if result is None:
+                result = fn()
+                cache.set(cache_key, result, getattr(settings, 'SINGLE_FLIGHT_RESULT_TTL', 2))
+        return result
+
+
+single_flight = SingleFlight()
+
+
+class SingleFlightListMixin:
+    """
+    Coalesce concurrent identical list requests (same school, access scope,
+    path and query) into one queryset evaluation and serialization.
+    """
+
+    def get_single_flight_key(self, request):
+        signature = get_request_signature(request)
+        if signature is None:
+            return None
+        return f'{type(self).__name__}:{":".join(str(part) for part in signature)}'
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_single_flight_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+        data = single_flight.do(
+            key, lambda: super(SingleFlightListMixin, self).list(request, *args, **kwargs).data,
+            get_access_scope(request).school_id,
+        )
+        return Response(data)
@@ -0,0 +1,262 @@
+import base64
+import binascii
+import datetime
+import hashlib
+import heapq
+import json
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.signals import school_data_changed
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def _classes(queryset, scope):
+    queryset = queryset.filter(school_id=scope.school_id)
+    if scope.is_class_only:
+        queryset = queryset.filter(pk__in=scope.class_ids)
+    return queryset
+
+
+def _students(queryset, scope):
+    queryset = queryset.filter(school_id=scope.school_id)
+    if scope.is_class_only:
+        queryset = queryset.filter(class_assigned_id__in=scope.class_ids)
+    return queryset
+
+
+def _teachers(queryset, scope):
+    return queryset.filter(school_id=scope.school_id)
+
+
+def _class_assignments(queryset, scope):
+    queryset = queryset.filter(teacher__school_id=scope.school_id)
+    if scope.is_class_only:
+        queryset = queryset.filter(assigned_class_id__in=scope.class_ids)
+    return queryset
+
+
+def _student_attendance(queryset, scope):
+    queryset = queryset.filter(student__school_id=scope.school_id)
+    if scope.is_class_only:
+        queryset = queryset.filter(student__class_assigned_id__in=scope.class_ids)
+    return queryset
+
+
+def _teacher_attendance(queryset, scope):
+    return queryset.filter(teacher__school_id=scope.school_id)
+
+
+# Synced record types, in the order that breaks updated_at ties in the
+# cursor: (type, model label, serializer, visible rows, queryset for the
+# serializer). The rows a user sees match the corresponding list views.
+SYNCED_TYPES = (
+    ('class', 'students.Class', 'students.serializers.ClassSerializer', _classes,
+     lambda queryset, serializer: serializer.annotate_queryset(queryset)),
+    ('student', 'students.Student', 'students.serializers.StudentSerializer', _students,
+     lambda queryset, serializer: queryset),
+    ('teacher', 'teachers.Teacher', 'teachers.serializers.TeacherSerializer', _teachers,
+     lambda queryset, serializer: queryset.select_related('user').prefetch_related('class_assignments')),
+    ('teacher_class_assignment', 'teachers.TeacherClassAssignment',
+     'teachers.serializers.TeacherClassAssignmentSyncSerializer', _class_assignments,
+     lambda queryset, serializer: queryset.select_related('teacher')),
+    ('student_attendance', 'students.StudentAttendance', 'students.serializers.StudentAttendanceSerializer',
+     _student_attendance, lambda queryset, serializer: queryset.select_related('student__class_assigned')),
+    ('teacher_attendance', 'teachers.TeacherAttendance', 'teachers.serializers.TeacherAttendanceSerializer',
+     _teacher_attendance, lambda queryset, serializer: queryset.select_related('teacher')),
+)
+
+SYNCED_MODELS = {label: kind for kind, label, _, _, _ in SYNCED_TYPES}
+
+# The class a deleted record of each class-scoped type belonged to; the
+# others are seen by the whole school
+TOMBSTONE_CLASS = {
+    'class': lambda pk, instance: pk,
+    'student': lambda pk, instance: instance.class_assigned_id,
+    'teacher_class_assignment': lambda pk, instance: instance.assigned_class_id,
+    'student_attendance': lambda pk, instance: instance.student.class_assigned_id,
+}
+
+# Position of the deletions in the cursor order, after every record type
+TOMBSTONES = len(SYNCED_TYPES)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _to_micros(value):
+    return (value - EPOCH) // MICROSECOND
+
+
+def _from_micros(micros):
+    return EPOCH + datetime.timedelta(microseconds=micros)
+
+
+def encode_cursor(position, scope_token):
+    raw = json.dumps([*position, scope_token], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    """((microseconds, source, pk), scope token) of a cursor from encode_cursor()."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        micros, source, pk, scope_token = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not all(isinstance(value, int) for value in (micros, source, pk)) or not isinstance(scope_token, str):
+        raise InvalidCursor(cursor)
+    if not 0 <= source <= TOMBSTONES + 1 or not 0 <= pk < 2 ** 63:
+        raise InvalidCursor(cursor)
+    try:
+        _from_micros(micros)
+    except OverflowError:
+        raise InvalidCursor(cursor)
+    return (micros, source, pk), scope_token
+
+
+def get_scope_token(scope):
+    """
+    Digest of what the user may see. When it changes (e.g. a class-only
+    teacher's classes, or the students in them), a client's synced data no
+    longer matches and the next sync starts over.
+    """
+    parts = [scope.school_id, scope.cache_key]
+    if scope.is_class_only:
+        parts.append(sorted(scope.class_ids))
+        # A student moving out of these classes leaves no tombstone
+        Student = apps.get_model('students', 'Student')
+        parts.append(list(
+            Student.objects.filter(class_assigned_id__in=scope.class_ids).order_by('pk').values_list('pk', flat=True)
+        ))
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+def _after(field, position, source):
+    """Rows of `source` that come after `position` in the cursor order."""
+    if position is None:
+        return Q()
+    moment = _from_micros(position[0])
+    if source < position[1]:
+        return Q(**{f'{field}__gt': moment})
+    if source == position[1]:
+        return Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'pk__gt': position[2]})
+    return Q(**{f'{field}__gte': moment})
+
+
+def get_changes(scope, cursor=None, limit=None, context=None):
+    """
+    Changes visible to `scope` after `cursor`, oldest first, as a dict of
+    `changes`, the next `cursor`, `has_more` and `reset`.
+
+    Records are ordered by (updated_at, type, pk) and deletions by their
+    tombstone. Only changes older than SYNC_SETTLE_SECONDS are returned,
+    so a transaction that committed late is never skipped. `reset` means
+    the client must drop what it synced before and apply this page from
+    scratch: the request had no cursor, the user's scope changed or the
+    cursor is older than the tombstones kept. Raises InvalidCursor.
+
+    Records that leave a class-only teacher's classes aren't reported as
+    deleted; the scope changes instead, so the teacher's next sync resets.
+    """
+    limit = limit or settings.SYNC_PAGE_SIZE
+    scope_token = get_scope_token(scope)
+    now = timezone.now()
+    until = now - datetime.timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+
+    position = None
+    if cursor:
+        position, token = decode_cursor(cursor)
+        retention = datetime.timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        if token != scope_token or _from_micros(position[0]) < now - retention:
+            position = None
+    reset = position is None
+
+    # Keys of the next limit + 1 changes of each source, then merged
+    Tombstone = apps.get_model('core', 'Tombstone')
+    sources = []
+    for index, (_, label, _, visible, _) in enumerate(SYNCED_TYPES):
+        model = apps.get_model(label)
+        queryset = visible(model._default_manager.all(), scope)
+        sources.append((index, queryset, 'updated_at'))
+    if not reset:
+        tombstones = Tombstone.objects.filter(school_id=scope.school_id)
+        if scope.is_class_only:
+            tombstones = tombstones.filter(
+                ~Q(kind__in=TOMBSTONE_CLASS) | Q(class_id__in=scope.class_ids)
+            )
+        sources.append((TOMBSTONES, tombstones, 'deleted_at'))
+
+    keyed = []
+    for index, queryset, field in sources:
+        rows = queryset.filter(_after(field, position, index), **{f'{field}__lte': until}) \
+            .order_by(field, 'pk').values_list(field, 'pk')[:limit + 1]
+        keyed.append([(_to_micros(moment), index, pk) for moment, pk in rows])
+    page = list(heapq.merge(*keyed))[:limit + 1]
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    changes = _load_changes(page, context or {})
+    if has_more:
+        next_position = page[-1]
+    else:
+        # Everything up to `until` has been seen
+        next_position = (_to_micros(until), TOMBSTONES + 1, 0)
+        if position is not None and next_position < position:
+            next_position = position
+    return {
+        'changes': changes,
+        'cursor': encode_cursor(next_position, scope_token),
+        'has_more': has_more,
+        'reset': reset,
+    }
+
+
+def _load_changes(page, context):
+    wanted = {}
+    for _, index, pk in page:
+        wanted.setdefault(index, []).append(pk)
+
+    loaded = {}
+    for index, pks in wanted.items():
+        if index == TOMBSTONES:
+            Tombstone = apps.get_model('core', 'Tombstone')
+            for tombstone in Tombstone.objects.filter(pk__in=pks):
+                loaded[index, tombstone.pk] = {
+                    'type': tombstone.kind, 'op': 'delete',
+                    'id': tombstone.object_id, 'custom_id': tombstone.custom_id,
+                }
+            continue
+        kind, label, serializer_path, _, prepare = SYNCED_TYPES[index]
+        serializer_class = import_string(serializer_path)
+        queryset = apps.get_model(label)._default_manager.filter(pk__in=pks)
+        objects = list(prepare(queryset, serializer_class))
+        data = serializer_class(objects, many=True, context=context).data
+        for obj, representation in zip(objects, data):
+            loaded[index, obj.pk] = {'type': kind, 'op': 'upsert', 'id': obj.pk, 'data': representation}
+
+    # A row can be deleted between the two queries; its tombstone follows
+    return [loaded[index, pk] for _, index, pk in page if (index, pk) in loaded]
+
+
+@receiver(school_data_changed)
+def record_tombstone(sender, pk, school_id, deleted, instance=None, remote=False, **kwargs):
+    if not deleted or remote or school_id is None:
+        return
+    kind = SYNCED_MODELS.get(sender._meta.label)
+    if kind is None:
+        return
+    class_of = TOMBSTONE_CLASS.get(kind)
+    Tombstone = apps.get_model('core', 'Tombstone')
+    Tombstone.objects.create(
+        school_id=school_id, kind=kind, object_id=pk, custom_id=getattr(instance, 'custom_id', None),
+        class_id=class_of(pk, instance) if class_of else None,
+    )
@@ -0,0 +1,95 @@
+"""Fixtures and stand-ins shared by the apps' tests."""
+import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from schools.models import School
+from students.models import Class, Student
+from teachers.models import Teacher, TeacherClassAssignment
+from users.models import User
+
+
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+class SharedTransport:
+    """Stands in for a cross-worker invalidation bus transport."""
+    enabled = True
+
+    def publish(self, payload):
+        pass
+
+
+def make_admin(email='admin@example.com', full_name='Ada Admin'):
+    return User.objects.create_user(email, full_name, 'Passw0rd!', role='admin', is_verified=True)
+
+
+def make_school(admin, school_name='Hilltop'):
+    return School.objects.create(school_name=school_name, address='1 Road', description='d', admin=admin)
+
+
+def make_student(school, **fields):
+    number = Student.objects.count() + 1
+    values = {
+        'school': school,
+        'registration_number': f'STU/{number:04d}',
+        'first_name': 'John',
+        'last_name': 'Doe',
+        'date_of_birth': datetime.date(2012, 3, 4),
+        'gender': 'male',
+        'address': 'x',
+        'parent_name': 'Jane Doe',
+        'parent_phone': '+234 803 123 4567',
+        'admission_date': datetime.date(2020, 9, 1),
+    }
+    values.update(fields)
+    return Student.objects.create(**values)
+
+
+def make_teacher(school, classes=(), **fields):
+    """A teacher with a user of their own, assigned to `classes` (the first one primary)."""
+    number = Teacher.objects.count() + 1
+    user = User.objects.create_user(
+        f'teacher{number}@example.com', 'Tom Teacher', 'Passw0rd!', role='teacher', is_verified=True
+    )
+    values = {
+        'user': user, 'school': school, 'first_name': 'Tom', 'last_name': 'Teacher',
+        'date_of_birth': datetime.date(1990, 1, 1), 'gender': 'male', 'phone_number': '08030000000',
+        'address': 'x', 'state': 'Lagos', 'city': 'Ikeja', 'emergency_contact_name': 'Ann',
+        'emergency_contact_relationship': 'Sister', 'emergency_contact_phone': '08030000001',
+        'highest_certificate': 'BSc', 'school_name': 'Unilag', 'graduation_year': 2012,
+        'employee_id': f'EMP{number}', 'joining_date': datetime.date(2020, 1, 1), 'salary': '1000.50',
+    }
+    values.update(fields)
+    teacher = Teacher.objects.create(**values)
+    for index, school_class in enumerate(classes):
+        TeacherClassAssignment.objects.create(teacher=teacher, assigned_class=school_class, is_primary=index == 0)
+    return teacher
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+class SchoolTestCase(TestCase):
+    """An admin with a school and one class, and a client logged in as the admin."""
+
+    def setUp(self):
+        clear_caches()
+        self.admin = make_admin()
+        self.school = make_school(self.admin)
+        self.school_class = Class.objects.create(school=self.school, class_name='JSS1')
+        self.client = client_for(self.admin)
+
+    def make_student(self, **fields):
+        return make_student(self.school, **{'class_assigned': self.school_class, **fields})
+
+    def make_teacher(self, classes=(), **fields):
+        return make_teacher(self.school, classes, **fields)
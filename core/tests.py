@@ -1,3 +1,264 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import json
+import threading
+import time
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+import msgpack
+
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from students.models import Class
+from .batch import _run_isolated
+from .cache import bump_school_generation
+from .checks import check_single_flight_cache
+from .hashing import HashingBusy, HashingExecutor
+from .parsers import MessagePackParser
+from .renderers import MessagePackRenderer, ORJSONRenderer
+from .singleflight import SINGLE_FLIGHT_CACHE_ALIAS, SingleFlight
+from .testing import clear_caches, client_for, make_admin, make_school
+from .views import gather_reads
+
+
+class BatchTests(TransactionTestCase):
+    # Sub-requests commit as they go, as they would if sent separately
+
+    def setUp(self):
+        clear_caches()
+        self.admin = make_admin()
+        self.school = make_school(self.admin)
+        self.client = client_for(self.admin)
+
+    def batch(self, requests, parallel=False):
+        response = self.client.post('/api/batch/', {'requests': requests, 'parallel': parallel}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['responses']
+
+    def test_responses_come_back_in_order(self):
+        responses = self.batch([
+            {'path': '/api/users/profile/'},
+            {'path': '/api/students/classes/'},
+            {'path': '/api/nowhere/'},
+        ], parallel=True)
+        self.assertEqual([response['status'] for response in responses], [200, 200, 404])
+        self.assertEqual(responses[0]['body']['email'], 'admin@example.com')
+        self.assertEqual(responses[1]['body'], [])
+
+    def test_reads_after_a_write_see_it(self):
+        responses = self.batch([
+            {'path': '/api/students/classes/'},
+            {'method': 'POST', 'path': '/api/students/classes/', 'body': {'class_name': 'JSS1'}},
+            {'path': '/api/students/classes/'},
+        ], parallel=True)
+        self.assertEqual([response['status'] for response in responses], [200, 201, 200])
+        self.assertEqual(responses[0]['body'], [])
+        self.assertEqual([item['class_name'] for item in responses[2]['body']], ['JSS1'])
+        self.assertEqual(Class.objects.filter(school=self.school).count(), 1)
+
+    def test_failing_sub_request_does_not_fail_the_batch(self):
+        responses = self.batch([
+            {'method': 'POST', 'path': '/api/students/classes/', 'body': {}},
+            {'path': '/api/users/profile/'},
+        ])
+        self.assertEqual([response['status'] for response in responses], [400, 200])
+
+    def test_batch_endpoint_cannot_be_nested(self):
+        response = self.client.post('/api/batch/', {'requests': [{'path': '/api/batch/'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_parallel_workers_close_their_connections(self):
+        with mock.patch('core.batch.connections') as connections, \
+                mock.patch('core.batch.run_sub_request', return_value={'status': 200}):
+            self.assertEqual(_run_isolated(None, 'GET', '/api/users/profile/', None), {'status': 200})
+        connections.close_all.assert_called_once_with()
+
+
+class SingleFlightTests(TestCase):
+
+    def setUp(self):
+        clear_caches()
+        self.flight = SingleFlight()
+        self.calls = 0
+
+    def compute(self, result='result'):
+        self.calls += 1
+        return result
+
+    def test_concurrent_calls_share_one_run(self):
+        started, release = threading.Event(), threading.Event()
+        results = []
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return self.compute()
+
+        leader = threading.Thread(target=lambda: results.append(self.flight.do('key', slow)))
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(target=lambda: results.append(self.flight.do('key', self.compute)))
+            for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        # Let the followers reach the wait before the leader finishes
+        time.sleep(0.2)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+        self.assertEqual(results, ['result'] * 4)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight._calls, {})
+
+    def test_errors_reach_every_caller_and_are_not_kept(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.flight.do('key', lambda: 1 / 0)
+        self.assertEqual(self.flight.do('key', self.compute), 'result')
+
+    def test_async_callers_share_one_run(self):
+        async def compute():
+            await asyncio.sleep(0.01)
+            return self.compute()
+
+        async def main():
+            return await asyncio.gather(*(self.flight.ado('key', compute) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ['result'] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight._async_calls, {})
+
+    def test_cancelled_leader_does_not_fail_the_others(self):
+        async def compute():
+            await asyncio.sleep(0.05)
+            return self.compute()
+
+        async def main():
+            leader = asyncio.ensure_future(self.flight.ado('key', compute))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(self.flight.ado('key', compute))
+            await asyncio.sleep(0)
+            # The leader's client disconnects
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        self.assertEqual(asyncio.run(main()), 'result')
+        self.assertEqual(self.calls, 1)
+
+    @override_settings(SINGLE_FLIGHT_CROSS_PROCESS=True, SINGLE_FLIGHT_RESULT_TTL=60)
+    def test_results_are_shared_across_processes_until_the_school_changes(self):
+        other_worker = SingleFlight()
+        self.assertEqual(self.flight.do('key', self.compute, school_id=1), 'result')
+        self.assertEqual(other_worker.do('key', lambda: self.compute('other'), school_id=1), 'result')
+        self.assertEqual(self.calls, 1)
+
+        bump_school_generation(1)
+        self.assertEqual(other_worker.do('key', lambda: self.compute('new'), school_id=1), 'new')
+        # Calls that aren't for a school are never shared
+        self.assertEqual(other_worker.do('key', lambda: self.compute('own')), 'own')
+
+    def test_cross_process_sharing_refuses_a_per_worker_cache(self):
+        caches_setting = {**settings.CACHES, SINGLE_FLIGHT_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}
+        with override_settings(CACHES=caches_setting, SINGLE_FLIGHT_CROSS_PROCESS=True):
+            self.assertEqual([error.id for error in check_single_flight_cache(None)], ['core.E001'])
+        with override_settings(SINGLE_FLIGHT_CROSS_PROCESS=True):
+            self.assertEqual(check_single_flight_cache(None), [])
+
+
+@override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_MAX_QUEUE=1)
+class HashingExecutorTests(TestCase):
+
+    def test_full_queue_is_turned_away(self):
+        executor = HashingExecutor()
+        release = threading.Event()
+        running = executor.submit(release.wait)
+        queued = executor.submit(lambda: 'hashed')
+        with self.assertRaises(HashingBusy), self.assertLogs('core.hashing', 'WARNING'):
+            executor.submit(lambda: 'hashed')
+        self.assertEqual(executor.stats()['rejected'], 1)
+
+        release.set()
+        self.assertTrue(running.result(timeout=5))
+        self.assertEqual(queued.result(timeout=5), 'hashed')
+        # The slots are free again once the tasks are done
+        self.assertEqual(asyncio.run(executor.run(lambda: 'hashed')), 'hashed')
+        self.assertEqual(executor.stats()['completed'], 3)
+
+
+
+
+class GatherReadsTests(TestCase):
+
+    def test_functions_run_concurrently_on_their_own_threads(self):
+        both_started = threading.Barrier(2, timeout=5)
+
+        def read(value):
+            # Fails unless the other function is running at the same time
+            both_started.wait()
+            return value, threading.get_ident()
+
+        with mock.patch('core.views.close_old_connections') as close_old_connections:
+            results = asyncio.run(gather_reads(lambda: read('a'), lambda: read('b')))
+        self.assertEqual([value for value, _ in results], ['a', 'b'])
+        self.assertNotEqual(results[0][1], results[1][1])
+        self.assertEqual(close_old_connections.call_count, 2)
+
+
+class RendererTests(TestCase):
+    data = {
+        'name': 'Zoë \u2028 line \u2029 paragraph',
+        'at': datetime.datetime(2024, 5, 6, 7, 8, 9, 123456, tzinfo=datetime.timezone.utc),
+        'local': datetime.datetime(2024, 5, 6, 7, 8, 9, tzinfo=datetime.timezone(datetime.timedelta(hours=1))),
+        'day': datetime.date(2024, 5, 6),
+        'time': datetime.time(7, 8, 9, 500000),
+        'fee': Decimal('12.50'),
+        'uuid': uuid.UUID(int=1),
+        'label': gettext_lazy('Present'),
+        'counts': {1: 2},
+        'items': [None, True, 1.5, -3, []],
+    }
+
+    def test_orjson_output_is_byte_for_byte_jsonrenderers(self):
+        for data in (self.data, [self.data], {'big': 2 ** 70}, 'text', None):
+            self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data), data)
+        indented = 'application/json; indent=2'
+        self.assertEqual(ORJSONRenderer().render(self.data, indented), JSONRenderer().render(self.data, indented))
+
+    def test_line_and_paragraph_separators_are_escaped(self):
+        rendered = ORJSONRenderer().render({'name': '\u2028\u2029'})
+        self.assertEqual(rendered, b'{"name":"\\u2028\\u2029"}')
+
+    def test_msgpack_round_trip_gives_the_json_values(self):
+        # The parser only takes string keys, as JSON has
+        data = {key: value for key, value in self.data.items() if key != 'counts'}
+        parsed = MessagePackParser().parse(io.BytesIO(MessagePackRenderer().render(data)))
+        self.assertEqual(parsed, json.loads(JSONRenderer().render(data)))
+
+    def test_msgpack_requests_and_responses(self):
+        admin = make_admin()
+        make_school(admin)
+        client = client_for(admin)
+        response = client.post('/api/students/classes/', msgpack.packb({'class_name': 'JSS1'}),
+                               content_type='application/msgpack', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content)['class_name'], 'JSS1')
+
+        as_json = client.get('/api/students/classes/').json()
+        response = client.get('/api/students/classes/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), as_json)
+
+        response = client.post('/api/students/classes/', b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
 
-# Create your tests here.
@@ -0,0 +1,110 @@
+import hashlib
+import time
+
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+THROTTLE_CACHE_ALIAS = 'throttle'
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Sliding window per identity: a rate of 'N/period' (DEFAULT_THROTTLE_RATES,
+    looked up as '<view.throttle_scope>_<suffix>') allows N requests in any
+    `period`. Nothing is checked before it but the request line, so floods
+    are turned away before any serializer, hashing or email work.
+
+    The window is approximated with two atomic counters in the 'throttle'
+    cache: the requests in the current fixed period and in the previous one,
+    weighted by how much of it still overlaps the window.
+
+    With `count_rejected`, rejected requests are counted too, so a sustained
+    flood stays throttled instead of getting N requests through per period.
+    """
+    suffix = None
+    count_rejected = True
+
+    def get_identity(self, request, view):
+        raise NotImplementedError('.get_identity() must be overridden')
+
+    def get_rate(self, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return None
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}_{self.suffix}')
+        if rate is None:
+            return None
+        num, period = rate.split('/')
+        return f'{scope}_{self.suffix}', int(num), PERIODS[period[0]]
+
+    def allow_request(self, request, view):
+        rate = self.get_rate(view)
+        if rate is None:
+            return True
+        identity = self.get_identity(request, view)
+        if not identity:
+            return True
+        scope, self.capacity, self.period = rate
+
+        cache = caches[THROTTLE_CACHE_ALIAS]
+        digest = hashlib.sha256(identity.encode()).hexdigest()[:32]
+        now = time.time()
+        slot = int(now // self.period)
+        self.elapsed = now / self.period - slot
+        key = f'throttle:{scope}:{digest}:{slot}'
+
+        cache.add(key, 0, timeout=2 * self.period)
+        try:
+            self.spent = cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr()
+            self.spent = 1
+        self.previous = cache.get(f'throttle:{scope}:{digest}:{slot - 1}', 0)
+        if self.previous * (1 - self.elapsed) + self.spent <= self.capacity:
+            return True
+        if not self.count_rejected:
+            try:
+                cache.decr(key)
+            except ValueError:
+                pass
+        return False
+
+    def wait(self):
+        if self.spent >= self.capacity or not self.previous:
+            # Only the next period leaves enough room
+            return (1 - self.elapsed) * self.period
+        # Until enough of the previous period's spending has drained
+        drained = 1 - (self.capacity - self.spent) / self.previous
+        return max(drained - self.elapsed, 0) * self.period
+
+
+class IPSlidingWindowThrottle(SlidingWindowThrottle):
+    """Window per client IP (REMOTE_ADDR, or X-Forwarded-For with NUM_PROXIES)."""
+    suffix = 'ip'
+
+    def get_identity(self, request, view):
+        return self.get_ident(request)
+
+
+class EmailSlidingWindowThrottle(SlidingWindowThrottle):
+    """
+    Window per email address in the request body, whoever sends it.
+
+    This is a deliberate trade-off: it caps password guesses and emails per
+    account however many addresses an attacker uses, at the price of letting
+    a flood aimed at an address lock its owner out as well. Rejected
+    requests are not counted, so the lockout ends one period after the
+    flood's accepted requests stop, and the IP window caps how much of it
+    any one client can cause.
+    """
+    suffix = 'email'
+    count_rejected = False
+
+    def get_identity(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str):
+            return None
+        return email.strip().lower()
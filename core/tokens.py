@@ -0,0 +1,195 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from core.authentication import auth_user_cache
+from core.bus import invalidation_bus
+from core.signals import school_data_changed
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings: no false negatives, false
+    positives at roughly `error_rate` once `capacity` items are added.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class BlacklistFilter:
+    """
+    Per-worker Bloom filter of blacklisted refresh-token jtis.
+
+    A jti that is not in the filter is certainly not blacklisted, so the
+    common case costs no query; a hit is confirmed against BlacklistedToken.
+    The filter is rebuilt from the unexpired blacklist entries every
+    TOKEN_BLACKLIST_FILTER_REBUILD_INTERVAL seconds (dropping expired ones
+    and resizing for growth) and updated in place as tokens are blacklisted,
+    in this worker directly and in the others through the invalidation bus.
+    Without a cross-worker bus, a token blacklisted in another worker would
+    be missing from this filter until the next rebuild, so every check goes
+    to the database instead.
+    """
+
+    def __init__(self):
+        self._filter = None
+        self._built_at = 0
+        self._pending = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    @property
+    def rebuild_interval(self):
+        return getattr(settings, 'TOKEN_BLACKLIST_FILTER_REBUILD_INTERVAL', 3600)
+
+    @property
+    def error_rate(self):
+        return getattr(settings, 'TOKEN_BLACKLIST_FILTER_ERROR_RATE', 0.001)
+
+    def rebuild(self):
+        with self._build_lock:
+            with self._lock:
+                # Tokens blacklisted while we read go into the new filter too
+                self._pending = []
+            jtis = list(
+                BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+                .values_list('token__jti', flat=True)
+                .iterator(chunk_size=10000)
+            )
+            # Room to grow until the next rebuild
+            bloom = BloomFilter(capacity=2 * len(jtis) + 1000, error_rate=self.error_rate)
+            for jti in jtis:
+                bloom.add(jti)
+            with self._lock:
+                for jti in self._pending:
+                    bloom.add(jti)
+                self._pending = None
+                self._filter = bloom
+                self._built_at = time.monotonic()
+
+    def _current(self):
+        if self._filter is None or time.monotonic() - self._built_at > self.rebuild_interval:
+            # One thread rebuilds; the others keep using the old filter
+            if self._filter is None or not self._build_lock.locked():
+                self.rebuild()
+        return self._filter
+
+    def add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+            if self._pending is not None:
+                self._pending.append(jti)
+
+    @property
+    def enabled(self):
+        return invalidation_bus.transport.enabled
+
+    def is_blacklisted(self, jti):
+        if self.enabled and jti not in self._current():
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class RefreshToken(tokens.RefreshToken):
+    """RefreshToken whose blacklist check goes through blacklist_filter."""
+
+    @classmethod
+    def for_untracked_user(cls, user):
+        """
+        for_user() without the OutstandingToken insert. blacklist() still
+        works on these tokens; they are only missing from the per-user
+        outstanding list, so keep it for short-lived refresh tokens.
+        """
+        return super(tokens.BlacklistMixin, cls).for_user(user)
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+
+        if blacklist_filter.is_blacklisted(jti):
+            raise TokenError(_("Token is blacklisted"))
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    token/refresh/ without queries in the common case: the blacklist check
+    hits the Bloom filter and the user comes from auth_user_cache.
+    """
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM, None)
+        if user_id:
+            user = auth_user_cache.get_user(user_id)
+            if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+                raise AuthenticationFailed(
+                    self.error_messages["no_active_account"],
+                    "no_active_account",
+                )
+
+        data = {"access": str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+
+            data["refresh"] = str(refresh)
+
+        return data
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def token_blacklisted(sender, instance, created, **kwargs):
+    if not created:
+        return
+    blacklist_filter.add(instance.token.jti)
+    # Let the other workers add it to their filters
+    school_data_changed.send(sender=sender, pk=instance.pk, school_id=None, deleted=False, instance=instance)
+
+
+@receiver(school_data_changed)
+def add_remote_blacklisted_token(sender, pk, remote=False, **kwargs):
+    if sender is not BlacklistedToken or not remote:
+        return
+    jti = BlacklistedToken.objects.filter(pk=pk).values_list('token__jti', flat=True).first()
+    if jti is not None:
+        blacklist_filter.add(jti)
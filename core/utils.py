@@ -7,6 +7,7 @@ import sib_api_v3_sdk
 from sib_api_v3_sdk.rest import ApiException
 import uuid
 import re
+import unicodedata
 
 def generate_custom_id(prefix, length=7):
     """Generates a custom ID in the format PREFIX + UUID"""
@@ -22,6 +23,19 @@ def generate_custom_id(prefix, length=7):
     return f"{prefix}{alphanumeric_id[:5]}-{alphanumeric_id[5:]}"
 
 
+def normalize_text(text):
+    """Lowercase, strip accents and collapse whitespace for fuzzy matching."""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def normalize_phone(phone):
+    """Keep the last 10 digits so '+234 803 123 4567' matches '08031234567'."""
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[-10:] if len(digits) >= 7 else ''
+
+
 def generate_otp(length=6):
     """Generate a random OTP of specified length."""
     return ''.join(random.choices(string.digits, k=length))
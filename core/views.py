@@ -0,0 +1,265 @@
+import asyncio
+from inspect import iscoroutinefunction
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections
+from django.http import Http404, StreamingHttpResponse
+from rest_framework.generics import GenericAPIView
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.cache import CachedResponseMixin
+from core.serializers import SparseFieldsMixin, ValuesSerializerMixin
+from core.singleflight import SingleFlightListMixin, single_flight
+
+
+class ValuesListMixin:
+    """
+    Serve unpaginated lists through the serializer's values() fast path
+    (core.serializers.ValuesSerializerMixin) when VALUES_FAST_PATH is on.
+    """
+
+    def get_values_data(self, queryset):
+        """The list's data from the fast path, or None to serialize normally."""
+        serializer_class = self.get_serializer_class()
+        if not getattr(settings, 'VALUES_FAST_PATH', True) or self.paginator is not None \
+                or not issubclass(serializer_class, ValuesSerializerMixin):
+            return None
+        return serializer_class.serialize_values(queryset, self.get_serializer_context())
+
+    def list(self, request, *args, **kwargs):
+        data = self.get_values_data(self.filter_queryset(self.get_queryset()))
+        if data is None:
+            return super().list(request, *args, **kwargs)
+        return Response(data)
+
+
+class SparseFieldsViewMixin:
+    """
+    `?fields=` and `?expand=` on reads, for views whose serializer has
+    core.serializers.SparseFieldsMixin: the selected fields go to the
+    serializer context and the queryset fetches only what they need.
+    """
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = None
+            serializer_class = self.get_serializer_class()
+            if self.request.method in SAFE_METHODS and issubclass(serializer_class, SparseFieldsMixin):
+                self._fieldset = serializer_class.get_fieldset(self.request.query_params)
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.get_fieldset() is None or (self.lookup_url_kwarg or self.lookup_field) in self.kwargs:
+            # Object permissions may read any column of a single object
+            return queryset
+        return self.get_serializer_class().narrow_queryset(queryset, self.get_serializer_context())
+
+
+class StreamingListMixin:
+    """
+    Stream unpaginated lists requested with core.renderers.StreamingJSONRenderer
+    (`?format=stream`) from a chunked queryset iterator, so the worker holds
+    one chunk of objects and their JSON at a time rather than the whole list.
+    Response caching and request coalescing don't apply to these; an error
+    part-way through cuts the response short.
+    """
+    stream_chunk_size = 500
+
+    def is_streaming(self, request):
+        return getattr(request.accepted_renderer, 'streaming', False) and self.paginator is None
+
+    def iter_representations(self, queryset):
+        serializer_class = self.get_serializer_class()
+        if getattr(settings, 'VALUES_FAST_PATH', True) and issubclass(serializer_class, ValuesSerializerMixin):
+            items = serializer_class.iter_values(queryset, self.get_serializer_context(), self.stream_chunk_size)
+            if items is not None:
+                return items
+        return self.iter_serialized(queryset)
+
+    def iter_serialized(self, queryset):
+        serializer = self.get_serializer(many=True)
+        objects = queryset.iterator(chunk_size=self.stream_chunk_size)
+        while chunk := list(islice(objects, self.stream_chunk_size)):
+            yield from serializer.to_representation(chunk)
+
+    def get_streaming_response(self, parts):
+        return StreamingHttpResponse(parts, content_type=self.request.accepted_renderer.media_type)
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_streaming(request):
+            return super().list(request, *args, **kwargs)
+        items = self.iter_representations(self.filter_queryset(self.get_queryset()))
+        return self.get_streaming_response(request.accepted_renderer.stream(items))
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView for `async def` handlers. Under ASGI, Django gives every
+    in-flight sync view a thread for the whole request; async handlers only
+    borrow one for each blocking step, so a worker can hold many slow
+    requests at once.
+
+    Authentication, permission and throttle checks (.initial()) and any
+    sync handlers (e.g. the writes of a read/write view) run in a worker
+    thread; exceptions and responses are handled exactly as in APIView.
+    """
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            # Get the appropriate handler method
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(),
+                                  self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        if hasattr(self.response, 'render'):
+            # Render here; Django would otherwise hop to a thread to do it
+            self.response.render()
+        return self.response
+
+
+class AsyncReadMixin:
+    """
+    Async GET for generic views on AsyncAPIView, honouring
+    CachedResponseMixin. Subclasses implement `read()`.
+
+    Whatever may query the database synchronously (the access scope,
+    filter validation, serializers following relations) runs in a worker
+    thread; the main queryset goes through the async ORM.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        key = None
+        if isinstance(self, CachedResponseMixin):
+            key, cached = await sync_to_async(self.get_cached_response)(request)
+            if cached is not None:
+                return cached
+        response = await self.read(request, *args, **kwargs)
+        if key is None:
+            return response
+        return self.cache_response(key, response)
+
+    async def get_filtered_queryset(self):
+        return await sync_to_async(lambda: self.filter_queryset(self.get_queryset()))()
+
+    async def serialize(self, *args, **kwargs):
+        return await sync_to_async(lambda: self.get_serializer(*args, **kwargs).data)()
+
+
+class AsyncListModelMixin(AsyncReadMixin):
+    """
+    list() for AsyncAPIView, honouring SingleFlightListMixin (coalescing
+    concurrent identical requests on the event loop), ValuesListMixin and
+    StreamingListMixin.
+    """
+
+    async def read(self, request, *args, **kwargs):
+        if isinstance(self, StreamingListMixin) and self.is_streaming(request):
+            items = await sync_to_async(
+                lambda: self.iter_representations(self.filter_queryset(self.get_queryset()))
+            )()
+            return self.get_streaming_response(iterate_in_thread(request.accepted_renderer.stream(items)))
+        if isinstance(self, SingleFlightListMixin):
+            key = await sync_to_async(self.get_single_flight_key)(request)
+            if key is not None:
+                return Response(await single_flight.ado(key, lambda: self.list_data(request)))
+        return Response(await self.list_data(request))
+
+    async def list_data(self, request):
+        queryset = await self.get_filtered_queryset()
+
+        if isinstance(self, ValuesListMixin):
+            data = await sync_to_async(self.get_values_data)(queryset)
+            if data is not None:
+                return data
+
+        if self.paginator is not None:
+            page = await sync_to_async(self.paginate_queryset)(queryset)
+            if page is not None:
+                return self.get_paginated_response(await self.serialize(page, many=True)).data
+
+        objects = [obj async for obj in queryset]
+        return await self.serialize(objects, many=True)
+
+
+class AsyncRetrieveModelMixin(AsyncReadMixin):
+    """retrieve() for AsyncAPIView."""
+
+    async def read(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(await self.serialize(instance))
+
+    async def aget_object(self):
+        # Views with their own lookup keep it, in a worker thread
+        if type(self).get_object is not GenericAPIView.get_object:
+            return await sync_to_async(self.get_object)()
+
+        queryset = await self.get_filtered_queryset()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        await sync_to_async(self.check_object_permissions)(self.request, obj)
+        return obj
+
+
+async def gather_reads(*functions):
+    """
+    Run independent read-only query functions concurrently and return their
+    results in order. The async ORM runs a request's queries one after the
+    other on one thread, so each function gets a thread, and database
+    connection, of its own.
+    """
+    def isolated(function):
+        def run():
+            try:
+                return function()
+            finally:
+                # Honour CONN_MAX_AGE for the connection this thread opened
+                close_old_connections()
+        return sync_to_async(run, thread_sensitive=False)()
+
+    return await asyncio.gather(*(isolated(function) for function in functions))
+
+
+async def iterate_in_thread(iterator):
+    """
+    Async iterator over a sync one whose steps block (e.g. run queries),
+    advanced in the request's worker thread. Django would otherwise read a
+    sync StreamingHttpResponse body into memory whole under ASGI.
+    """
+    done = object()
+    next_part = sync_to_async(next)
+    while (part := await next_part(iterator, done)) is not done:
+        yield part
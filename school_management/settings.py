@@ -30,6 +30,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
@@ -45,16 +46,21 @@ INSTALLED_APPS = [
 ]
 
 
+# Sessions, CSRF and messages are skipped on stateless paths
+# (the token-authenticated API), where request.user comes from the DRF
+# authentication classes instead of the session. /admin/ keeps all of them.
+STATELESS_PATH_PREFIXES = ('/api/',)
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
+    'core.middleware.CsrfViewMiddleware',
     #'core.middleware.JWTBlacklistMiddleware',  # Must be before AuthenticationMiddleware
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.AuthenticationMiddleware',
     'core.middleware.TenantMiddleware',  # Our custom middleware for filtering
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -159,19 +165,86 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     
+    # JSON through orjson, and MessagePack for clients that send
+    # `Accept: application/msgpack` / `Content-Type: application/msgpack`.
+    # `?format=stream` streams the big lists as they are serialized (see
+    # core.views.StreamingListMixin)
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'core.renderers.MessagePackRenderer',
+        'core.renderers.StreamingJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'core.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    
       'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'core.authentication.CachedJWTAuthentication',
+        'core.authentication.CachedTokenAuthentication',
         #'rest_framework.authentication.SessionAuthentication',
     ],
+    
+    # Sliding windows for the unauthenticated auth endpoints (core.throttling),
+    # per client IP and per email address: 'login' for login attempts,
+    # 'email_code' for register / resend verification / forgot password,
+    # which each send an email. The email limits apply whoever sends the
+    # request, so a flood aimed at an address also locks its owner out until
+    # it stops; lower them for more protection against guessing, raise them
+    # to make that lockout harder to cause
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.environ.get('THROTTLE_LOGIN_IP', '30/min'),
+        'login_email': os.environ.get('THROTTLE_LOGIN_EMAIL', '10/min'),
+        'email_code_ip': os.environ.get('THROTTLE_EMAIL_CODE_IP', '20/hour'),
+        'email_code_email': os.environ.get('THROTTLE_EMAIL_CODE_EMAIL', '5/hour'),
+    },
+    # Set to the number of proxies in front of the app so client IPs are
+    # taken from X-Forwarded-For
+    'NUM_PROXIES': int(os.environ['NUM_PROXIES']) if os.environ.get('NUM_PROXIES') else None,
 }
 
 
 SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'core.tokens.TokenRefreshSerializer',
 }
 
+# Lean login: no session on login/verify (the API authenticates with tokens),
+# the school fetched with the user, and last_login written in batches every
+# LAST_LOGIN_FLUSH_INTERVAL seconds or LAST_LOGIN_FLUSH_SIZE logins. last_login
+# may therefore lag (by more than the interval while a worker is idle) and is
+# lost for logins not yet written when a worker is killed. Set
+# LEAN_LOGIN_TRACK_OUTSTANDING_TOKENS=False to skip the OutstandingToken insert
+# per login when refresh tokens are short-lived.
+LEAN_LOGIN = os.environ.get('LEAN_LOGIN', 'True') == 'True'
+LEAN_LOGIN_TRACK_OUTSTANDING_TOKENS = os.environ.get('LEAN_LOGIN_TRACK_OUTSTANDING_TOKENS', 'True') == 'True'
+LAST_LOGIN_FLUSH_INTERVAL = int(os.environ.get('LAST_LOGIN_FLUSH_INTERVAL', 60))
+LAST_LOGIN_FLUSH_SIZE = int(os.environ.get('LAST_LOGIN_FLUSH_SIZE', 500))
+
+# Serve register, login and reset-password from the async views (meant for
+# ASGI). They hash passwords on a pool of PASSWORD_HASHING_WORKERS threads
+# (default: one per CPU) with up to PASSWORD_HASHING_MAX_QUEUE waiting
+# (default: 4 per worker); beyond that they answer 503 with Retry-After.
+ASYNC_AUTH_VIEWS = os.environ.get('ASYNC_AUTH_VIEWS', 'False') == 'True'
+PASSWORD_HASHING_WORKERS = int(os.environ['PASSWORD_HASHING_WORKERS']) if os.environ.get('PASSWORD_HASHING_WORKERS') else None
+PASSWORD_HASHING_MAX_QUEUE = int(os.environ['PASSWORD_HASHING_MAX_QUEUE']) if os.environ.get('PASSWORD_HASHING_MAX_QUEUE') else None
+
+# Serve the student, class, teacher and attendance lists, the student and
+# teacher details and the teacher dashboard from async views (meant for ASGI,
+# see README)
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', 'False') == 'True'
+
+# Refresh-token blacklist checks go through a per-worker Bloom filter, rebuilt
+# from the database this often (seconds) and sized for this false-positive rate.
+# The filter needs INVALIDATION_BUS to hear about other workers' logouts;
+# without it every check queries the blacklist.
+TOKEN_BLACKLIST_FILTER_REBUILD_INTERVAL = int(os.environ.get('TOKEN_BLACKLIST_FILTER_REBUILD_INTERVAL', 3600))
+TOKEN_BLACKLIST_FILTER_ERROR_RATE = float(os.environ.get('TOKEN_BLACKLIST_FILTER_ERROR_RATE', 0.001))
+
 
 
 # Email settings
@@ -193,6 +266,171 @@ BREVO_API_KEY = os.environ.get('BREVO_API_KEY')
 #     print("Using console email backend for development")
 
 
+# Caches
+# RESPONSE_CACHE_BACKEND and FRAGMENT_CACHE_BACKEND pick where cached API
+# responses and serializer fragments live: 'locmem' keeps them per worker,
+# 'file' shares them between the workers of one host. Any other value is
+# used as a Django cache backend path.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+}
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'locmem')
+# The per-school data generations that cached responses and ETags are keyed
+# by must be shared by every worker, or one worker's writes leave the others
+# serving stale responses: 'file' (locked increments) covers one host; use
+# e.g. django.core.cache.backends.redis.RedisCache across hosts
+GENERATION_CACHE_BACKEND = os.environ.get('GENERATION_CACHE_BACKEND', 'file')
+FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'locmem')
+# Email verification and password reset codes must be visible to every worker,
+# so 'file' by default; 'db' (run `manage.py createcachetable`) for several
+# hosts, 'locmem' only for a single process
+OTP_CACHE_BACKEND = os.environ.get('OTP_CACHE_BACKEND', 'file')
+# Throttle counters need atomic increments shared by the host's workers:
+# 'file' uses a file cache with locked increments; use a backend path such as
+# django.core.cache.backends.redis.RedisCache to share them between hosts
+THROTTLE_CACHE_BACKEND = os.environ.get('THROTTLE_CACHE_BACKEND', 'file')
+# Results shared by SINGLE_FLIGHT_CROSS_PROCESS have to reach every worker,
+# so not 'locmem' (refused by `manage.py check`)
+SINGLE_FLIGHT_CACHE_BACKEND = os.environ.get('SINGLE_FLIGHT_CACHE_BACKEND', 'file')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': CACHE_BACKENDS.get(RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_BACKEND),
+        'LOCATION': os.environ.get('RESPONSE_CACHE_LOCATION', os.path.join(BASE_DIR, '.cache', 'responses')),
+        'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 600)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 5000)),
+        },
+    },
+    'generations': {
+        'BACKEND': (
+            'core.cache_backends.LockingFileBasedCache' if GENERATION_CACHE_BACKEND == 'file'
+            else CACHE_BACKENDS.get(GENERATION_CACHE_BACKEND, GENERATION_CACHE_BACKEND)
+        ),
+        'LOCATION': os.environ.get('GENERATION_CACHE_LOCATION', os.path.join(BASE_DIR, '.cache', 'generations')),
+        'TIMEOUT': None,
+    },
+    # Per-object serializer output; keys carry the object's version so
+    # entries never need to be invalidated, only evicted
+    'fragments': {
+        'BACKEND': CACHE_BACKENDS.get(FRAGMENT_CACHE_BACKEND, FRAGMENT_CACHE_BACKEND),
+        'LOCATION': os.environ.get('FRAGMENT_CACHE_LOCATION', os.path.join(BASE_DIR, '.cache', 'fragments')),
+        'TIMEOUT': int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', 86400)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 50000)),
+        },
+    },
+    'otp': {
+        # Attempt counters and single use need atomic add() and incr()
+        'BACKEND': (
+            'core.cache_backends.LockingFileBasedCache' if OTP_CACHE_BACKEND == 'file'
+            else CACHE_BACKENDS.get(OTP_CACHE_BACKEND, OTP_CACHE_BACKEND)
+        ),
+        'LOCATION': os.environ.get(
+            'OTP_CACHE_LOCATION',
+            'otp_cache' if OTP_CACHE_BACKEND == 'db' else os.path.join(BASE_DIR, '.cache', 'otp'),
+        ),
+        'TIMEOUT': 7200,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('OTP_CACHE_MAX_ENTRIES', 100000)),
+        },
+    },
+    'single_flight': {
+        'BACKEND': CACHE_BACKENDS.get(SINGLE_FLIGHT_CACHE_BACKEND, SINGLE_FLIGHT_CACHE_BACKEND),
+        'LOCATION': os.environ.get(
+            'SINGLE_FLIGHT_CACHE_LOCATION', os.path.join(BASE_DIR, '.cache', 'single_flight')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('SINGLE_FLIGHT_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+    'throttle': {
+        'BACKEND': (
+            'core.cache_backends.LockingFileBasedCache' if THROTTLE_CACHE_BACKEND == 'file'
+            else CACHE_BACKENDS.get(THROTTLE_CACHE_BACKEND, THROTTLE_CACHE_BACKEND)
+        ),
+        'LOCATION': os.environ.get('THROTTLE_CACHE_LOCATION', os.path.join(BASE_DIR, '.cache', 'throttle')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('THROTTLE_CACHE_MAX_ENTRIES', 100000)),
+        },
+    },
+}
+
+# One-time codes: where they are kept (see users.otp) and how many wrong
+# guesses a code survives
+OTP_STORE = os.environ.get('OTP_STORE', 'users.otp.CacheOTPStore')
+OTP_MAX_ATTEMPTS = int(os.environ.get('OTP_MAX_ATTEMPTS', 5))
+
+# Serve unchanged objects from the fragment cache in opted-in serializers
+SERIALIZER_FRAGMENT_CACHE = os.environ.get('SERIALIZER_FRAGMENT_CACHE', 'True') == 'True'
+
+# Delta sync (/api/schools/sync/): changes per page by default and at most,
+# how old a change must be before it is served (longer than any transaction
+# runs, so none commits behind a cursor) and how long deletions are kept;
+# clients whose cursor is older start over
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+SYNC_MAX_PAGE_SIZE = int(os.environ.get('SYNC_MAX_PAGE_SIZE', 2000))
+SYNC_SETTLE_SECONDS = int(os.environ.get('SYNC_SETTLE_SECONDS', 5))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+
+# Live attendance feed (/api/schools/attendance/live/): seconds between
+# heartbeats on an idle stream, at most how often each school's summary is
+# recomputed, messages a slow client may fall behind before its stream is
+# closed (it reconnects and replays), and the most missed marks replayed
+# on reconnect before the client is told to reload. Across workers the feed
+# uses INVALIDATION_BUS or, when that is 'local', LISTEN/NOTIFY of its own on
+# PostgreSQL. It is served under ASGI only (ASYNC_READ_VIEWS); WSGI gets 503.
+LIVE_FEED_HEARTBEAT_SECONDS = int(os.environ.get('LIVE_FEED_HEARTBEAT_SECONDS', 15))
+LIVE_FEED_SUMMARY_INTERVAL = float(os.environ.get('LIVE_FEED_SUMMARY_INTERVAL', 1))
+LIVE_FEED_QUEUE_SIZE = int(os.environ.get('LIVE_FEED_QUEUE_SIZE', 1000))
+LIVE_FEED_REPLAY_LIMIT = int(os.environ.get('LIVE_FEED_REPLAY_LIMIT', 1000))
+
+# Batch endpoint (/api/batch/): sub-requests per batch, and threads (each
+# with its own database connection) for the GETs of a `parallel` batch
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 4))
+
+# Serialize the student and teacher lists straight from values() rows instead
+# of model instances (same output; skips the fragment cache)
+VALUES_FAST_PATH = os.environ.get('VALUES_FAST_PATH', 'True') == 'True'
+
+# Single-flight: concurrent identical dashboard/report computations in a worker
+# always share one result. With SINGLE_FLIGHT_CROSS_PROCESS the workers also
+# queue on a PostgreSQL advisory lock and reuse the result for
+# SINGLE_FLIGHT_RESULT_TTL seconds, or until the school's data changes
+# (through the 'single_flight' cache, see SINGLE_FLIGHT_CACHE_BACKEND).
+SINGLE_FLIGHT_CROSS_PROCESS = os.environ.get('SINGLE_FLIGHT_CROSS_PROCESS', 'False') == 'True'
+SINGLE_FLIGHT_RESULT_TTL = int(os.environ.get('SINGLE_FLIGHT_RESULT_TTL', 2))
+
+
+# Invalidation bus: how workers tell each other about changed records so their
+# in-process caches stay fresh. 'local' (single process), 'socket' (Unix
+# sockets in INVALIDATION_BUS_SOCKET_DIR, all workers on one host) or
+# 'postgres' (LISTEN/NOTIFY, works across hosts).
+INVALIDATION_BUS = os.environ.get('INVALIDATION_BUS', 'local')
+INVALIDATION_BUS_SOCKET_DIR = os.environ.get('INVALIDATION_BUS_SOCKET_DIR', '/tmp/school_management_bus')
+
+
+# Authenticated users each worker keeps in memory, and for how many seconds.
+# Changes made through the ORM invalidate entries immediately (in every worker
+# when INVALIDATION_BUS is set); the TTL covers writes that bypass signals.
+# Without INVALIDATION_BUS the other workers only see a deactivation or
+# password change when their entry expires, so entries last at most
+# AUTH_USER_CACHE_LOCAL_TTL seconds.
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.environ.get('AUTH_USER_CACHE_MAX_ENTRIES', 10000))
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 60))
+AUTH_USER_CACHE_LOCAL_TTL = int(os.environ.get('AUTH_USER_CACHE_LOCAL_TTL', 5))
+
+
+# Autocomplete: number of per-school prefix indexes each worker keeps in memory
+AUTOCOMPLETE_MAX_SCHOOLS = int(os.environ.get('AUTOCOMPLETE_MAX_SCHOOLS', 100))
+
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # For development only
 
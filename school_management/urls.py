@@ -3,6 +3,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.batch import BatchView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,6 +11,7 @@ urlpatterns = [
     path('api/schools/', include('schools.urls')),
     path('api/teachers/', include('teachers.urls')),
     path('api/students/', include('students.urls')),
+    path('api/batch/', BatchView.as_view(), name='batch'),
    # path('api/finance/', include('finance.urls')),
 ]
 
@@ -1,25 +1,23 @@
-
-from django.contrib.auth import get_user_model
 from rest_framework import permissions
-from schools.models import School
-
-User = get_user_model()
+from core.access import get_access_scope, get_object_school_id
 
 class IsSchoolAdmin(permissions.BasePermission):
     """
     Permission to only allow school admins to access objects in their school.
+    Compares ids from the request's access scope, so it costs no queries.
     """
     
     def has_object_permission(self, request, view, obj):
         # Check if the object is a School
-        if hasattr(obj, 'admin'):
+        if hasattr(obj, 'admin_id'):
             # For School objects
-            return obj.admin == request.user
+            return obj.admin_id == request.user.pk
         
         # For objects that belong to a school (like Class, Student, etc.)
-        if hasattr(obj, 'school'):
+        school_id = get_object_school_id(obj)
+        if school_id is not None:
             # Check if user is the admin of the school this object belongs to
-            return obj.school.admin == request.user
+            return get_access_scope(request).administers(school_id)
         
         # For other objects, deny permission
-        return False
\ No newline at end of file
+        return False
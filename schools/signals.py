@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core.signals import school_data_changed
+from .models import School
+
+
+@receiver(post_save, sender=School)
+def school_saved(sender, instance, **kwargs):
+    school_data_changed.send(
+        sender=sender, pk=instance.pk, school_id=instance.pk, deleted=False, instance=instance
+    )
+
+
+@receiver(post_delete, sender=School)
+def school_deleted(sender, instance, **kwargs):
+    school_data_changed.send(
+        sender=sender, pk=instance.pk, school_id=instance.pk, deleted=True, instance=instance
+    )
@@ -1,3 +1,257 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import override_settings
+from asgiref.sync import async_to_sync
+from rest_framework.exceptions import NotFound
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core import live
+from core.autocomplete import PrefixIndex, autocomplete_registry
+from core.live import attendance_feed
+from core.bus import invalidation_bus
+from core.sync import decode_cursor, encode_cursor
+from core.testing import SchoolTestCase, SharedTransport, client_for
+from students.models import Class, StudentAttendance
+from .views import AsyncAttendanceFeedView
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class SyncTests(SchoolTestCase):
+
+    def sync(self, client=None, cursor=None):
+        params = {'cursor': cursor} if cursor else {}
+        response = (client or self.client).get('/api/schools/sync/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def synced(self, page, kind):
+        return {change['id']: change for change in page['changes'] if change['type'] == kind}
+
+    def test_out_of_range_cursor_is_a_bad_request(self):
+        _, scope_token = decode_cursor(self.sync()['cursor'])
+        for position in ((10 ** 20, 0, 0), (-10 ** 20, 0, 0), (0, 0, 10 ** 30), (0, 99, 0)):
+            response = self.client.get('/api/schools/sync/', {'cursor': encode_cursor(position, scope_token)})
+            self.assertEqual(response.status_code, 400, position)
+        self.assertEqual(self.client.get('/api/schools/sync/', {'cursor': 'garbage'}).status_code, 400)
+
+    def test_pages_follow_the_cursor_and_deletions_leave_tombstones(self):
+        students = [self.make_student(first_name=name) for name in ('Ann', 'Ben', 'Cy')]
+        page = self.sync(cursor=None)
+        self.assertTrue(page['reset'])
+        first = self.client.get('/api/schools/sync/', {'limit': 2}).json()
+        self.assertTrue(first['has_more'])
+        second = self.sync(cursor=first['cursor'])
+        self.assertFalse(second['reset'])
+        synced_ids = [(change['type'], change['id']) for change in first['changes'] + second['changes']]
+        self.assertEqual(synced_ids, [(change['type'], change['id']) for change in page['changes']])
+
+        deleted_id = students[0].pk
+        students[0].delete()
+        page = self.sync(cursor=second['cursor'])
+        self.assertFalse(page['reset'])
+        self.assertIn({'type': 'student', 'op': 'delete', 'id': deleted_id, 'custom_id': students[0].custom_id},
+                      page['changes'])
+        self.assertEqual(self.sync(cursor=page['cursor'])['changes'], [])
+
+    @override_settings(SYNC_TOMBSTONE_RETENTION_DAYS=0)
+    def test_cursor_older_than_the_tombstones_resets(self):
+        self.make_student()
+        cursor = self.sync()['cursor']
+        self.assertTrue(self.sync(cursor=cursor)['reset'])
+
+    def test_another_users_cursor_resets(self):
+        cursor = self.sync()['cursor']
+        client = client_for(self.make_teacher(access_level='full').user)
+        self.assertTrue(self.sync(client, cursor)['reset'])
+
+    def test_student_leaving_a_class_only_teachers_class_resets_their_sync(self):
+        other_class = Class.objects.create(school=self.school, class_name='JSS2')
+        staying, leaving = self.make_student(), self.make_student(first_name='Mary')
+        client = client_for(self.make_teacher([self.school_class], access_level='class_only').user)
+        page = self.sync(client)
+        self.assertEqual(set(self.synced(page, 'student')), {staying.pk, leaving.pk})
+
+        leaving.class_assigned = other_class
+        leaving.save()
+        page = self.sync(client, page['cursor'])
+        self.assertTrue(page['reset'])
+        self.assertEqual(set(self.synced(page, 'student')), {staying.pk})
+
+    def test_class_only_teacher_sees_only_their_classes(self):
+        other_class = Class.objects.create(school=self.school, class_name='JSS2')
+        mine = self.make_student()
+        self.make_student(class_assigned=other_class)
+        client = client_for(self.make_teacher([self.school_class], access_level='class_only').user)
+        page = self.sync(client)
+        self.assertEqual(set(self.synced(page, 'student')), {mine.pk})
+        self.assertEqual(set(self.synced(page, 'class')), {self.school_class.pk})
+
+    def test_class_only_teacher_sees_only_deletions_in_their_classes(self):
+        other_class = Class.objects.create(school=self.school, class_name='JSS2')
+        mine = self.make_student()
+        theirs = self.make_student(class_assigned=other_class)
+        today = datetime.date.today()
+        my_mark = StudentAttendance.objects.create(student=mine, date=today)
+        their_mark = StudentAttendance.objects.create(student=theirs, date=today)
+        client = client_for(self.make_teacher([self.school_class], access_level='class_only').user)
+        cursor, admin_cursor = self.sync(client)['cursor'], self.sync()['cursor']
+
+        my_mark_id, their_mark_id, their_id = my_mark.pk, their_mark.pk, theirs.pk
+        my_mark.delete()
+        their_mark.delete()
+        theirs.delete()
+        page = self.sync(client, cursor)
+        self.assertFalse(page['reset'])
+        deleted = {(change['type'], change['id']) for change in page['changes'] if change['op'] == 'delete'}
+        self.assertEqual(deleted, {('student_attendance', my_mark_id)})
+
+        page = self.sync(cursor=admin_cursor)
+        deleted = {(change['type'], change['id']) for change in page['changes'] if change['op'] == 'delete'}
+        self.assertEqual(deleted, {('student_attendance', my_mark_id), ('student_attendance', their_mark_id),
+                                   ('student', their_id)})
+
+    def test_class_student_count_is_synced_after_enrolments(self):
+        other_class = Class.objects.create(school=self.school, class_name='JSS2')
+        page = self.sync()
+        student = self.make_student()
+        page = self.sync(cursor=page['cursor'])
+        self.assertEqual(self.synced(page, 'class')[self.school_class.pk]['data']['student_count'], 1)
+
+        student.class_assigned = other_class
+        student.save()
+        page = self.sync(cursor=page['cursor'])
+        classes = self.synced(page, 'class')
+        self.assertEqual(classes[self.school_class.pk]['data']['student_count'], 0)
+        self.assertEqual(classes[other_class.pk]['data']['student_count'], 1)
+
+        student_id = student.pk
+        student.delete()
+        page = self.sync(cursor=page['cursor'])
+        self.assertEqual(self.synced(page, 'class')[other_class.pk]['data']['student_count'], 0)
+        self.assertEqual(self.synced(page, 'student')[student_id]['op'], 'delete')
+
+
+class AttendanceFeedTests(SchoolTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(setattr, live, '_feed_bus', None)
+
+    def test_wsgi_feed_is_unavailable(self):
+        # The URL serves the async view only with ASYNC_READ_VIEWS
+        self.assertEqual(self.client.get('/api/schools/attendance/live/').status_code, 503)
+
+    def test_feed_bus_only_without_a_shared_bus_on_postgresql(self):
+        self.assertIsNone(live.get_feed_bus())
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch.object(invalidation_bus, '_transport', None), \
+                override_settings(INVALIDATION_BUS='local'):
+            feed_bus = live.get_feed_bus()
+            self.assertEqual(feed_bus.transport.channel, live.FEED_CHANNEL)
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch.object(invalidation_bus, '_transport', SharedTransport()):
+            self.assertIsNone(live.get_feed_bus())
+
+    def test_marks_are_published_on_the_feed_bus_after_commit(self):
+        student = self.make_student()
+        with mock.patch.object(live, 'get_feed_bus') as get_feed_bus:
+            with self.captureOnCommitCallbacks(execute=True):
+                mark = StudentAttendance.objects.create(student=student, date=datetime.date.today())
+                get_feed_bus.return_value.publish.assert_not_called()
+        get_feed_bus.return_value.publish.assert_called_once_with(
+            'students.StudentAttendance', mark.pk, self.school.pk, False
+        )
+
+    def open_feed(self, **headers):
+        request = APIRequestFactory().get('/api/schools/attendance/live/', **headers)
+        force_authenticate(request, self.admin)
+        return async_to_sync(AsyncAttendanceFeedView.as_view())(request)
+
+    def read(self, response, count):
+        """The next `count` parts of a feed, then closes it."""
+        async def take():
+            parts = []
+            async for part in response.streaming_content:
+                parts.append(part)
+                if len(parts) == count:
+                    break
+            await response.streaming_content.aclose()
+            return parts
+        return async_to_sync(take)()
+
+    @override_settings(SYNC_SETTLE_SECONDS=0, LIVE_FEED_HEARTBEAT_SECONDS=0)
+    def test_reconnect_replays_missed_marks(self):
+        student = self.make_student()
+        seen = StudentAttendance.objects.create(student=student, date=datetime.date(2024, 1, 1))
+        missed = StudentAttendance.objects.create(student=student, date=datetime.date(2024, 1, 2))
+        last_event_id = live.make_event_id(seen.updated_at, 'student_attendance', seen.pk)
+
+        response = self.open_feed(HTTP_LAST_EVENT_ID=last_event_id)
+        self.assertEqual(response.status_code, 200)
+        opening = b''.join(self.read(response, 3))
+        self.assertIn(live.make_event_id(missed.updated_at, 'student_attendance', missed.pk).encode(), opening)
+        self.assertIn(b'event: summary', opening)
+        self.assertFalse(attendance_feed.is_watched(self.school.pk))
+
+    def test_unknown_event_id_resets(self):
+        response = self.open_feed(HTTP_LAST_EVENT_ID='nonsense')
+        self.assertTrue(self.read(response, 1)[0].startswith(b'event: reset'))
+
+    @override_settings(LIVE_FEED_HEARTBEAT_SECONDS=0)
+    def test_subscribes_only_while_the_stream_is_read(self):
+        response = self.open_feed()
+        self.assertFalse(attendance_feed.is_watched(self.school.pk))
+        parts = self.read(response, 2)
+        self.assertEqual(parts[-1], live.HEARTBEAT)
+        self.assertFalse(attendance_feed.is_watched(self.school.pk))
+
+    def test_opening_errors_keep_their_status(self):
+        with mock.patch('schools.views.get_replay', side_effect=NotFound()):
+            response = self.open_feed(HTTP_LAST_EVENT_ID='1-student_attendance-1')
+        self.assertEqual(response.status_code, 404)
+
+
+class AutocompleteTests(SchoolTestCase):
+
+    def setUp(self):
+        super().setUp()
+        autocomplete_registry.invalidate()
+        self.addCleanup(autocomplete_registry.invalidate)
+
+    def complete(self, query, client=None, **params):
+        response = (client or self.client).get('/api/schools/autocomplete/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(result['type'], result['id']) for result in response.json()['results']]
+
+    def test_prefixes_of_label_words_and_detail(self):
+        student = self.make_student(first_name='John', last_name='Doe', registration_number='STU/2024/7')
+        for query in ('jo', 'DOE', 'john d', 'stu/2024'):
+            self.assertEqual(self.complete(query), [('student', student.pk)], query)
+        self.assertEqual(self.complete('jss', types='class'), [('class', self.school_class.pk)])
+        self.assertEqual(self.complete('jss', types='student'), [])
+
+    def test_index_follows_committed_changes(self):
+        self.assertEqual(self.complete('mary'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            student = self.make_student(first_name='Mary')
+        self.assertEqual(self.complete('mary'), [('student', student.pk)])
+        with self.captureOnCommitCallbacks(execute=True):
+            student.delete()
+        self.assertEqual(self.complete('mary'), [])
+
+    def test_class_only_teachers_find_their_classes_only(self):
+        other_class = Class.objects.create(school=self.school, class_name='JSS2')
+        mine = self.make_student(first_name='Mary')
+        self.make_student(first_name='Mark', class_assigned=other_class)
+        client = client_for(self.make_teacher([self.school_class], access_level='class_only').user)
+        self.assertEqual(self.complete('ma', client), [('student', mine.pk)])
+        self.assertEqual(self.complete('jss', client), [('class', self.school_class.pk)])
+
+    def test_each_record_is_returned_once(self):
+        index = PrefixIndex()
+        index.add('student', 1, 'ST1', 'Ann Annabel', 'ANN/1')
+        self.assertEqual(len(index.search('ann')), 1)
+        index.remove('student', 1)
+        self.assertEqual(index.search('ann'), [])
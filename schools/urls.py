@@ -1,7 +1,22 @@
+from django.conf import settings
 from django.urls import path
-from .views import CreateSchoolView, SchoolDetailView
+from .views import (
+    CreateSchoolView,
+    SchoolDetailView,
+    AutocompleteView,
+    SyncView,
+    AttendanceFeedView,
+    AsyncAttendanceFeedView,
+)
+
+# Under ASGI, an open feed shouldn't hold a thread
+if settings.ASYNC_READ_VIEWS:
+    AttendanceFeedView = AsyncAttendanceFeedView
 
 urlpatterns = [
     path('create/', CreateSchoolView.as_view(), name='create-school'),
     path('detail/', SchoolDetailView.as_view(), name='school-detail'),
+    path('autocomplete/', AutocompleteView.as_view(), name='school-autocomplete'),
+    path('sync/', SyncView.as_view(), name='school-sync'),
+    path('attendance/live/', AttendanceFeedView.as_view(), name='school-attendance-live'),
 ]
@@ -5,8 +5,21 @@ from .models import School
 from .serializers import SchoolSerializer
 from .permissions import IsSchoolAdmin
 from core.utils import send_school_creation_email
-from rest_framework.exceptions import NotFound
-from core.permissions import IsAdminOnly
+from rest_framework.exceptions import NotFound, ValidationError
+from core.permissions import IsAdminOnly, IsTeacherOrAdmin
+from core.autocomplete import autocomplete_registry, RESULT_TYPES
+from core.cache import CachedResponseMixin
+from core.access import get_access_scope
+from core.sync import InvalidCursor, get_changes
+from core.live import HEARTBEAT, FeedUnavailable, attendance_feed, get_marks_since, get_replay, summary_message
+from core.renderers import EventStreamRenderer, ORJSONRenderer, render_event
+from core.views import AsyncAPIView
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.views import APIView
+import asyncio
 
 
 class CreateSchoolView(generics.CreateAPIView):
@@ -58,7 +71,7 @@ class CreateSchoolView(generics.CreateAPIView):
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class SchoolDetailView(generics.RetrieveUpdateAPIView):
+class SchoolDetailView(CachedResponseMixin, generics.RetrieveUpdateAPIView):
     serializer_class = SchoolSerializer
     permission_classes = [IsAuthenticated, IsSchoolAdmin]
     
@@ -67,6 +80,140 @@ class SchoolDetailView(generics.RetrieveUpdateAPIView):
             return self.request.user.school
         else:
             raise NotFound("You don't have a school associated with your account.")
+
+
+class AutocompleteView(generics.GenericAPIView):
+    """
+    Prefix search over the school's students, teachers and classes for pickers.
+    Served from an in-memory index, so it is cheap enough to call per keystroke.
+    """
+    permission_classes = [IsAuthenticated, IsTeacherOrAdmin]
+    default_limit = 10
+    max_limit = 50
+    
+    def get(self, request):
+        scope = get_access_scope(request)
+        if scope.school_id is None:
+            raise NotFound("You don't have a school associated with your account.")
+        
+        types = None
+        if request.query_params.get('types'):
+            types = set(request.query_params['types'].split(',')) & RESULT_TYPES
+        
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = max(1, min(limit, self.max_limit))
+        
+        predicate = None
+        if scope.is_class_only:
+            # Class-only teachers only find their own classes and students
+            def predicate(kind, extra):
+                return 'class_id' not in extra or extra['class_id'] in scope.class_ids
         
+        results = autocomplete_registry.search(
+            scope.school_id, request.query_params.get('q', ''), types=types, limit=limit, predicate=predicate
+        )
+        return Response({'results': results})
+
+
+class SyncView(generics.GenericAPIView):
+    """
+    Delta sync for the mobile apps: the classes, students, teachers, class
+    assignments and attendance records created, updated or deleted since
+    `?cursor=` (from the previous page), oldest first, `?limit=` at a time.
+    Follow `cursor` while `has_more`; on `reset`, replace the local copy.
+    """
+    permission_classes = [IsAuthenticated, IsTeacherOrAdmin]
+    
+    def get(self, request):
+        scope = get_access_scope(request)
+        if scope.school_id is None:
+            raise NotFound("You don't have a school associated with your account.")
         
-        
\ No newline at end of file
+        try:
+            limit = int(request.query_params.get('limit', settings.SYNC_PAGE_SIZE))
+        except ValueError:
+            limit = settings.SYNC_PAGE_SIZE
+        limit = max(1, min(limit, settings.SYNC_MAX_PAGE_SIZE))
+        
+        try:
+            changes = get_changes(
+                scope, request.query_params.get('cursor'), limit, self.get_serializer_context()
+            )
+        except InvalidCursor:
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+        return Response(changes)
+
+
+class AttendanceFeedView(APIView):
+    """
+    Live attendance for admin dashboards, as server-sent events: a `mark`
+    for every student or teacher attendance record written or deleted in
+    the school (in the delta sync's format) and the day's `summary` after
+    changes. A reconnecting client's Last-Event-ID replays the marks it
+    missed; `reset` means reload from the list endpoints instead.
+
+    Under WSGI every open feed would hold a worker thread, so this view
+    answers 503; under ASGI (ASYNC_READ_VIEWS) AsyncAttendanceFeedView
+    serves the feed.
+    """
+    permission_classes = [IsAuthenticated, IsAdminOnly]
+    renderer_classes = [EventStreamRenderer, ORJSONRenderer]
+    
+    def get_school_id(self):
+        school_id = get_access_scope(self.request).school_id
+        if school_id is None:
+            raise NotFound("You don't have a school associated with your account.")
+        return school_id
+    
+    def get_opening(self, school_id):
+        """The messages that start the stream: missed marks, then today's summary."""
+        messages = []
+        last_event_id = self.request.headers.get('Last-Event-ID') or self.request.query_params.get('last_event_id')
+        if last_event_id:
+            replay = get_replay(school_id, last_event_id)
+            messages += [render_event('reset', {})] if replay is None else replay
+        messages.append(summary_message(school_id, timezone.localdate()))
+        return messages
+    
+    def get_event_stream(self, parts):
+        response = StreamingHttpResponse(parts, content_type=EventStreamRenderer.media_type)
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the events
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    def get(self, request):
+        raise FeedUnavailable()
+
+
+class AsyncAttendanceFeedView(AsyncAPIView, AttendanceFeedView):
+    """AttendanceFeedView for ASGI: an open feed holds no thread."""
+    
+    async def get(self, request):
+        school_id = await sync_to_async(self.get_school_id)()
+        # Before the response starts, so a failure still gets its status code
+        opened_at = timezone.now()
+        opening = await sync_to_async(self.get_opening)(school_id)
+        return self.get_event_stream(self.astream(school_id, opening, opened_at))
+    
+    def get_catch_up(self, school_id, opened_at):
+        """The marks written between the opening and the subscription."""
+        marks = get_marks_since(school_id, opened_at)
+        return [render_event('reset', {})] if marks is None else marks
+    
+    async def astream(self, school_id, opening, opened_at):
+        for message in opening:
+            yield message
+        # Only once the client reads the stream: one that never does holds nothing
+        subscription = attendance_feed.subscribe(school_id, asyncio.get_running_loop())
+        try:
+            for message in await sync_to_async(self.get_catch_up)(school_id, opened_at):
+                yield message
+            while not subscription.overflowed:
+                message = await subscription.aget(settings.LIVE_FEED_HEARTBEAT_SECONDS)
+                yield HEARTBEAT if message is None else message
+        finally:
+            attendance_feed.unsubscribe(subscription)
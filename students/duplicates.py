@@ -0,0 +1,189 @@
+from collections import defaultdict
+from difflib import SequenceMatcher
+from itertools import combinations
+
+from django.db.models import Q
+
+from core.utils import normalize_phone, normalize_text
+from .models import Student
+
+DUPLICATE_THRESHOLD = 0.8
+
+# Blocks bigger than this come from placeholder values (e.g. the school's own
+# phone number entered for every child) and say nothing about duplication
+MAX_BLOCK_SIZE = 50
+
+RECORD_FIELDS = (
+    'id', 'custom_id', 'registration_number', 'first_name', 'last_name',
+    'date_of_birth', 'parent_name', 'parent_phone',
+)
+
+# The same name and date of birth reach DUPLICATE_THRESHOLD on their own
+NAME_WEIGHT = 0.5
+DOB_WEIGHT = 0.3
+PHONE_WEIGHT = 0.12
+PARENT_WEIGHT = 0.08
+
+# Letters of a name that, with the date of birth, put two records in a block
+NAME_PREFIX_LENGTH = 3
+
+
+def _similarity(a, b):
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _name_similarity(a, b):
+    first_a, last_a = normalize_text(a['first_name']), normalize_text(a['last_name'])
+    first_b, last_b = normalize_text(b['first_name']), normalize_text(b['last_name'])
+    straight = _similarity(first_a, first_b) * _similarity(last_a, last_b)
+    swapped = _similarity(first_a, last_b) * _similarity(last_a, first_b)
+    # Squared so siblings and twins (same surname, similar first names)
+    # score well below a typo of the same name
+    return max(straight, swapped) ** 2
+
+
+def _dob_similarity(a, b):
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    same = (a.year == b.year) + (a.month == b.month) + (a.day == b.day)
+    swapped = a.year == b.year and a.month == b.day and a.day == b.month
+    # One mistyped component or day and month swapped
+    return 0.5 if same == 2 or swapped else 0.0
+
+
+def _name_prefix(name):
+    words = normalize_text(name).split()
+    return words[0][:NAME_PREFIX_LENGTH] if words else ''
+
+
+def blocking_keys(record):
+    """
+    Keys of the blocks a record is compared within: its date of birth with
+    the start of its first or last name (so typos in the other one, and
+    swapped names, still meet), and its parent phone.
+    """
+    keys = []
+    dob = record['date_of_birth']
+    if dob:
+        for name in (record['first_name'], record['last_name']):
+            prefix = _name_prefix(name)
+            if prefix:
+                keys.append(('dob_name', dob, prefix))
+    phone = normalize_phone(record['parent_phone'])
+    if phone:
+        keys.append(('phone', phone))
+    return list(dict.fromkeys(keys))
+
+
+def _block_filter(key):
+    """The blocking_keys() block `key` as a filter on Student."""
+    if key[0] == 'phone':
+        return Q(parent_phone_key=key[1])
+    _, dob, prefix = key
+    return Q(date_of_birth=dob) & (Q(first_name__istartswith=prefix) | Q(last_name__istartswith=prefix))
+
+
+def score_pair(a, b, threshold=0.0):
+    """
+    Return (score, reasons) for two student records, score in [0, 1].
+
+    The cheap exact comparisons run first; if the pair cannot reach
+    `threshold` even with identical names the string comparison is skipped.
+    """
+    reasons = []
+    score = 0.0
+    dob = _dob_similarity(a['date_of_birth'], b['date_of_birth'])
+    if dob:
+        score += DOB_WEIGHT * dob
+        reasons.append('date_of_birth')
+    phone_a = normalize_phone(a['parent_phone'])
+    if phone_a and phone_a == normalize_phone(b['parent_phone']):
+        score += PHONE_WEIGHT
+        reasons.append('parent_phone')
+    if score + NAME_WEIGHT + PARENT_WEIGHT < threshold:
+        return round(score, 3), reasons
+
+    name = _name_similarity(a, b)
+    score += NAME_WEIGHT * name
+    if name >= 0.7:
+        reasons.append('name')
+    parent = _similarity(normalize_text(a['parent_name']), normalize_text(b['parent_name']))
+    score += PARENT_WEIGHT * parent
+    if parent >= 0.85:
+        reasons.append('parent_name')
+    return round(score, 3), reasons
+
+
+def find_duplicates(records, threshold=DUPLICATE_THRESHOLD):
+    """
+    Find likely duplicate pairs among `records` (dicts with RECORD_FIELDS).
+
+    Records are grouped by blocking keys and only records sharing a block are
+    scored, so the cost grows with the number of records rather than pairs.
+    Returns a list of {'score', 'reasons', 'students'} dicts, best match first.
+    """
+    records = list(records)
+    blocks = defaultdict(list)
+    for position, record in enumerate(records):
+        for key in blocking_keys(record):
+            blocks[key].append(position)
+
+    seen = set()
+    duplicates = []
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+            continue
+        for pair in combinations(members, 2):
+            if pair in seen:
+                continue
+            seen.add(pair)
+            a, b = records[pair[0]], records[pair[1]]
+            score, reasons = score_pair(a, b, threshold)
+            if score >= threshold:
+                duplicates.append({'score': score, 'reasons': reasons, 'students': [a, b]})
+
+    duplicates.sort(key=lambda item: item['score'], reverse=True)
+    return duplicates
+
+
+def find_school_duplicates(school_id, threshold=DUPLICATE_THRESHOLD):
+    """Batch report of likely duplicate students across a whole school."""
+    records = Student.objects.filter(school_id=school_id).values(*RECORD_FIELDS).iterator(chunk_size=2000)
+    return find_duplicates(records, threshold)
+
+
+def find_matching_students(school, data, threshold=DUPLICATE_THRESHOLD, exclude_pk=None):
+    """
+    Existing students in `school` that look like the same child as `data`.
+
+    Only the blocks `data` belongs to are loaded, one query each, and a
+    block that would grow past MAX_BLOCK_SIZE is skipped, as in the batch
+    report, so this stays cheap as the school grows.
+    """
+    candidate = {field: data.get(field) for field in RECORD_FIELDS}
+    queryset = Student.objects.filter(school=school)
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+
+    records = {}
+    for key in blocking_keys(candidate):
+        members = list(queryset.filter(_block_filter(key)).order_by('pk').values(*RECORD_FIELDS)[:MAX_BLOCK_SIZE])
+        if len(members) >= MAX_BLOCK_SIZE:
+            continue
+        for record in members:
+            if key in blocking_keys(record):
+                records[record['id']] = record
+
+    matches = []
+    for record in records.values():
+        score, reasons = score_pair(candidate, record, threshold)
+        if score >= threshold:
+            matches.append({'score': score, 'reasons': reasons, 'student': record})
+    matches.sort(key=lambda item: item['score'], reverse=True)
+    return matches
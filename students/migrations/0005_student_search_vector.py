@@ -0,0 +1,79 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# The search document is kept up to date by a trigger so that bulk writes and
+# queryset.update() calls are covered as well as Model.save(). Both the trigger
+# and the GIN index are PostgreSQL-only; on other backends (SQLite in local
+# development and tests) the column simply stays NULL and search falls back
+# to the regular ILIKE filtering.
+CREATE_SEARCH_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION students_student_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.first_name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.last_name, '')), 'A') ||
+            setweight(to_tsvector('simple', regexp_replace(coalesce(NEW.registration_number, ''), '[^[:alnum:]]+', ' ', 'g')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.parent_name, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER students_student_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF first_name, last_name, registration_number, parent_name
+    ON students_student
+    FOR EACH ROW EXECUTE FUNCTION students_student_search_vector_update();
+    """,
+    # Touch every row once so the trigger fills in existing students
+    "UPDATE students_student SET first_name = first_name;",
+    "CREATE INDEX student_search_vector_gin ON students_student USING gin (search_vector);",
+]
+
+DROP_SEARCH_SQL = [
+    "DROP INDEX IF EXISTS student_search_vector_gin;",
+    "DROP TRIGGER IF EXISTS students_student_search_vector_trigger ON students_student;",
+    "DROP FUNCTION IF EXISTS students_student_search_vector_update();",
+]
+
+
+def create_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in CREATE_SEARCH_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in DROP_SEARCH_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0004_class_custom_id_student_custom_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='student',
+                    index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='student_search_vector_gin'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_objects, drop_search_objects),
+            ],
+        ),
+    ]
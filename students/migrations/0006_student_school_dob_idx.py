@@ -0,0 +1,20 @@
+# Generated by Django 5.1.8 on 2026-10-19 09:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0003_school_custom_id'),
+        ('students', '0005_student_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['school', 'date_of_birth'], name='student_school_dob_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.8 on 2026-10-19 10:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+from core.utils import normalize_phone
+
+
+def fill_parent_phone_keys(apps, schema_editor):
+    Student = apps.get_model('students', 'Student')
+    batch = []
+    for student in Student.objects.only('pk', 'parent_phone').iterator(chunk_size=2000):
+        student.parent_phone_key = normalize_phone(student.parent_phone)
+        batch.append(student)
+        if len(batch) == 2000:
+            Student.objects.bulk_update(batch, ['parent_phone_key'])
+            batch = []
+    Student.objects.bulk_update(batch, ['parent_phone_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0003_school_custom_id'),
+        ('students', '0006_student_school_dob_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='parent_phone_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=10),
+        ),
+        migrations.RunPython(fill_parent_phone_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['school', 'parent_phone_key'], name='student_school_phone_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.8 on 2026-10-19 09:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0003_school_custom_id'),
+        ('students', '0007_student_parent_phone_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentattendance',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(fields=['school', 'updated_at'], name='class_school_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['school', 'updated_at'], name='student_school_updated_idx'),
+        ),
+    ]
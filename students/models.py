@@ -1,7 +1,9 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from schools.models import School
-from core.utils import generate_custom_id
+from core.utils import generate_custom_id, normalize_phone
 
 
 
@@ -16,6 +18,10 @@ class Class(models.Model):
     class Meta:
         verbose_name_plural = 'Classes'
         unique_together = ['school', 'class_name']
+        indexes = [
+            # Delta sync (core.sync)
+            models.Index(fields=['school', 'updated_at'], name='class_school_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.class_name} - {self.school.school_name}"
@@ -45,12 +51,26 @@ class Student(models.Model):
     address = models.TextField()
     parent_name = models.CharField(max_length=100)
     parent_phone = models.CharField(max_length=20)
+    # normalize_phone(parent_phone), the duplicate detection blocking key
+    parent_phone_key = models.CharField(max_length=10, blank=True, default='', editable=False)
     parent_email = models.EmailField(blank=True, null=True)
     admission_date = models.DateField()
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     custom_id = models.CharField(max_length=20, unique=True, blank=True, null=True) 
+    # Full-text search document, maintained by a database trigger on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='student_search_vector_gin'),
+            # Blocking key for duplicate detection
+            models.Index(fields=['school', 'date_of_birth'], name='student_school_dob_idx'),
+            models.Index(fields=['school', 'parent_phone_key'], name='student_school_phone_idx'),
+            # Delta sync (core.sync)
+            models.Index(fields=['school', 'updated_at'], name='student_school_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.registration_number}"
@@ -58,6 +78,10 @@ class Student(models.Model):
     def save(self, *args, **kwargs):
         if not self.pk: 
             self.custom_id = generate_custom_id("ST")  # Generate custom ID
+        self.parent_phone_key = normalize_phone(self.parent_phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'parent_phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'parent_phone_key'}
         super().save(*args, **kwargs)
 
 class StudentAttendance(models.Model):
@@ -65,6 +89,7 @@ class StudentAttendance(models.Model):
     date = models.DateField()
     is_present = models.BooleanField(default=True)
     remarks = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         unique_together = ['student', 'date']
@@ -1,37 +1,89 @@
 
 from rest_framework import serializers
+from django.db.models import Count
 from .models import Class, Student, StudentAttendance
+from core.serializers import CachedRepresentationMixin, CachedListSerializer, SparseFieldsMixin, ValuesSerializerMixin
 from schools.models import School  # Import the School model
+from .duplicates import find_matching_students
 
 class ClassCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Class
         fields = ('class_name', 'description')  # Only include fields needed for creation
 
-class ClassSerializer(serializers.ModelSerializer):
+class ClassSerializer(CachedRepresentationMixin, serializers.ModelSerializer):
     student_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Class
         fields = ('id', 'custom_id', 'class_name', 'description', 'student_count', 'created_at')
         read_only_fields = ('id', 'custom_id', 'created_at', 'student_count')
+        list_serializer_class = CachedListSerializer
+    
+    @staticmethod
+    def annotate_queryset(queryset):
+        return queryset.annotate(student_count=Count('students'))
     
     def get_student_count(self, obj):
+        # Annotated by the class views; fall back to a query otherwise
+        if hasattr(obj, 'student_count'):
+            return obj.student_count
         return obj.students.count()
+    
+    def get_fragment_version(self, obj):
+        # Enrolments don't touch the class row, so the count is part of the version
+        if not hasattr(obj, 'student_count'):
+            return None
+        return (obj.updated_at, obj.student_count)
 
 class StudentCreateSerializer(serializers.ModelSerializer):
+    # Set to true to save a student that looks like an existing record
+    allow_duplicate = serializers.BooleanField(write_only=True, required=False, default=False)
+    
     class Meta:
         model = Student
-        fields = ('registration_number', 'first_name', 'last_name', 'date_of_birth', 'gender', 'address', 'parent_name', 'parent_phone', 'parent_email', 'admission_date', 'is_active', 'class_assigned')  # Only include fields needed for creation
+        fields = ('registration_number', 'first_name', 'last_name', 'date_of_birth', 'gender', 'address', 'parent_name', 'parent_phone', 'parent_email', 'admission_date', 'is_active', 'class_assigned', 'allow_duplicate')  # Only include fields needed for creation
+    
+    def validate(self, data):
+        if data.get('allow_duplicate'):
+            return data
+        
+        request = self.context.get('request')
+        if not request:
+            return data
+        
+        # Try to get school from request
+        if hasattr(request, 'school') and request.school:
+            school = request.school
+        else:
+            # Fallback: try to get school from user
+            school = School.objects.filter(admin=request.user).first()
+            
+            if not school:
+                return data
+        
+        matches = find_matching_students(school, data)
+        if matches:
+            raise serializers.ValidationError({
+                "duplicate": "This student looks like an existing record. Set allow_duplicate to true to save it anyway.",
+                "possible_duplicates": [match['student']['custom_id'] for match in matches],
+            })
+        return data
+    
+    def create(self, validated_data):
+        validated_data.pop('allow_duplicate', None)
+        return super().create(validated_data)
 
-class StudentSerializer(serializers.ModelSerializer):
+class StudentSerializer(SparseFieldsMixin, ValuesSerializerMixin, CachedRepresentationMixin, serializers.ModelSerializer):
     class_name = serializers.CharField(source='class_assigned.name', read_only=True)
     full_name = serializers.SerializerMethodField()
     
     class Meta:
         model = Student
-        fields = ('id', 'custom_id', 'registration_number', 'first_name', 'last_name', 'date_of_birth', 'gender', 'address', 'parent_name', 'parent_phone', 'parent_email', 'admission_date', 'is_active', 'class_assigned', 'class_name', 'school', 'created_at', 'updated_at')
+        fields = ('id', 'custom_id', 'registration_number', 'first_name', 'last_name', 'full_name', 'date_of_birth', 'gender', 'address', 'parent_name', 'parent_phone', 'parent_email', 'admission_date', 'is_active', 'class_assigned', 'class_name', 'school', 'created_at', 'updated_at')
         read_only_fields = ('id', 'custom_id', 'school', 'created_at', 'updated_at', 'class_name', 'full_name')
+        list_serializer_class = CachedListSerializer
+        values_method_fields = {'full_name': ('first_name', 'last_name')}
         
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}"
@@ -0,0 +1,59 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from core.signals import school_data_changed
+from .models import Class, Student, StudentAttendance
+
+
+@receiver(post_save, sender=Class)
+@receiver(post_save, sender=Student)
+def school_record_saved(sender, instance, **kwargs):
+    school_data_changed.send(
+        sender=sender, pk=instance.pk, school_id=instance.school_id, deleted=False, instance=instance
+    )
+
+
+@receiver(post_delete, sender=Class)
+@receiver(post_delete, sender=Student)
+def school_record_deleted(sender, instance, **kwargs):
+    school_data_changed.send(
+        sender=sender, pk=instance.pk, school_id=instance.school_id, deleted=True, instance=instance
+    )
+
+
+@receiver(post_save, sender=StudentAttendance)
+@receiver(post_delete, sender=StudentAttendance)
+def student_attendance_changed(sender, instance, **kwargs):
+    school_data_changed.send(
+        sender=sender,
+        pk=instance.pk,
+        school_id=instance.student.school_id,
+        deleted='created' not in kwargs,
+        instance=instance,
+    )
+
+
+# ClassSerializer's student_count comes from the class's students, so
+# enrolments have to move the class's timestamp for the delta sync to
+# send the class again.
+@receiver(pre_save, sender=Student)
+def remember_student_class(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding or (update_fields is not None and 'class_assigned' not in update_fields):
+        return
+    instance._previous_class_id = (
+        Student.objects.filter(pk=instance.pk).values_list('class_assigned_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def touch_classes_for_enrolment(sender, instance, **kwargs):
+    class_ids = {instance.class_assigned_id}
+    if not kwargs.get('created', True):
+        previous = getattr(instance, '_previous_class_id', instance.class_assigned_id)
+        if previous == instance.class_assigned_id:
+            return
+        class_ids.add(previous)
+    class_ids.discard(None)
+    if class_ids:
+        Class.objects.filter(pk__in=class_ids).update(updated_at=timezone.now())
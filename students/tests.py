@@ -1,3 +1,296 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from asgiref.sync import async_to_sync
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.search import FullTextSearchFilter
+from core.signals import school_data_changed
+from core.cache import bump_school_generation, get_generation_cache, get_school_generation
+from core.testing import SchoolTestCase, clear_caches, client_for, make_admin, make_school
+from .duplicates import MAX_BLOCK_SIZE, find_matching_students, find_school_duplicates
+from .models import Class
+from .serializers import ClassSerializer, StudentSerializer
+from .views import AsyncStudentDetailView, AsyncStudentListCreateView
+
+
+class DuplicateDetectionTests(SchoolTestCase):
+
+    def test_parent_phone_key_is_normalized(self):
+        student = self.make_student(parent_phone='+234 803 123 4567')
+        self.assertEqual(student.parent_phone_key, '8031234567')
+        student.parent_phone = '0803 999 0000'
+        student.save(update_fields=['parent_phone'])
+        student.refresh_from_db()
+        self.assertEqual(student.parent_phone_key, '8039990000')
+
+    def test_create_time_match_uses_normalized_phone(self):
+        existing = self.make_student(parent_phone='+234 803 123 4567')
+        # Mistyped day, so only the phone block can find it
+        data = {
+            'first_name': 'John', 'last_name': 'Doe', 'parent_name': 'Jane Doe',
+            'date_of_birth': datetime.date(2012, 3, 5), 'parent_phone': '08031234567',
+        }
+        matches = find_matching_students(self.school, data)
+        self.assertEqual([match['student']['id'] for match in matches], [existing.pk])
+        self.assertIn('parent_phone', matches[0]['reasons'])
+
+    def test_create_rejects_duplicate_unless_allowed(self):
+        existing = self.make_student()
+        data = {
+            'registration_number': 'STU/9999', 'first_name': 'Jon', 'last_name': 'Doe',
+            'date_of_birth': '2012-03-04', 'gender': 'male', 'address': 'x',
+            'parent_name': 'Jane Doe', 'parent_phone': '08031234567', 'admission_date': '2020-09-01',
+        }
+        response = self.client.post('/api/students/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['possible_duplicates'], [existing.custom_id])
+
+        response = self.client.post('/api/students/', {**data, 'allow_duplicate': True}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_siblings_are_not_duplicates(self):
+        self.make_student(first_name='John', date_of_birth=datetime.date(2012, 3, 4))
+        self.make_student(first_name='Mary', date_of_birth=datetime.date(2014, 7, 1))
+        self.assertEqual(find_school_duplicates(self.school.pk), [])
+
+    def test_same_name_and_birthday_alone_is_a_duplicate(self):
+        existing = self.make_student(parent_name='', parent_phone='0803 111 2222')
+        data = {
+            'first_name': 'john ', 'last_name': 'DOE', 'parent_name': '',
+            'date_of_birth': datetime.date(2012, 3, 4), 'parent_phone': '0809 999 8888',
+        }
+        self.assertEqual([match['student']['id'] for match in find_matching_students(self.school, data)], [existing.pk])
+
+    def test_duplicate_is_found_among_many_children_born_the_same_day(self):
+        for number in range(MAX_BLOCK_SIZE + 10):
+            self.make_student(first_name=f'Kid{number:03d}', last_name=f'Surname{number:03d}', parent_phone=f'0701000{number:04d}')
+        existing = self.make_student(first_name='Zainab', last_name='Yusuf', parent_phone='0802 000 0000')
+        data = {
+            'first_name': 'Zainab', 'last_name': 'Yusuf', 'parent_name': 'Jane Doe',
+            'date_of_birth': datetime.date(2012, 3, 4), 'parent_phone': '0809 999 8888',
+        }
+        self.assertEqual([match['student']['id'] for match in find_matching_students(self.school, data)], [existing.pk])
+
+    def test_oversized_blocks_are_skipped_in_both_paths(self):
+        # A placeholder number entered for every child
+        for number in range(MAX_BLOCK_SIZE + 1):
+            self.make_student(first_name=f'Kid{number:03d}', last_name='Same', date_of_birth=datetime.date(2010, 1, 1) + datetime.timedelta(days=number))
+        self.make_student(first_name='Kid000', last_name='Same', date_of_birth=datetime.date(2015, 6, 6), parent_name='')
+        self.assertEqual(find_school_duplicates(self.school.pk), [])
+        data = {
+            'first_name': 'Kid000', 'last_name': 'Same', 'parent_name': '',
+            'date_of_birth': datetime.date(2016, 6, 6), 'parent_phone': '+234 803 123 4567',
+        }
+        self.assertEqual(find_matching_students(self.school, data), [])
+
+    def test_report_finds_pairs(self):
+        self.make_student(parent_phone='+234 803 123 4567')
+        self.make_student(first_name='Jon', parent_phone='08031234567')
+        response = self.client.get('/api/students/duplicates/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_report_is_for_admins_only(self):
+        client = client_for(self.make_teacher().user)
+        self.assertEqual(client.get('/api/students/duplicates/').status_code, 403)
+
+
+class ResponseCacheTests(SchoolTestCase):
+
+    def test_hit_then_invalidated_by_write(self):
+        first = self.client.get('/api/students/classes/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        second = self.client.get('/api/students/classes/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+
+        # Generations move after commit
+        with self.captureOnCommitCallbacks(execute=True):
+            Class.objects.create(school=self.school, class_name='JSS2')
+        third = self.client.get('/api/students/classes/')
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertEqual(len(third.json()), 2)
+
+    def test_generations_live_in_the_shared_cache(self):
+        generation = get_school_generation(self.school.pk)
+        bump_school_generation(self.school.pk)
+        self.assertEqual(get_generation_cache().get(f'school-generation:{self.school.pk}'), generation + 1)
+
+    def test_other_workers_events_do_not_bump_the_shared_generation(self):
+        generation = get_school_generation(self.school.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            school_data_changed.send(
+                sender=Class, pk=self.school_class.pk, school_id=self.school.pk, deleted=False,
+                instance=None, remote=True,
+            )
+        self.assertEqual(get_school_generation(self.school.pk), generation)
+
+    def test_etag_304_until_the_school_changes(self):
+        response = self.client.get('/api/students/classes/')
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        not_modified = self.client.get('/api/students/classes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+        # A write made by any worker moves the shared generation
+        bump_school_generation(self.school.pk)
+        modified = self.client.get('/api/students/classes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(modified.status_code, 200)
+        self.assertNotEqual(modified['ETag'], etag)
+
+
+class StudentDetailTests(SchoolTestCase):
+
+    def test_lookup_by_numeric_id_or_custom_id(self):
+        student = self.make_student()
+        by_id = self.client.get(f'/api/students/{student.pk}/')
+        by_custom_id = self.client.get(f'/api/students/{student.custom_id}/')
+        self.assertEqual(by_id.status_code, 200)
+        self.assertEqual(by_id.json(), by_custom_id.json())
+        self.assertEqual(self.client.get('/api/students/999999/').status_code, 404)
+
+    def test_update_by_numeric_id(self):
+        student = self.make_student()
+        response = self.client.patch(f'/api/students/{student.pk}/', {'first_name': 'Johnny'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        student.refresh_from_db()
+        self.assertEqual(student.first_name, 'Johnny')
+
+
+class AsyncReadViewTests(SchoolTestCase):
+
+    def call(self, view, path, method='get', data=None, user=None, **kwargs):
+        factory = APIRequestFactory()
+        if method == 'get':
+            request = factory.get(path, data)
+        else:
+            request = getattr(factory, method)(path, data, format='json')
+        force_authenticate(request, user or self.admin)
+        return async_to_sync(view.as_view())(request, **kwargs)
+
+    def detail(self, pk, **kwargs):
+        return self.call(AsyncStudentDetailView, f'/api/students/{pk}/', pk=str(pk), **kwargs)
+
+    def test_list_matches_the_sync_view(self):
+        self.make_student(first_name='Ann')
+        self.make_student(first_name='Ben')
+        for params in ({}, {'search': 'ben'}):
+            response = self.call(AsyncStudentListCreateView, '/api/students/', data=params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, self.client.get('/api/students/', params).content)
+
+    def test_detail_matches_the_sync_view(self):
+        student = self.make_student()
+        for pk in (student.pk, student.custom_id):
+            response = self.detail(pk)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, self.client.get(f'/api/students/{pk}/').content)
+        self.assertEqual(self.detail(999999).status_code, 404)
+
+    def test_other_schools_students_are_not_found(self):
+        student = self.make_student()
+        other = make_admin('other@example.com')
+        make_school(other, 'Riverside')
+        self.assertEqual(self.detail(student.pk, user=other).status_code, 404)
+
+    def test_cached_detail_is_served_without_queries(self):
+        student = self.make_student()
+        first = self.detail(student.pk)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.detail(student.pk)
+        self.assertEqual(second.content, first.content)
+        self.assertFalse([query for query in queries if 'students_student' in query['sql']])
+
+    def test_writes_use_the_sync_handlers(self):
+        student = self.make_student()
+        response = self.detail(student.pk, method='patch', data={'first_name': 'Johnny'})
+        self.assertEqual(response.status_code, 200)
+        student.refresh_from_db()
+        self.assertEqual(student.first_name, 'Johnny')
+
+
+class StudentSearchTests(SchoolTestCase):
+
+    def search(self, terms):
+        response = self.client.get('/api/students/', {'search': terms})
+        self.assertEqual(response.status_code, 200)
+        return {student['id'] for student in response.json()}
+
+    def test_search_falls_back_to_search_fields_without_postgresql(self):
+        john = self.make_student(first_name='John', last_name='Doe')
+        mary = self.make_student(first_name='Mary', last_name='Smith', parent_name='Ann Smith')
+        self.assertEqual(self.search('doe'), {john.pk})
+        self.assertEqual(self.search('smith'), {mary.pk})
+        self.assertEqual(self.search('mary smith'), {mary.pk})
+        self.assertEqual(self.search(john.registration_number), {john.pk})
+        self.assertEqual(self.search('nobody'), set())
+
+    def test_every_word_is_a_prefix(self):
+        query = FullTextSearchFilter().get_search_query(['Jo', "d'oe-x"])
+        self.assertEqual(query.source_expressions[-1].value, 'jo:* & d:* & oe:* & x:*')
+        self.assertIsNone(FullTextSearchFilter().get_search_query(['--']))
+
+
+class FragmentCacheTests(SchoolTestCase):
+
+    def serialize(self, serializer_class, instances):
+        with mock.patch.object(serializer_class, 'serialize_uncached', autospec=True,
+                               side_effect=serializer_class.serialize_uncached) as uncached:
+            data = serializer_class(instances, many=True).data
+        return data, uncached.call_count
+
+    def test_unchanged_objects_are_served_from_the_cache(self):
+        students = [self.make_student(), self.make_student(first_name='Mary')]
+        first, misses = self.serialize(StudentSerializer, students)
+        self.assertEqual(misses, 2)
+        second, misses = self.serialize(StudentSerializer, students)
+        self.assertEqual(misses, 0)
+        self.assertEqual(second, first)
+
+    def test_a_new_version_is_serialized_again(self):
+        student = self.make_student()
+        self.serialize(StudentSerializer, [student])
+        student.first_name = 'Johnny'
+        student.save()
+        data, misses = self.serialize(StudentSerializer, [student])
+        self.assertEqual(misses, 1)
+        self.assertEqual(data[0]['first_name'], 'Johnny')
+
+    def test_class_version_includes_its_student_count(self):
+        classes = ClassSerializer.annotate_queryset(Class.objects.filter(pk=self.school_class.pk))
+        self.serialize(ClassSerializer, list(classes))
+        self.make_student()
+        data, misses = self.serialize(ClassSerializer, list(classes.all()))
+        self.assertEqual(misses, 1)
+        self.assertEqual(data[0]['student_count'], 1)
+
+    @override_settings(SERIALIZER_FRAGMENT_CACHE=False)
+    def test_switched_off(self):
+        student = self.make_student()
+        self.serialize(StudentSerializer, [student])
+        self.assertEqual(self.serialize(StudentSerializer, [student])[1], 1)
+
+
+@override_settings(SERIALIZER_FRAGMENT_CACHE=False)
+class ValuesPathTests(SchoolTestCase):
+
+    def get_fresh(self, path, **params):
+        clear_caches()
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_values_rows_render_the_same_bytes(self):
+        self.make_student(parent_email='jane@example.com')
+        self.make_student(first_name='Mary', class_assigned=None, is_active=False)
+        with override_settings(VALUES_FAST_PATH=False):
+            expected = self.get_fresh('/api/students/').content
+        with mock.patch.object(StudentSerializer, 'serialize_uncached', side_effect=AssertionError):
+            self.assertEqual(self.get_fresh('/api/students/').content, expected)
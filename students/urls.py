@@ -1,19 +1,33 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     ClassListCreateView,
     ClassDetailView,
     StudentListCreateView,
+    StudentDuplicateReportView,
     StudentDetailView,
     StudentAttendanceListCreateView,
-    StudentAttendanceDetailView
+    StudentAttendanceDetailView,
+    AsyncClassListCreateView,
+    AsyncStudentListCreateView,
+    AsyncStudentDetailView,
+    AsyncStudentAttendanceListCreateView,
 )
 
+# Under ASGI, serve the hottest reads from async views
+if settings.ASYNC_READ_VIEWS:
+    ClassListCreateView = AsyncClassListCreateView
+    StudentListCreateView = AsyncStudentListCreateView
+    StudentDetailView = AsyncStudentDetailView
+    StudentAttendanceListCreateView = AsyncStudentAttendanceListCreateView
+
 urlpatterns = [
     path('classes/', ClassListCreateView.as_view(), name='class-list-create'),
     path('classes/<str:pk>/', ClassDetailView.as_view(), name='class-detail'),
-    path('', StudentListCreateView.as_view(), name='student-list-create'),
-    path('<str:pk>/', StudentDetailView.as_view(), name='student-detail'),
     path('attendance/', StudentAttendanceListCreateView.as_view(), name='student-attendance-list-create'),
     path('attendance/<str:pk>/', StudentAttendanceDetailView.as_view(), name='student-attendance-detail'),
+    path('duplicates/', StudentDuplicateReportView.as_view(), name='student-duplicates'),
+    path('', StudentListCreateView.as_view(), name='student-list-create'),
+    # Keep last: matches any single path segment
+    path('<str:pk>/', StudentDetailView.as_view(), name='student-detail'),
 ]
-
@@ -6,13 +6,19 @@ from .models import Class, Student, StudentAttendance
 from .serializers import ( ClassSerializer, StudentSerializer, StudentAttendanceSerializer, 
 StudentCreateSerializer, ClassCreateSerializer )
 from schools.permissions import IsSchoolAdmin
-from core.permissions import ( IsTeacherOrAdmin, IsTeacherWithFullAccess, 
+from core.permissions import ( IsAdminOnly, IsTeacherOrAdmin, IsTeacherWithFullAccess, 
 IsTeacherWithLimitedAccess, IsTeacherWithClassOnlyAccess )
 from rest_framework.exceptions import ValidationError
 from rest_framework.exceptions import NotFound
 from django.db import IntegrityError  
+from core.search import FullTextSearchFilter
+from core.access import get_access_scope
+from core.cache import CachedResponseMixin
+from core.singleflight import single_flight, SingleFlightListMixin
+from core.views import AsyncAPIView, AsyncListModelMixin, AsyncRetrieveModelMixin, SparseFieldsViewMixin, StreamingListMixin, ValuesListMixin
+from .duplicates import find_school_duplicates
 
-class ClassListCreateView(generics.ListCreateAPIView):
+class ClassListCreateView(CachedResponseMixin, StreamingListMixin, generics.ListCreateAPIView):
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
@@ -24,20 +30,13 @@ class ClassListCreateView(generics.ListCreateAPIView):
         return ClassSerializer
     
     def get_queryset(self):
-        # Try to get school from request
-        if hasattr(self.request, 'school') and self.request.school:
-            school = self.request.school
-        else:
-            # Fallback: try to get school from user
-            from schools.models import School
-            school = School.objects.filter(admin=self.request.user).first()
-            
-            if not school:
-                # Return empty queryset if no school found
-                return Class.objects.none()
+        scope = get_access_scope(self.request)
+        if scope.school_id is None:
+            # Return empty queryset if no school found
+            return Class.objects.none()
         
         # Filter classes by the current school
-        return Class.objects.filter(school=school)
+        return ClassSerializer.annotate_queryset(Class.objects.filter(school_id=scope.school_id))
     
     def perform_create(self, serializer):
         try:
@@ -61,26 +60,19 @@ class ClassListCreateView(generics.ListCreateAPIView):
                 raise
 
 
-class ClassDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ClassDetailView(CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ClassSerializer
     permission_classes = [IsAuthenticated, IsSchoolAdmin]
     lookup_field = 'custom_id'  # Use custom_id for lookups
     
     def get_queryset(self):
-        # Try to get school from request
-        if hasattr(self.request, 'school') and self.request.school:
-            school = self.request.school
-        else:
-            # Fallback: try to get school from user
-            from schools.models import School
-            school = School.objects.filter(admin=self.request.user).first()
-            
-            if not school:
-                # Return empty queryset if no school found
-                return Class.objects.none()
+        scope = get_access_scope(self.request)
+        if scope.school_id is None:
+            # Return empty queryset if no school found
+            return Class.objects.none()
         
         # Filter classes by the current school
-        return Class.objects.filter(school=school)
+        return ClassSerializer.annotate_queryset(Class.objects.filter(school_id=scope.school_id))
     
     def get_object(self):
         queryset = self.get_queryset()
@@ -88,14 +80,16 @@ class ClassDetailView(generics.RetrieveUpdateDestroyAPIView):
             obj = queryset.get(custom_id=self.kwargs['pk'])  # Use custom_id for lookup
         except Class.DoesNotExist:
             raise NotFound("Class not found")
+        self.check_object_permissions(self.request, obj)
         return obj
 
 
-class StudentListCreateView(generics.ListCreateAPIView):
+class StudentListCreateView(CachedResponseMixin, StreamingListMixin, ValuesListMixin, SparseFieldsViewMixin, generics.ListCreateAPIView):
     serializer_class = StudentSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['is_active', 'gender', 'class_assigned']
     search_fields = ['first_name', 'last_name', 'registration_number', 'parent_name']
+    search_vector_field = 'search_vector'
     ordering_fields = ['first_name', 'last_name', 'admission_date']
     
     def get_serializer_class(self):
@@ -117,28 +111,18 @@ class StudentListCreateView(generics.ListCreateAPIView):
             return [IsAuthenticated()]
     
     def get_queryset(self):
-        # Try to get school from request
-        if hasattr(self.request, 'school') and self.request.school:
-            school = self.request.school
-        else:
-            # Fallback: try to get school from user
-            from schools.models import School
-            school = School.objects.filter(admin=self.request.user).first()
-            
-            if not school:
-                # Return empty queryset if no school found
-                return Student.objects.none()
+        scope = get_access_scope(self.request)
+        if scope.school_id is None:
+            # Return empty queryset if no school found
+            return Student.objects.none()
         
         # Base filtering by school
-        queryset = Student.objects.filter(school=school)
+        queryset = Student.objects.filter(school_id=scope.school_id)
         
         # Additional filtering based on role and access level
-        if self.request.user.role == 'teacher':
-            teacher = self.request.user.teacher_profile
-            if teacher.access_level == 'class_only':
-                # Teacher can only see students in their assigned classes
-                teacher_classes = Class.objects.filter(teacher=teacher)
-                return queryset.filter(class_assigned__in=teacher_classes)
+        if scope.is_class_only:
+            # Teacher can only see students in their assigned classes
+            return queryset.filter(class_assigned_id__in=scope.class_ids)
         
         # Admin and teachers with full/limited access see all students in the school
         return queryset
@@ -157,8 +141,47 @@ class StudentListCreateView(generics.ListCreateAPIView):
         
         serializer.save(school=school)
 
-class StudentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class StudentDuplicateReportView(generics.GenericAPIView):
+    """
+    Report pairs of students in the school that are likely the same child
+    """
+    permission_classes = [IsAuthenticated, IsAdminOnly]
+    
+    def get(self, request):
+        school_id = get_access_scope(request).school_id
+        if school_id is None:
+            raise NotFound("No school found for this user. Please create a school first.")
+        
+        def compute():
+            duplicates = find_school_duplicates(school_id)
+            for duplicate in duplicates:
+                duplicate['students'] = [
+                    {
+                        'id': student['id'],
+                        'custom_id': student['custom_id'],
+                        'registration_number': student['registration_number'],
+                        'full_name': f"{student['first_name']} {student['last_name']}",
+                        'date_of_birth': student['date_of_birth'],
+                        'parent_phone': student['parent_phone'],
+                    }
+                    for student in duplicate['students']
+                ]
+            return {
+                'count': len(duplicates),
+                'duplicates': duplicates,
+            }
+        
+        return Response(single_flight.do(f'student-duplicates:{school_id}', compute, school_id))
+
+class StudentDetailView(CachedResponseMixin, SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = StudentSerializer
+    lookup_url_kwarg = 'pk'
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # The numeric id, as always, or the custom_id the other detail views use
+        if not str(kwargs.get(self.lookup_url_kwarg, '')).isdigit():
+            self.lookup_field = 'custom_id'
     
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
@@ -174,33 +197,23 @@ class StudentDetailView(generics.RetrieveUpdateDestroyAPIView):
             return [IsAuthenticated()]
     
     def get_queryset(self):
-        # Try to get school from request
-        if hasattr(self.request, 'school') and self.request.school:
-            school = self.request.school
-        else:
-            # Fallback: try to get school from user
-            from schools.models import School
-            school = School.objects.filter(admin=self.request.user).first()
-            
-            if not school:
-                # Return empty queryset if no school found
-                return Student.objects.none()
+        scope = get_access_scope(self.request)
+        if scope.school_id is None:
+            # Return empty queryset if no school found
+            return Student.objects.none()
         
         # Base filtering by school
-        queryset = Student.objects.filter(school=school)
+        queryset = Student.objects.filter(school_id=scope.school_id)
         
         # Additional filtering based on role and access level
-        if self.request.user.role == 'teacher':
-            teacher = self.request.user.teacher_profile
-            if teacher.access_level == 'class_only':
-                # Teacher can only see students in their assigned classes
-                teacher_classes = Class.objects.filter(teacher=teacher)
-                return queryset.filter(class_assigned__in=teacher_classes)
+        if scope.is_class_only:
+            # Teacher can only see students in their assigned classes
+            return queryset.filter(class_assigned_id__in=scope.class_ids)
         
         # Admin and teachers with full/limited access see all students in the school
         return queryset
 
-class StudentAttendanceListCreateView(generics.ListCreateAPIView):
+class StudentAttendanceListCreateView(StreamingListMixin, SingleFlightListMixin, generics.ListCreateAPIView):
     serializer_class = StudentAttendanceSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['date', 'is_present', 'student', 'student__class_assigned']
@@ -223,28 +236,18 @@ class StudentAttendanceListCreateView(generics.ListCreateAPIView):
             return [IsAuthenticated()]
     
     def get_queryset(self):
-        # Try to get school from request
-        if hasattr(self.request, 'school') and self.request.school:
-            school = self.request.school
-        else:
-            # Fallback: try to get school from user
-            from schools.models import School
-            school = School.objects.filter(admin=self.request.user).first()
-            
-            if not school:
-                # Return empty queryset if no school found
-                return StudentAttendance.objects.none()
+        scope = get_access_scope(self.request)
+        if scope.school_id is None:
+            # Return empty queryset if no school found
+            return StudentAttendance.objects.none()
         
         # Base filtering by school (through student)
-        queryset = StudentAttendance.objects.filter(student__school=school)
+        queryset = StudentAttendance.objects.filter(student__school_id=scope.school_id).select_related('student__class_assigned')
         
         # Additional filtering based on role and access level
-        if self.request.user.role == 'teacher':
-            teacher = self.request.user.teacher_profile
-            if teacher.access_level == 'class_only':
-                # Teacher can only see attendance for students in their assigned classes
-                teacher_classes = Class.objects.filter(teacher=teacher)
-                return queryset.filter(student__class_assigned__in=teacher_classes)
+        if scope.is_class_only:
+            # Teacher can only see attendance for students in their assigned classes
+            return queryset.filter(student__class_assigned_id__in=scope.class_ids)
         
         # Admin and teachers with full/limited access see all attendance records in the school
         return queryset
@@ -272,28 +275,36 @@ class StudentAttendanceDetailView(generics.RetrieveUpdateDestroyAPIView):
             return [IsAuthenticated()]
     
     def get_queryset(self):
-        # Try to get school from request
-        if hasattr(self.request, 'school') and self.request.school:
-            school = self.request.school
-        else:
-            # Fallback: try to get school from user
-            from schools.models import School
-            school = School.objects.filter(admin=self.request.user).first()
-            
-            if not school:
-                # Return empty queryset if no school found
-                return StudentAttendance.objects.none()
+        scope = get_access_scope(self.request)
+        if scope.school_id is None:
+            # Return empty queryset if no school found
+            return StudentAttendance.objects.none()
         
         # Base filtering by school
-        queryset = StudentAttendance.objects.filter(student__school=school)
+        queryset = StudentAttendance.objects.filter(student__school_id=scope.school_id).select_related('student__class_assigned')
         
         # Additional filtering based on role and access level
-        if self.request.user.role == 'teacher':
-            teacher = self.request.user.teacher_profile
-            if teacher.access_level == 'class_only':
-                # Teacher can only see attendance for students in their assigned classes
-                teacher_classes = Class.objects.filter(teacher=teacher)
-                return queryset.filter(student__class_assigned__in=teacher_classes)
+        if scope.is_class_only:
+            # Teacher can only see attendance for students in their assigned classes
+            return queryset.filter(student__class_assigned_id__in=scope.class_ids)
         
         # Admin and teachers with full/limited access see all attendance records in the school
-        return queryset
\ No newline at end of file
+        return queryset
+
+
+# Async variants of the hottest read endpoints (see ASYNC_READ_VIEWS)
+
+class AsyncClassListCreateView(AsyncListModelMixin, AsyncAPIView, ClassListCreateView):
+    pass
+
+
+class AsyncStudentListCreateView(AsyncListModelMixin, AsyncAPIView, StudentListCreateView):
+    pass
+
+
+class AsyncStudentDetailView(AsyncRetrieveModelMixin, AsyncAPIView, StudentDetailView):
+    pass
+
+
+class AsyncStudentAttendanceListCreateView(AsyncListModelMixin, AsyncAPIView, StudentAttendanceListCreateView):
+    pass
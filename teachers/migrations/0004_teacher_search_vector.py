@@ -0,0 +1,76 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# See students/migrations/0005_student_search_vector.py: the trigger and GIN
+# index only exist on PostgreSQL, other backends keep the column NULL.
+CREATE_SEARCH_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION teachers_teacher_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.first_name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.last_name, '')), 'A') ||
+            setweight(to_tsvector('simple', regexp_replace(coalesce(NEW.employee_id, ''), '[^[:alnum:]]+', ' ', 'g')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.highest_certificate, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER teachers_teacher_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF first_name, last_name, employee_id, highest_certificate
+    ON teachers_teacher
+    FOR EACH ROW EXECUTE FUNCTION teachers_teacher_search_vector_update();
+    """,
+    # Touch every row once so the trigger fills in existing teachers
+    "UPDATE teachers_teacher SET first_name = first_name;",
+    "CREATE INDEX teacher_search_vector_gin ON teachers_teacher USING gin (search_vector);",
+]
+
+DROP_SEARCH_SQL = [
+    "DROP INDEX IF EXISTS teacher_search_vector_gin;",
+    "DROP TRIGGER IF EXISTS teachers_teacher_search_vector_trigger ON teachers_teacher;",
+    "DROP FUNCTION IF EXISTS teachers_teacher_search_vector_update();",
+]
+
+
+def create_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in CREATE_SEARCH_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in DROP_SEARCH_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teachers', '0003_teacher_custom_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacher',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='teacher',
+                    index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='teacher_search_vector_gin'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_objects, drop_search_objects),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.8 on 2026-10-19 09:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0003_school_custom_id'),
+        ('teachers', '0004_teacher_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacherattendance',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='teacherclassassignment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='teacher',
+            index=models.Index(fields=['school', 'updated_at'], name='teacher_school_updated_idx'),
+        ),
+    ]
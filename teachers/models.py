@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from schools.models import School
 from students.models import Class
 from core.utils import generate_custom_id
@@ -63,8 +65,16 @@ class Teacher(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Full-text search document, maintained by a database trigger on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         unique_together = ['school', 'employee_id']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='teacher_search_vector_gin'),
+            # Delta sync (core.sync)
+            models.Index(fields=['school', 'updated_at'], name='teacher_school_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.employee_id}"
@@ -83,6 +93,7 @@ class TeacherClassAssignment(models.Model):
     assigned_class = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='assigned_teachers')
     is_primary = models.BooleanField(default=False)  # Whether this teacher is the primary teacher for this class
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         unique_together = ['teacher', 'assigned_class']
@@ -96,6 +107,7 @@ class TeacherAttendance(models.Model):
     date = models.DateField()
     is_present = models.BooleanField(default=True)
     remarks = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         unique_together = ['teacher', 'date']
@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from .models import Teacher, TeacherClassAssignment, TeacherAttendance
 from students.models import Class
 from users.serializers import UserSerializer
+from core.serializers import CachedRepresentationMixin, CachedListSerializer, SparseFieldsMixin, ValuesSerializerMixin
 from core.utils import send_teacher_credentials_email
 import secrets
 import string
@@ -25,7 +26,14 @@ class TeacherClassAssignmentSerializer(serializers.ModelSerializer):
         fields = ('id', 'assigned_class', 'class_name', 'is_primary')
         read_only_fields = ('id',)
 
-class TeacherSerializer(serializers.ModelSerializer):
+class TeacherClassAssignmentSyncSerializer(TeacherClassAssignmentSerializer):
+    """Assignments on their own (delta sync), so they name their teacher."""
+    teacher = serializers.SlugRelatedField(slug_field='custom_id', read_only=True)
+    
+    class Meta(TeacherClassAssignmentSerializer.Meta):
+        fields = TeacherClassAssignmentSerializer.Meta.fields + ('teacher',)
+
+class TeacherSerializer(SparseFieldsMixin, ValuesSerializerMixin, CachedRepresentationMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     assigned_classes = TeacherClassAssignmentSerializer(source='class_assignments', many=True, read_only=True)
     profile_image_url = serializers.SerializerMethodField()
@@ -42,6 +50,12 @@ class TeacherSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         )
         read_only_fields = ('custom_id', 'created_at', 'updated_at')
+        # updated_at is touched when the teacher's user or class assignments
+        # change (see teachers/signals.py), so it versions the whole payload
+        list_serializer_class = CachedListSerializer
+        values_method_fields = {'profile_image_url': ('profile_image',)}
+        # Left out of ?fields= selections unless asked for with ?expand=
+        expandable_fields = ('user', 'assigned_classes')
     
     
     def get_profile_image_url(self, obj):
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from core.signals import school_data_changed
+from .models import Teacher, TeacherClassAssignment, TeacherAttendance
+
+
+@receiver(post_save, sender=Teacher)
+def teacher_saved(sender, instance, **kwargs):
+    school_data_changed.send(
+        sender=sender, pk=instance.pk, school_id=instance.school_id, deleted=False, instance=instance
+    )
+
+
+@receiver(post_delete, sender=Teacher)
+def teacher_deleted(sender, instance, **kwargs):
+    school_data_changed.send(
+        sender=sender, pk=instance.pk, school_id=instance.school_id, deleted=True, instance=instance
+    )
+
+
+@receiver(post_save, sender=TeacherClassAssignment)
+@receiver(post_delete, sender=TeacherClassAssignment)
+@receiver(post_save, sender=TeacherAttendance)
+@receiver(post_delete, sender=TeacherAttendance)
+def teacher_record_changed(sender, instance, **kwargs):
+    school_data_changed.send(
+        sender=sender,
+        pk=instance.pk,
+        school_id=instance.teacher.school_id,
+        deleted='created' not in kwargs,
+        instance=instance,
+    )
+
+
+# TeacherSerializer nests the user and the class assignments, and its cached
+# representation is versioned by Teacher.updated_at, so changes to either
+# have to move the teacher's timestamp too.
+@receiver(post_save, sender=TeacherClassAssignment)
+@receiver(post_delete, sender=TeacherClassAssignment)
+def touch_teacher_for_assignment(sender, instance, **kwargs):
+    Teacher.objects.filter(pk=instance.teacher_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def touch_teacher_for_user(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    Teacher.objects.filter(user_id=instance.pk).update(updated_at=timezone.now())
@@ -1,3 +1,105 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import override_settings
+
+from core.testing import SchoolTestCase, clear_caches
+from students.models import Class
+from .serializers import TeacherSerializer
+from .views import TeacherListCreateView
+
+
+class TeacherTestCase(SchoolTestCase):
+    """A school with two classes and two teachers, and a client logged in as the admin."""
+
+    def setUp(self):
+        super().setUp()
+        self.classes = [self.school_class, Class.objects.create(school=self.school, class_name='JSS2')]
+        self.teachers = [self.make_teacher(classes=self.classes), self.make_teacher(first_name='Uche')]
+
+    def get_fresh(self, path, **params):
+        """`path` rendered from scratch, with no cached responses or fragments."""
+        clear_caches()
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+
+@override_settings(SERIALIZER_FRAGMENT_CACHE=False)
+class ValuesPathTests(TeacherTestCase):
+
+    def test_values_rows_render_the_same_bytes(self):
+        with override_settings(VALUES_FAST_PATH=False):
+            expected = self.get_fresh('/api/teachers/').content
+        # The fast path never builds model instances
+        with mock.patch.object(TeacherSerializer, 'serialize_uncached', side_effect=AssertionError):
+            self.assertEqual(self.get_fresh('/api/teachers/').content, expected)
+        self.assertEqual(len(self.get_fresh('/api/teachers/').json()), 2)
+
+
+class SparseFieldsTests(TeacherTestCase):
+
+    def test_fields_selects_output(self):
+        data = self.get_fresh('/api/teachers/', fields='custom_id,first_name').json()
+        self.assertEqual([set(item) for item in data], [{'custom_id', 'first_name'}] * 2)
+
+    def test_expand_adds_relations_to_a_selection(self):
+        data = self.get_fresh('/api/teachers/', fields='employee_id', expand='assigned_classes').json()
+        self.assertEqual(set(data[0]), {'employee_id', 'assigned_classes'})
+        self.assertEqual(len(data[0]['assigned_classes']), 2)
+
+    def test_expand_alone_keeps_the_other_fields(self):
+        full = self.get_fresh('/api/teachers/').json()[0]
+        expanded = self.get_fresh('/api/teachers/', expand='user').json()[0]
+        self.assertEqual(set(expanded), set(full) - {'assigned_classes'})
+        self.assertEqual(expanded['user'], full['user'])
+
+    def test_unknown_fields_are_rejected(self):
+        clear_caches()
+        response = self.client.get('/api/teachers/', {'fields': 'first_name,salary_band', 'expand': 'school'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields', 'expand'})
+
+    @override_settings(SERIALIZER_FRAGMENT_CACHE=False)
+    def test_selections_render_the_same_bytes_on_both_paths(self):
+        params = {'fields': 'custom_id,profile_image_url', 'expand': 'user'}
+        with override_settings(VALUES_FAST_PATH=False):
+            expected = self.get_fresh('/api/teachers/', **params).content
+        self.assertEqual(self.get_fresh('/api/teachers/', **params).content, expected)
+
+    def test_detail_honours_fields(self):
+        teacher = self.teachers[0]
+        data = self.get_fresh(f'/api/teachers/{teacher.custom_id}/', fields='first_name').json()
+        self.assertEqual(data, {'first_name': 'Tom'})
+
+
+@override_settings(SERIALIZER_FRAGMENT_CACHE=False)
+class StreamingListTests(TeacherTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_teacher(classes=self.classes[1:], first_name='Ngozi')
+
+    def streamed(self, **params):
+        clear_caches()
+        # Small chunks, so relations are fetched across several of them
+        with mock.patch.object(TeacherListCreateView, 'stream_chunk_size', 2):
+            response = self.client.get('/api/teachers/', {'format': 'stream', **params})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            return b''.join(response.streaming_content)
+
+    def test_stream_has_the_bytes_of_the_json_list(self):
+        expected = self.get_fresh('/api/teachers/').content
+        self.assertEqual(self.streamed(), expected)
+        with override_settings(VALUES_FAST_PATH=False):
+            self.assertEqual(self.streamed(), expected)
+
+    def test_stream_honours_fields(self):
+        expected = self.get_fresh('/api/teachers/', fields='employee_id', expand='assigned_classes').content
+        self.assertEqual(self.streamed(fields='employee_id', expand='assigned_classes'), expected)
+
+    def test_streams_are_not_cached(self):
+        self.streamed()
+        response = self.client.get('/api/teachers/', {'format': 'stream'})
+        self.assertNotIn('X-Cache', response)
+        b''.join(response.streaming_content)
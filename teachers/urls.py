@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     TeacherListCreateView,
@@ -7,21 +8,32 @@ from .views import (
     TeacherAttendanceListCreateView,
     TeacherAttendanceDetailView,
     resend_teacher_credentials,
-    teacher_dashboard
+    teacher_dashboard,
+    AsyncTeacherListCreateView,
+    AsyncTeacherDetailView,
+    AsyncTeacherAttendanceListCreateView,
+    AsyncTeacherDashboardView,
 )
 
+# Under ASGI, serve the hottest reads from async views
+if settings.ASYNC_READ_VIEWS:
+    TeacherListCreateView = AsyncTeacherListCreateView
+    TeacherDetailView = AsyncTeacherDetailView
+    TeacherAttendanceListCreateView = AsyncTeacherAttendanceListCreateView
+    teacher_dashboard = AsyncTeacherDashboardView.as_view()
+
 urlpatterns = [
-    # Teacher endpoints
-    path('profile/', TeacherProfileView.as_view(), name='teacher-profile'),
-    path('', TeacherListCreateView.as_view(), name='teacher-list'),
-    path('<str:pk>/', TeacherDetailView.as_view(), name='teacher-detail'),
-    path('<str:teacher_id>/classes/', TeacherClassListView.as_view(), name='teacher-classes'),
-    path('<str:pk>/resend-credentials/', resend_teacher_credentials, name='teacher-resend-credentials'),
-    
     # Teacher attendance endpoints
     path('attendance/', TeacherAttendanceListCreateView.as_view(), name='teacher-attendance-list'),
     path('attendance/<int:pk>/', TeacherAttendanceDetailView.as_view(), name='teacher-attendance-detail'),
     
     # Dashboard
     path('dashboard/', teacher_dashboard, name='teacher-dashboard'),
+    
+    # Teacher endpoints (the <str:pk> routes must come after the fixed paths)
+    path('profile/', TeacherProfileView.as_view(), name='teacher-profile'),
+    path('', TeacherListCreateView.as_view(), name='teacher-list'),
+    path('<str:pk>/', TeacherDetailView.as_view(), name='teacher-detail'),
+    path('<str:teacher_id>/classes/', TeacherClassListView.as_view(), name='teacher-classes'),
+    path('<str:pk>/resend-credentials/', resend_teacher_credentials, name='teacher-resend-credentials'),
 ]
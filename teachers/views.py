@@ -21,34 +21,35 @@ import string
 from rest_framework.exceptions import ValidationError
 from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.exceptions import NotFound
+from core.search import FullTextSearchFilter
+from core.access import get_access_scope
+from core.cache import CachedResponseMixin
+from core.singleflight import single_flight, SingleFlightListMixin
+from core.views import AsyncAPIView, AsyncListModelMixin, AsyncRetrieveModelMixin, gather_reads, SparseFieldsViewMixin, StreamingListMixin, ValuesListMixin
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Q
 
 
 # In teachers/views.py
-class TeacherListCreateView(generics.ListCreateAPIView):
+class TeacherListCreateView(CachedResponseMixin, StreamingListMixin, ValuesListMixin, SparseFieldsViewMixin, generics.ListCreateAPIView):
     """
     List all teachers or create a new teacher
     """
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['is_active', 'gender', 'access_level']
     search_fields = ['first_name', 'last_name', 'employee_id', 'highest_certificate']
+    search_vector_field = 'search_vector'
     ordering_fields = ['first_name', 'last_name', 'joining_date', 'salary']
     parser_classes = [MultiPartParser, FormParser]
     
     def get_queryset(self):
-        # Try to get school from request
-        if hasattr(self.request, 'school') and self.request.school:
-            school = self.request.school
-        else:
-            # Fallback: try to get school from user
-            from schools.models import School
-            school = School.objects.filter(admin=self.request.user).first()
-            
-            if not school:
-                # Return empty queryset if no school found
-                return Teacher.objects.none()
+        scope = get_access_scope(self.request)
+        if scope.school_id is None:
+            # Return empty queryset if no school found
+            return Teacher.objects.none()
         
         # Filter teachers by the current school
-        return Teacher.objects.filter(school=school)
+        return Teacher.objects.filter(school_id=scope.school_id)
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -95,7 +96,7 @@ class TeacherListCreateView(generics.ListCreateAPIView):
         return Response(response_data, status=status.HTTP_201_CREATED)
 
 
-class TeacherDetailView(generics.RetrieveUpdateDestroyAPIView):
+class TeacherDetailView(CachedResponseMixin, SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete a teacher instance
     """
@@ -105,20 +106,13 @@ class TeacherDetailView(generics.RetrieveUpdateDestroyAPIView):
     lookup_field = 'custom_id'  # Use custom_id for lookups
     
     def get_queryset(self):
-        # Try to get school from request
-        if hasattr(self.request, 'school') and self.request.school:
-            school = self.request.school
-        else:
-            # Fallback: try to get school from user
-            from schools.models import School
-            school = School.objects.filter(admin=self.request.user).first()
-            
-            if not school:
-                # Return empty queryset if no school found
-                return Teacher.objects.none()
+        scope = get_access_scope(self.request)
+        if scope.school_id is None:
+            # Return empty queryset if no school found
+            return Teacher.objects.none()
         
         # Filter teachers by the current school
-        return Teacher.objects.filter(school=school)
+        return Teacher.objects.filter(school_id=scope.school_id)
     
     def get_object(self):
         queryset = self.get_queryset()
@@ -130,6 +124,7 @@ class TeacherDetailView(generics.RetrieveUpdateDestroyAPIView):
         except Teacher.DoesNotExist:
            # print("Teacher not found")
             raise NotFound("Teacher not found")
+        self.check_object_permissions(self.request, obj)
         return obj
     
     def destroy(self, request, *args, **kwargs):
@@ -207,26 +202,19 @@ class TeacherClassListView(generics.ListAPIView):
     def get_queryset(self):
         teacher_id = self.kwargs.get('teacher_id')
         
-        # Try to get school from request
-        if hasattr(self.request, 'school') and self.request.school:
-            school = self.request.school
-        else:
-            # Fallback: try to get school from user
-            from schools.models import School
-            school = School.objects.filter(admin=self.request.user).first()
-            
-            if not school:
-                # Return empty queryset if no school found
-                return TeacherClassAssignment.objects.none()
+        scope = get_access_scope(self.request)
+        if scope.school_id is None:
+            # Return empty queryset if no school found
+            return TeacherClassAssignment.objects.none()
         
         return TeacherClassAssignment.objects.filter(
             teacher__custom_id=teacher_id,
-            teacher__school=school
+            teacher__school_id=scope.school_id
         )
 
 
 
-class TeacherAttendanceListCreateView(generics.ListCreateAPIView):
+class TeacherAttendanceListCreateView(StreamingListMixin, SingleFlightListMixin, generics.ListCreateAPIView):
     """
     List all teacher attendance records or create a new one
     """
@@ -236,20 +224,13 @@ class TeacherAttendanceListCreateView(generics.ListCreateAPIView):
     ordering_fields = ['date']
     
     def get_queryset(self):
-        # Try to get school from request
-        if hasattr(self.request, 'school') and self.request.school:
-            school = self.request.school
-        else:
-            # Fallback: try to get school from user
-            from schools.models import School
-            school = School.objects.filter(admin=self.request.user).first()
-            
-            if not school:
-                # Return empty queryset if no school found
-                return TeacherAttendance.objects.none()
+        scope = get_access_scope(self.request)
+        if scope.school_id is None:
+            # Return empty queryset if no school found
+            return TeacherAttendance.objects.none()
         
         # Filter attendance by teachers in the current school
-        return TeacherAttendance.objects.filter(teacher__school=school)
+        return TeacherAttendance.objects.filter(teacher__school_id=scope.school_id).select_related('teacher')
     
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -263,20 +244,13 @@ class TeacherAttendanceDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = TeacherAttendanceSerializer
     
     def get_queryset(self):
-        # Try to get school from request
-        if hasattr(self.request, 'school') and self.request.school:
-            school = self.request.school
-        else:
-            # Fallback: try to get school from user
-            from schools.models import School
-            school = School.objects.filter(admin=self.request.user).first()
-            
-            if not school:
-                # Return empty queryset if no school found
-                return TeacherAttendance.objects.none()
+        scope = get_access_scope(self.request)
+        if scope.school_id is None:
+            # Return empty queryset if no school found
+            return TeacherAttendance.objects.none()
         
         # Filter attendance by teachers in the current school
-        return TeacherAttendance.objects.filter(teacher__school=school)
+        return TeacherAttendance.objects.filter(teacher__school_id=scope.school_id).select_related('teacher')
     
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
@@ -289,22 +263,15 @@ def resend_teacher_credentials(request, pk):
     """
     Resend login credentials to a teacher
     """
-    # Try to get school from request
-    if hasattr(request, 'school') and request.school:
-        school = request.school
-    else:
-        # Fallback: try to get school from user
-        from schools.models import School
-        school = School.objects.filter(admin=request.user).first()
-        
-        if not school:
-            return Response(
-                {"detail": "No school found for this user. Please create a school first."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+    school_id = get_access_scope(request).school_id
+    if school_id is None:
+        return Response(
+            {"detail": "No school found for this user. Please create a school first."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
     try:
-        teacher = Teacher.objects.get(custom_id=pk, school=school)
+        teacher = Teacher.objects.select_related('user', 'school').get(custom_id=pk, school_id=school_id)
     except Teacher.DoesNotExist:
         return Response(
             {"detail": "Teacher not found."},
@@ -353,38 +320,88 @@ def teacher_dashboard(request):
     """
     Get dashboard statistics for teachers
     """
-    # Try to get school from request
-    if hasattr(request, 'school') and request.school:
-        school = request.school
-    else:
-        # Fallback: try to get school from user
-        from schools.models import School
-        school = School.objects.filter(admin=request.user).first()
-        
-        if not school:
-            return Response(
-                {"detail": "No school found for this user. Please create a school first."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-    
-    # Get basic statistics
-    total_teachers = Teacher.objects.filter(school=school).count()
-    active_teachers = Teacher.objects.filter(school=school, is_active=True).count()
+    school_id = get_access_scope(request).school_id
+    if school_id is None:
+        return Response(
+            {"detail": "No school found for this user. Please create a school first."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    # Get attendance statistics
-    attendance_data = TeacherAttendance.objects.filter(teacher__school=school)
-    total_attendance = attendance_data.count()
-    present_count = attendance_data.filter(is_present=True).count()
+    # Staff tend to open the dashboard at the same moment; let concurrent
+    # requests for the same school share one set of queries
+    return Response(single_flight.do(
+        f'teacher-dashboard:{school_id}',
+        lambda: dashboard_data(get_teacher_stats(school_id), get_attendance_stats(school_id)),
+        school_id,
+    ))
+
+
+def get_teacher_stats(school_id):
+    return Teacher.objects.filter(school_id=school_id).aggregate(
+        total_teachers=Count('id'),
+        active_teachers=Count('id', filter=Q(is_active=True)),
+    )
+
+
+def get_attendance_stats(school_id):
+    return TeacherAttendance.objects.filter(teacher__school_id=school_id).aggregate(
+        total_attendance=Count('id'),
+        present_count=Count('id', filter=Q(is_present=True)),
+    )
+
+
+def dashboard_data(teacher_stats, attendance_stats):
+    total_attendance = attendance_stats['total_attendance']
+    present_count = attendance_stats['present_count']
     
     # Calculate attendance percentage
     attendance_percentage = 0
     if total_attendance > 0:
         attendance_percentage = (present_count / total_attendance) * 100
     
-    return Response({
-        'total_teachers': total_teachers,
-        'active_teachers': active_teachers,
+    return {
+        'total_teachers': teacher_stats['total_teachers'],
+        'active_teachers': teacher_stats['active_teachers'],
         'total_attendance': total_attendance,
         'present_count': present_count,
         'attendance_percentage': attendance_percentage
-    })
\ No newline at end of file
+    }
+
+
+# Async variants of the hottest read endpoints (see ASYNC_READ_VIEWS)
+
+class AsyncTeacherListCreateView(AsyncListModelMixin, AsyncAPIView, TeacherListCreateView):
+    pass
+
+
+class AsyncTeacherDetailView(AsyncRetrieveModelMixin, AsyncAPIView, TeacherDetailView):
+    pass
+
+
+class AsyncTeacherAttendanceListCreateView(AsyncListModelMixin, AsyncAPIView, TeacherAttendanceListCreateView):
+    pass
+
+
+class AsyncTeacherDashboardView(AsyncAPIView):
+    """
+    teacher_dashboard with its two aggregates running concurrently, each on
+    its own connection.
+    """
+    permission_classes = [IsAuthenticated, IsSchoolAdmin | IsTeacherWithFullAccess]
+    
+    async def get(self, request):
+        school_id = await sync_to_async(lambda: get_access_scope(request).school_id)()
+        if school_id is None:
+            return Response(
+                {"detail": "No school found for this user. Please create a school first."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        async def compute():
+            teacher_stats, attendance_stats = await gather_reads(
+                lambda: get_teacher_stats(school_id),
+                lambda: get_attendance_stats(school_id),
+            )
+            return dashboard_data(teacher_stats, attendance_stats)
+        
+        return Response(await single_flight.ado(f'teacher-dashboard:{school_id}', compute))
@@ -0,0 +1,135 @@
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate, login, user_logged_in
+from django.contrib.auth.hashers import check_password, make_password
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from core.hashing import hashing_executor
+from core.tokens import RefreshToken
+from .models import User
+
+
+def is_lean_login():
+    return getattr(settings, 'LEAN_LOGIN', True)
+
+
+class LastLoginBuffer:
+    """
+    Collects last_login timestamps and writes them in one UPDATE every
+    LAST_LOGIN_FLUSH_INTERVAL seconds (or LAST_LOGIN_FLUSH_SIZE logins),
+    instead of one write per login. Uses queryset.update(), so no save
+    signals fire and no caches are invalidated for it.
+
+    It is flushed when a request finishes once the interval has passed, and
+    at exit, so last_login lags by up to the interval (longer while the
+    worker is idle) and is lost if the worker is killed.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'LAST_LOGIN_FLUSH_INTERVAL', 60)
+
+    @property
+    def flush_size(self):
+        return getattr(settings, 'LAST_LOGIN_FLUSH_SIZE', 500)
+
+    def record(self, user):
+        with self._lock:
+            self._pending[user.pk] = timezone.now()
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        with self._lock:
+            due = self._pending and (
+                len(self._pending) >= self.flush_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        User.objects.filter(pk__in=pending).update(
+            last_login=Case(
+                *[When(pk=pk, then=Value(logged_in_at)) for pk, logged_in_at in pending.items()],
+                output_field=DateTimeField(),
+            )
+        )
+
+
+last_login_buffer = LastLoginBuffer()
+
+
+def authenticate_user(request, email, password):
+    """
+    Check credentials. In lean mode the user is fetched with their school
+    in the same query, so `hasattr(user, 'school')` costs nothing later.
+    """
+    if not is_lean_login():
+        return authenticate(request, username=email, password=password)
+
+    user = User.objects.select_related('school').filter(email=email).first()
+    if user is None:
+        # Hash anyway so response time doesn't reveal which emails exist
+        User().set_password(password)
+        return None
+    if not user.check_password(password) or not user.is_active:
+        return None
+    return user
+
+
+async def aauthenticate_user(email, password):
+    """
+    authenticate_user() for async views: the password is checked on the
+    hashing executor, and only the lookup (and a hash upgrade) touch the
+    database.
+    """
+    user = await User.objects.select_related('school').filter(email=email).afirst()
+    if user is None:
+        await hashing_executor.run(make_password, password)
+        return None
+    # check_password() calls the setter if the hash needs upgrading
+    outdated = []
+    valid = await hashing_executor.run(check_password, password, user.password, outdated.append)
+    if not valid or not user.is_active:
+        return None
+    if outdated:
+        user.password = await hashing_executor.run(make_password, password)
+        await user.asave(update_fields=['password'])
+    return user
+
+
+def issue_tokens(user):
+    if getattr(settings, 'LEAN_LOGIN_TRACK_OUTSTANDING_TOKENS', True):
+        return RefreshToken.for_user(user)
+    return RefreshToken.for_untracked_user(user)
+
+
+def complete_login(request, user, session=False):
+    """
+    Record the login and return a refresh token for `user`. Lean mode never
+    creates a session (the API authenticates with tokens) and batches
+    last_login; otherwise `session=True` logs in with django.contrib.auth,
+    or just sends user_logged_in where the path has no session (the API).
+    """
+    if is_lean_login():
+        last_login_buffer.record(user)
+    elif session and hasattr(request, 'session'):
+        login(request, user)
+    elif session:
+        user_logged_in.send(sender=user.__class__, request=request, user=user)
+    return issue_tokens(user)
@@ -0,0 +1,84 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from users.models import EmailVerification, PasswordReset
+
+
+def delete_in_batches(queryset, batch_size, pause=0):
+    """
+    Delete the rows of `queryset` a batch of primary keys at a time, so no
+    statement holds its locks for long. Yields (rows deleted, seconds) per
+    batch.
+    """
+    model = queryset.model
+    pks = queryset.order_by().values_list('pk', flat=True)
+    while True:
+        batch = list(pks[:batch_size])
+        if not batch:
+            return
+        start = time.monotonic()
+        model._base_manager.filter(pk__in=batch).delete()
+        yield len(batch), time.monotonic() - start
+        if pause:
+            time.sleep(pause)
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete used or expired email verification and password reset codes, '
+        'and expired outstanding/blacklisted JWT refresh tokens, in batches. '
+        'Run it from cron, or keep it running with --interval.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows deleted per statement (default: 1000)')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between batches (default: 0)')
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Keep expired codes this long so users still see "expired" (default: 60)')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every this many seconds instead of running once')
+
+    def get_querysets(self, grace_minutes):
+        now = timezone.now()
+        code_cutoff = now - timedelta(minutes=grace_minutes)
+        return [
+            ('EmailVerification', EmailVerification.objects.filter(
+                Q(is_used=True) | Q(expires_at__lt=code_cutoff)
+            )),
+            ('PasswordReset', PasswordReset.objects.filter(
+                Q(is_used=True) | Q(expires_at__lt=code_cutoff)
+            )),
+            # Blacklist entries first, so deleting outstanding tokens has
+            # nothing left to cascade to
+            ('BlacklistedToken', BlacklistedToken.objects.filter(token__expires_at__lt=now)),
+            ('OutstandingToken', OutstandingToken.objects.filter(expires_at__lt=now)),
+        ]
+
+    def purge(self, batch_size, pause, grace_minutes):
+        for name, queryset in self.get_querysets(grace_minutes):
+            total = batches = 0
+            elapsed = 0.0
+            for deleted, seconds in delete_in_batches(queryset, batch_size, pause):
+                batches += 1
+                total += deleted
+                elapsed += seconds
+                self.stdout.write(f'{name}: batch {batches} deleted {deleted} rows in {seconds:.3f}s')
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: {total} rows deleted in {batches} batches ({elapsed:.3f}s)'
+            ))
+
+    def handle(self, *args, **options):
+        while True:
+            self.purge(options['batch_size'], options['pause'], options['grace_minutes'])
+            if not options['interval']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.8 on 2026-10-19 09:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_custom_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailverification',
+            index=models.Index(condition=models.Q(('is_used', False)), fields=['user', 'otp', '-created_at'], name='emailverif_unused_otp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailverification',
+            index=models.Index(fields=['expires_at'], name='emailverif_expires_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordreset',
+            index=models.Index(condition=models.Q(('is_used', False)), fields=['user', 'otp', '-created_at'], name='passwordreset_unused_otp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordreset',
+            index=models.Index(fields=['expires_at'], name='passwordreset_expires_idx'),
+        ),
+    ]
@@ -12,7 +12,7 @@ from core.utils import generate_custom_id
     
     
 class UserManager(BaseUserManager):
-    def create_user(self, email, full_name, password=None, **extra_fields):
+    def create_user(self, email, full_name, password=None, password_hash=None, **extra_fields):
         if not email:
             raise ValueError('Users must have an email address')
         
@@ -24,7 +24,11 @@ class UserManager(BaseUserManager):
             extra_fields['is_staff'] = True 
         
         user = self.model(email=email, full_name=full_name, **extra_fields)
-        user.set_password(password)
+        if password_hash is not None:
+            # Already hashed with make_password(), e.g. off the request thread
+            user.password = password_hash
+        else:
+            user.set_password(password)
         user.save(using=self._db)
         return user
     
@@ -87,6 +91,17 @@ class EmailVerification(models.Model):
     expires_at = models.DateTimeField()
     is_used = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            # Code checks only look at unused codes; expired ones are purged
+            # by the purge_expired_auth_data command
+            models.Index(
+                fields=['user', 'otp', '-created_at'],
+                condition=models.Q(is_used=False),
+                name='emailverif_unused_otp_idx',
+            ),
+            models.Index(fields=['expires_at'], name='emailverif_expires_at_idx'),
+        ]
     
     def __str__(self):
         return f"Password reset for {self.user.email}"
@@ -109,6 +124,16 @@ class PasswordReset(models.Model):
     expires_at = models.DateTimeField()
     is_used = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'otp', '-created_at'],
+                condition=models.Q(is_used=False),
+                name='passwordreset_unused_otp_idx',
+            ),
+            models.Index(fields=['expires_at'], name='passwordreset_expires_idx'),
+        ]
+    
     def __str__(self):
         return f"Password reset for {self.user.email}"
     
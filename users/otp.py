@@ -0,0 +1,101 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.module_loading import import_string
+
+OTP_CACHE_ALIAS = 'otp'
+
+# Purposes a code can be issued for
+VERIFY_EMAIL = 'verify_email'
+RESET_PASSWORD = 'reset_password'
+
+
+class OTPError(Exception):
+    """Raised by OTPStore.check(); `code` is 'invalid', 'expired' or 'too_many_attempts'."""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class CacheOTPStore:
+    """
+    One-time codes kept in the 'otp' cache instead of database rows.
+
+    Only a keyed hash of each code is stored, one live code per user and
+    purpose (issuing a new code replaces the old one), with a counter of
+    wrong guesses: after OTP_MAX_ATTEMPTS the code is discarded. A code
+    passes check() once, even when several requests race with it. Entries
+    expire on their own, so nothing needs purging. The cache backend is
+    chosen with OTP_CACHE_BACKEND (file, locmem or db); the counter and the
+    single use rely on its add() and incr() being atomic.
+    """
+
+    def __init__(self, alias=OTP_CACHE_ALIAS):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def max_attempts(self):
+        return getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+
+    def _key(self, user, purpose):
+        return f'otp:{purpose}:{user.pk}'
+
+    def _hash(self, user, purpose, otp):
+        return salted_hmac(f'otp:{purpose}:{user.pk}', otp).hexdigest()
+
+    def issue(self, user, purpose, otp, ttl):
+        """Store `otp` for `user` and `purpose`, valid for `ttl` seconds."""
+        key = self._key(user, purpose)
+        entry = {
+            'hash': self._hash(user, purpose, otp),
+            'expires_at': time.time() + ttl,
+            # Tells this code's use apart from an earlier one of the same digits
+            'nonce': uuid.uuid4().hex,
+        }
+        # Kept a while past expiry so a late attempt says "expired", not "invalid"
+        self.cache.set(key, entry, timeout=2 * ttl)
+        self.cache.delete(f'{key}:attempts')
+
+    def check(self, user, purpose, otp):
+        """
+        Raise OTPError unless `otp` is the user's live code for `purpose`;
+        a code that passes is used up, so only one request gets through.
+        """
+        key = self._key(user, purpose)
+        entry = self.cache.get(key)
+        if entry is None:
+            raise OTPError('invalid')
+        if not constant_time_compare(entry['hash'], self._hash(user, purpose, otp)):
+            attempts_key = f'{key}:attempts'
+            self.cache.add(attempts_key, 0, timeout=max(1, int(entry['expires_at'] - time.time())))
+            try:
+                attempts = self.cache.incr(attempts_key)
+            except ValueError:
+                attempts = 1
+            if attempts >= self.max_attempts:
+                self.consume(user, purpose)
+                raise OTPError('too_many_attempts')
+            raise OTPError('invalid')
+        remaining = entry['expires_at'] - time.time()
+        if remaining < 0:
+            raise OTPError('expired')
+        used_key = f"{key}:used:{entry.get('nonce', entry['hash'])}"
+        if not self.cache.add(used_key, True, timeout=int(remaining) + 1):
+            raise OTPError('invalid')
+
+    def consume(self, user, purpose):
+        """Discard the user's code for `purpose` once it has been used."""
+        key = self._key(user, purpose)
+        self.cache.delete_many([key, f'{key}:attempts'])
+
+
+def get_otp_store():
+    return import_string(getattr(settings, 'OTP_STORE', 'users.otp.CacheOTPStore'))()
@@ -3,7 +3,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.utils import timezone
 from datetime import timedelta
-from .models import EmailVerification, PasswordReset
+from .otp import get_otp_store, OTPError, VERIFY_EMAIL, RESET_PASSWORD
 from core.utils import generate_otp, send_verification_email, send_password_reset_email
 
 User = get_user_model()
@@ -48,6 +48,8 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             email=validated_data['email'],
             full_name=validated_data['full_name'],
             password=validated_data['password'],
+            # Set when the view hashed the password itself (see AsyncRegisterUserView)
+            password_hash=validated_data.get('password_hash'),
             role=validated_data.get('role', User.ROLE_ADMIN),  # Make sure role is passed
             is_verified=False
         )
@@ -61,22 +63,18 @@ class VerifyEmailSerializer(serializers.Serializer):
     def validate(self, data):
         try:
             user = User.objects.get(email=data['email'])
-            verification = EmailVerification.objects.filter(
-                user=user,
-                otp=data['otp'],
-                is_used=False
-            ).latest('created_at')
-            
-            if not verification.is_valid():
-                raise serializers.ValidationError("Verification code has expired")
+            get_otp_store().check(user, VERIFY_EMAIL, data['otp'])
             
             self.context['user'] = user
-            self.context['verification'] = verification
             
             return data
         except User.DoesNotExist:
             raise serializers.ValidationError("User with this email does not exist")
-        except EmailVerification.DoesNotExist:
+        except OTPError as e:
+            if e.code == 'expired':
+                raise serializers.ValidationError("Verification code has expired")
+            if e.code == 'too_many_attempts':
+                raise serializers.ValidationError("Too many incorrect attempts. Please request a new verification code.")
             raise serializers.ValidationError("Invalid verification code")
 
 class ResendVerificationSerializer(serializers.Serializer):
@@ -140,20 +138,16 @@ class ResetPasswordSerializer(serializers.Serializer):
         
         try:
             user = User.objects.get(email=data['email'])
-            reset = PasswordReset.objects.filter(
-                user=user,
-                otp=data['otp'],
-                is_used=False
-            ).latest('created_at')
-            
-            if not reset.is_valid():
-                raise serializers.ValidationError("Password reset otp has expired")
+            get_otp_store().check(user, RESET_PASSWORD, data['otp'])
             
             self.context['user'] = user
-            self.context['reset'] = reset
             
             return data
         except User.DoesNotExist:
             raise serializers.ValidationError("No user found with this email address")
-        except PasswordReset.DoesNotExist:
+        except OTPError as e:
+            if e.code == 'expired':
+                raise serializers.ValidationError("Password reset otp has expired")
+            if e.code == 'too_many_attempts':
+                raise serializers.ValidationError("Too many incorrect attempts. Please request a new password reset code.")
             raise serializers.ValidationError("Invalid or expired password reset token")
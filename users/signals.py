@@ -0,0 +1,39 @@
+from django.core.signals import request_finished
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core.signals import school_data_changed
+from .login import last_login_buffer
+from .models import User
+
+
+def get_user_school_id(user):
+    from schools.models import School
+    from teachers.models import Teacher
+    school_id = School.objects.filter(admin_id=user.pk).values_list('id', flat=True).first()
+    if school_id is None:
+        school_id = Teacher.objects.filter(user_id=user.pk).values_list('school_id', flat=True).first()
+    return school_id
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # New users belong to no school yet, and logins only touch last_login
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    
+    # Sent even without a school so per-user caches can drop the user
+    school_data_changed.send(
+        sender=sender, pk=instance.pk, school_id=get_user_school_id(instance), deleted=False, instance=instance
+    )
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    school_data_changed.send(
+        sender=sender, pk=instance.pk, school_id=None, deleted=True, instance=instance
+    )
+
+
+@receiver(request_finished)
+def flush_last_logins(sender, **kwargs):
+    last_login_buffer.flush_if_due()
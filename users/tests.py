@@ -1,3 +1,392 @@
-from django.test import TestCase
+import io
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from asgiref.sync import async_to_sync
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.throttling import SlidingWindowThrottle
+from core.authentication import AuthUserCache, auth_user_cache
+from core.bus import invalidation_bus
+from core.hashing import HashingBusy, hashing_executor
+from core.signals import school_data_changed
+from core.testing import SharedTransport, clear_caches, make_admin
+from core.tokens import BlacklistFilter, BloomFilter, RefreshToken, blacklist_filter
+from .login import last_login_buffer
+from .models import EmailVerification, User
+from .otp import RESET_PASSWORD, VERIFY_EMAIL, CacheOTPStore, OTPError, get_otp_store
+from .views import AsyncLoginView, AsyncRegisterUserView, AsyncResetPasswordView
+
+
+class UserTestCase(TestCase):
+
+    def setUp(self):
+        clear_caches()
+        auth_user_cache.clear()
+        self.user = make_admin('ada@example.com')
+
+    def bearer_client(self, user=None):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user or self.user)}')
+        return client
+
+
+class AuthUserCacheTests(UserTestCase):
+
+    def test_second_request_reads_no_user_row(self):
+        client = self.bearer_client()
+        self.assertEqual(client.get('/api/users/profile/').status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get('/api/users/profile/').status_code, 200)
+        self.assertFalse([query for query in queries if 'users_user' in query['sql']])
+
+    def test_deactivation_is_seen_immediately_in_this_worker(self):
+        client = self.bearer_client()
+        self.assertEqual(client.get('/api/users/profile/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(client.get('/api/users/profile/').status_code, 401)
+
+    def test_remote_change_evicts_the_user(self):
+        auth_user_cache.get_user(self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertTrue(auth_user_cache.get_user(self.user.pk).is_active)
+        school_data_changed.send(sender=User, pk=self.user.pk, school_id=None, deleted=False, instance=None, remote=True)
+        self.assertFalse(auth_user_cache.get_user(self.user.pk).is_active)
+
+    @override_settings(AUTH_USER_CACHE_TTL=60, AUTH_USER_CACHE_LOCAL_TTL=5)
+    def test_ttl_is_capped_without_a_shared_bus(self):
+        cache = AuthUserCache()
+        with mock.patch.object(invalidation_bus, '_transport', None), \
+                override_settings(INVALIDATION_BUS='local'):
+            self.assertEqual(cache.ttl, 5)
+        with mock.patch.object(invalidation_bus, '_transport', SharedTransport()):
+            self.assertEqual(cache.ttl, 60)
+
+    def test_expired_entries_are_reloaded(self):
+        cache = AuthUserCache(ttl=0)
+        cache.get_user(self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertFalse(cache.get_user(self.user.pk).is_active)
+
+
+class BloomFilterTests(TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [f'jti-{n}' for n in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        false_positives = sum(f'other-{n}' in bloom for n in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class BlacklistTests(UserTestCase):
+
+    def refresh(self, token):
+        return APIClient().post('/api/users/token/refresh/', {'refresh': str(token)}, format='json')
+
+    def test_blacklisted_token_is_refused(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        token.blacklist()
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_filter_skips_the_query_for_unknown_tokens_with_a_shared_bus(self):
+        token = RefreshToken.for_user(self.user)
+        bloom = BlacklistFilter()
+        with mock.patch.object(invalidation_bus, '_transport', SharedTransport()):
+            bloom.rebuild()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertFalse(bloom.is_blacklisted(token['jti']))
+        self.assertEqual(len(queries), 0)
+
+    def test_other_workers_blacklist_is_checked_without_a_shared_bus(self):
+        token = RefreshToken.for_user(self.user)
+        blacklist_filter.rebuild()
+        # Blacklisted by another worker: this worker's filter never heard of it
+        with mock.patch.object(blacklist_filter, 'add'):
+            token.blacklist()
+        with mock.patch.object(invalidation_bus, '_transport', None), \
+                override_settings(INVALIDATION_BUS='local'):
+            self.assertEqual(self.refresh(token).status_code, 401)
+
+
+class OTPStoreTests(UserTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = CacheOTPStore()
+
+    def assertOTPError(self, code, otp):
+        with self.assertRaises(OTPError) as raised:
+            self.store.check(self.user, VERIFY_EMAIL, otp)
+        self.assertEqual(raised.exception.code, code)
+
+    def test_code_passes_once(self):
+        self.store.issue(self.user, VERIFY_EMAIL, '123456', 60)
+        self.store.check(self.user, VERIFY_EMAIL, '123456')
+        self.assertOTPError('invalid', '123456')
+
+    def test_reissued_code_passes_again(self):
+        self.store.issue(self.user, VERIFY_EMAIL, '123456', 60)
+        self.store.check(self.user, VERIFY_EMAIL, '123456')
+        self.store.issue(self.user, VERIFY_EMAIL, '123456', 60)
+        self.store.check(self.user, VERIFY_EMAIL, '123456')
+
+    @override_settings(OTP_MAX_ATTEMPTS=3)
+    def test_code_is_discarded_after_max_attempts(self):
+        self.store.issue(self.user, VERIFY_EMAIL, '123456', 60)
+        self.assertOTPError('invalid', '000000')
+        self.assertOTPError('invalid', '000001')
+        self.assertOTPError('too_many_attempts', '000002')
+        self.assertOTPError('invalid', '123456')
+
+    def test_expired_code_is_refused(self):
+        self.store.issue(self.user, VERIFY_EMAIL, '123456', 60)
+        with mock.patch('users.otp.time') as clock:
+            clock.time.return_value = time.time() + 90
+            self.assertOTPError('expired', '123456')
+
+    def test_otp_cache_is_atomic_when_file_based(self):
+        from core.cache_backends import LockingFileBasedCache
+        if settings.OTP_CACHE_BACKEND == 'file':
+            self.assertIsInstance(self.store.cache, LockingFileBasedCache)
+
+
+class StatelessMiddlewareTests(UserTestCase):
+
+    def test_api_responses_set_no_session_or_csrf_cookie(self):
+        response = self.bearer_client().get('/api/users/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertNotIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+
+    def test_api_user_comes_from_the_token(self):
+        response = self.bearer_client().get('/api/users/profile/')
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_logout_blacklists_the_refresh_token(self):
+        token = RefreshToken.for_user(self.user)
+        response = self.bearer_client().post('/api/users/logout/', {'refresh': str(token)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        refreshed = APIClient().post('/api/users/token/refresh/', {'refresh': str(token)}, format='json')
+        self.assertEqual(refreshed.status_code, 401)
+
+    def test_logout_without_a_refresh_token(self):
+        response = self.bearer_client().post('/api/users/logout/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+    })
+
+
+class LeanLoginTests(UserTestCase):
+
+    def setUp(self):
+        last_login_buffer.flush()
+        super().setUp()
+
+    def login(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().post(
+                '/api/users/login/', {'email': 'ada@example.com', 'password': 'Passw0rd!'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        return [query['sql'] for query in queries]
+
+    def test_login_reads_the_user_once_and_writes_no_session_or_last_login(self):
+        queries = self.login()
+        self.assertEqual(len([sql for sql in queries if 'FROM "users_user"' in sql]), 1)
+        self.assertFalse([sql for sql in queries if 'django_session' in sql or sql.startswith('UPDATE')])
+        self.assertEqual(len([sql for sql in queries if 'token_blacklist_outstandingtoken' in sql]), 1)
+
+    @override_settings(LEAN_LOGIN_TRACK_OUTSTANDING_TOKENS=False)
+    def test_untracked_tokens_skip_the_outstanding_token_insert(self):
+        queries = self.login()
+        self.assertFalse([sql for sql in queries if 'token_blacklist_outstandingtoken' in sql])
+
+    @override_settings(LAST_LOGIN_FLUSH_INTERVAL=3600)
+    def test_last_login_is_written_after_a_request_once_the_interval_has_passed(self):
+        self.login()
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+
+        last_login_buffer._last_flush -= 3600
+        self.bearer_client().get('/api/users/profile/')
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    @override_settings(LAST_LOGIN_FLUSH_SIZE=2)
+    def test_last_logins_are_written_together_once_enough_are_pending(self):
+        other = make_admin('bob@example.com', 'Bob')
+        last_login_buffer.record(self.user)
+        self.assertIsNone(User.objects.get(pk=self.user.pk).last_login)
+        with CaptureQueriesContext(connection) as queries:
+            last_login_buffer.record(other)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(User.objects.filter(last_login__isnull=False).count(), 2)
+
+    def test_untracked_refresh_token_can_still_be_blacklisted(self):
+        refresh = RefreshToken.for_untracked_user(self.user)
+        self.assertFalse(OutstandingToken.objects.exists())
+        refresh.blacklist()
+        with self.assertRaises(TokenError):
+            RefreshToken(str(refresh))
+
+
+class AsyncAuthViewTests(UserTestCase):
+
+    def post(self, view, data):
+        request = APIRequestFactory().post('/', data, format='json')
+        return async_to_sync(view.as_view())(request)
+
+    def test_login(self):
+        response = self.post(AsyncLoginView, {'email': 'ada@example.com', 'password': 'Passw0rd!'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(RefreshToken(response.data['refresh'])['user_id'], self.user.pk)
+        self.assertFalse(response.data['user']['has_school'])
+        response = self.post(AsyncLoginView, {'email': 'ada@example.com', 'password': 'Wr0ng!pass'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_register_hashes_on_the_executor(self):
+        data = {'email': 'new@example.com', 'full_name': 'New User', 'role': 'admin',
+                'password': 'Passw0rd!', 'confirm_password': 'Passw0rd!'}
+        with mock.patch('users.views.send_verification_email') as send, \
+                mock.patch.object(hashing_executor, 'submit', wraps=hashing_executor.submit) as submit:
+            response = self.post(AsyncRegisterUserView, data)
+        self.assertEqual(response.status_code, 201, response.data)
+        send.assert_called_once()
+        submit.assert_called_once()
+        self.assertTrue(User.objects.get(email='new@example.com').check_password('Passw0rd!'))
+
+    def test_reset_password(self):
+        get_otp_store().issue(self.user, RESET_PASSWORD, '654321', ttl=60)
+        data = {'email': 'ada@example.com', 'otp': '654321', 'new_password': 'N3w!pass', 'confirm_password': 'N3w!pass'}
+        response = self.post(AsyncResetPasswordView, data)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('N3w!pass'))
+
+    def test_busy_executor_answers_503_before_sending_email(self):
+        data = {'email': 'new@example.com', 'full_name': 'New User', 'role': 'admin',
+                'password': 'Passw0rd!', 'confirm_password': 'Passw0rd!'}
+        with mock.patch.object(hashing_executor, 'submit', side_effect=HashingBusy), \
+                mock.patch('users.views.send_verification_email') as send:
+            response = self.post(AsyncRegisterUserView, data)
+            self.assertEqual(self.post(AsyncLoginView, {'email': 'ada@example.com', 'password': 'x'}).status_code, 503)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        send.assert_not_called()
+        self.assertFalse(User.objects.filter(email='new@example.com').exists())
+
+
+class ThrottleTests(UserTestCase):
+
+    def login(self, email='ada@example.com', ip='10.0.0.1'):
+        return APIClient().post(
+            '/api/users/login/', {'email': email, 'password': 'wrong'}, format='json', REMOTE_ADDR=ip
+        )
+
+    @throttle_rates(login_ip='2/min', login_email='100/min')
+    def test_ip_window(self):
+        self.assertNotEqual(self.login(email='a@example.com').status_code, 429)
+        self.assertNotEqual(self.login(email='b@example.com').status_code, 429)
+        throttled = self.login(email='c@example.com')
+        self.assertEqual(throttled.status_code, 429)
+        self.assertIn('Retry-After', throttled)
+        self.assertNotEqual(self.login(ip='10.0.0.2').status_code, 429)
+
+    @throttle_rates(login_ip='100/min', login_email='2/min')
+    def test_email_window_across_addresses(self):
+        self.login(ip='10.0.0.1')
+        self.login(ip='10.0.0.2')
+        self.assertEqual(self.login(email=' ADA@example.com', ip='10.0.0.3').status_code, 429)
+        self.assertNotEqual(self.login(email='other@example.com', ip='10.0.0.3').status_code, 429)
+
+    @throttle_rates(login_ip='2/min', login_email='2/min')
+    def test_only_the_ip_window_counts_rejected_requests(self):
+        start = 60 * 1000
+        with mock.patch('core.throttling.time.time', return_value=start):
+            for _ in range(5):
+                self.login(email=f'{_}@example.com', ip='10.0.0.1')
+                self.login(ip=f'10.0.1.{_}')
+        with mock.patch('core.throttling.time.time', return_value=start + 90):
+            # Half of the previous period's two accepted requests still count
+            self.assertNotEqual(self.login(ip='10.0.2.1').status_code, 429)
+            # but all five of the flooding client's do
+            self.assertEqual(self.login(email='new@example.com', ip='10.0.0.1').status_code, 429)
+
+    def test_previous_period_drains_linearly(self):
+        throttle = SlidingWindowThrottle()
+        throttle.capacity, throttle.period = 10, 60
+        throttle.previous, throttle.spent, throttle.elapsed = 10, 5, 0.25
+        # 10 * (1 - 0.5) + 5 fits again half way through the period
+        self.assertAlmostEqual(throttle.wait(), 15)
+        throttle.spent = 10
+        self.assertAlmostEqual(throttle.wait(), 45)
+
+
+class PurgeExpiredAuthDataTests(UserTestCase):
+
+    def code(self, minutes, is_used=False):
+        return EmailVerification.objects.create(
+            user=self.user, otp='123456', expires_at=timezone.now() + timedelta(minutes=minutes), is_used=is_used
+        )
+
+    def token(self, minutes, jti):
+        return OutstandingToken.objects.create(
+            user=self.user, jti=jti, token='token', expires_at=timezone.now() + timedelta(minutes=minutes)
+        )
+
+    def purge(self, **options):
+        stdout = io.StringIO()
+        call_command('purge_expired_auth_data', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_used_and_expired_codes_and_tokens_are_deleted_in_batches(self):
+        for _ in range(4):
+            self.code(-120)
+        self.code(30, is_used=True)
+        kept = [self.code(30), self.code(-30)]
+        BlacklistedToken.objects.create(token=self.token(-1, 'expired'))
+        live = self.token(60, 'live')
+        BlacklistedToken.objects.create(token=live)
+
+        output = self.purge(batch_size=2)
+        self.assertIn('EmailVerification: 5 rows deleted in 3 batches', output)
+        self.assertCountEqual(EmailVerification.objects.all(), kept)
+        self.assertEqual(list(OutstandingToken.objects.all()), [live])
+        self.assertEqual(BlacklistedToken.objects.get().token, live)
+
+    def test_interval_repeats_the_purge(self):
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) > 1:
+                raise KeyboardInterrupt
+            self.code(-120)
+
+        command = 'users.management.commands.purge_expired_auth_data'
+        self.code(-120)
+        with mock.patch(f'{command}.time.sleep', sleep), mock.patch(f'{command}.close_old_connections'), \
+                self.assertRaises(KeyboardInterrupt):
+            self.purge(interval=300)
+        self.assertEqual(sleeps, [300, 300])
+        self.assertFalse(EmailVerification.objects.exists())
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
@@ -9,8 +10,18 @@ from .views import (
     ForgotPasswordView,
     ResetPasswordView,
     LogoutAPIView,
+    AsyncRegisterUserView,
+    AsyncLoginView,
+    AsyncResetPasswordView,
 )
 
+# Under ASGI the async variants hash passwords on a bounded executor
+# instead of on a thread per request
+if settings.ASYNC_AUTH_VIEWS:
+    RegisterUserView, LoginView, ResetPasswordView = (
+        AsyncRegisterUserView, AsyncLoginView, AsyncResetPasswordView
+    )
+
 urlpatterns = [
     path('register/', RegisterUserView.as_view(), name='register'),
     path('verify/', VerifyEmailView.as_view(), name='verify-email'),
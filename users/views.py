@@ -13,7 +13,9 @@ from .serializers import (
     ForgotPasswordSerializer,
     ResetPasswordSerializer
 )
-from .models import User, EmailVerification, PasswordReset
+from .models import User
+from .otp import get_otp_store, VERIFY_EMAIL, RESET_PASSWORD
+from .login import aauthenticate_user, authenticate_user, complete_login
 from core.utils import generate_otp, send_verification_email, send_password_reset_email
 from django.utils import timezone
 from datetime import timedelta
@@ -23,6 +25,12 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.authentication import TokenAuthentication, SessionAuthentication
 from rest_framework.views import APIView
 from django.contrib.auth import logout
+from core.authentication import forget_user
+from core.throttling import IPSlidingWindowThrottle, EmailSlidingWindowThrottle
+from core.hashing import hashing_executor
+from core.views import AsyncAPIView
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
 
 
 
@@ -30,6 +38,8 @@ from django.contrib.auth import logout
 class RegisterUserView(generics.GenericAPIView):
     serializer_class = UserRegistrationSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [IPSlidingWindowThrottle, EmailSlidingWindowThrottle]
+    throttle_scope = 'email_code'
     
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
@@ -44,23 +54,28 @@ class RegisterUserView(generics.GenericAPIView):
                 # If email is sent successfully, save the user
                 user = serializer.save()
                 
-                # Create verification record
-                expires_at = timezone.now() + timedelta(hours=1)
-                EmailVerification.objects.create(user=user, otp=otp, expires_at=expires_at)
+                # Store the verification code
+                get_otp_store().issue(user, VERIFY_EMAIL, otp, ttl=60 * 60)
                 
-                return Response({
-                    "message": "User registered successfully. Please check your email for verification code.",
-                    "user": {
-                        "email": serializer.validated_data['email'],
-                        "full_name": serializer.validated_data['full_name']
-                    }
-                }, status=status.HTTP_201_CREATED)
+                return self.registered_response(serializer)
             except Exception as e:
-                return Response({
-                    "error": "Failed to send verification email. Please try again.",
-                    "details": str(e)
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                return self.email_failed_response(e)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def registered_response(self, serializer):
+        return Response({
+            "message": "User registered successfully. Please check your email for verification code.",
+            "user": {
+                "email": serializer.validated_data['email'],
+                "full_name": serializer.validated_data['full_name']
+            }
+        }, status=status.HTTP_201_CREATED)
+    
+    def email_failed_response(self, e):
+        return Response({
+            "error": "Failed to send verification email. Please try again.",
+            "details": str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
     
@@ -72,21 +87,16 @@ class VerifyEmailView(generics.GenericAPIView):
         serializer = self.serializer_class(data=request.data, context={'request': request})
         if serializer.is_valid():
             user = serializer.context['user']
-            verification = serializer.context['verification']
             
             # Mark user as verified
             user.is_verified = True
-            user.save()
+            user.save(update_fields=['is_verified'])
             
             # Mark verification as used
-            verification.is_used = True
-            verification.save()
+            get_otp_store().consume(user, VERIFY_EMAIL)
             
-            # Log in the user
-            login(request, user)
-            
-          # Generate tokens
-            refresh = RefreshToken.for_user(user)
+            # Log in the user and generate tokens
+            refresh = complete_login(request, user, session=True)
             
             return Response({
                 "message": "Email verified successfully. You are now logged in.",
@@ -106,6 +116,8 @@ class VerifyEmailView(generics.GenericAPIView):
 class ResendVerificationView(generics.GenericAPIView):
     serializer_class = ResendVerificationSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [IPSlidingWindowThrottle, EmailSlidingWindowThrottle]
+    throttle_scope = 'email_code'
     
     def post(self, request):
         serializer = self.serializer_class(data=request.data, context={'request': request})
@@ -119,9 +131,8 @@ class ResendVerificationView(generics.GenericAPIView):
                 # Try sending email first
                 send_verification_email(user.email, otp)
                 
-                # Create new verification record
-                expires_at = timezone.now() + timedelta(minutes=30)
-                EmailVerification.objects.create(user=user, otp=otp, expires_at=expires_at)
+                # Replace the verification code
+                get_otp_store().issue(user, VERIFY_EMAIL, otp, ttl=30 * 60)
                 
                 return Response({
                     "message": "Verification email resent successfully. Please check your email for the new verification code.",
@@ -137,6 +148,8 @@ class ResendVerificationView(generics.GenericAPIView):
 class LoginView(generics.GenericAPIView):
     serializer_class = UserLoginSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [IPSlidingWindowThrottle, EmailSlidingWindowThrottle]
+    throttle_scope = 'login'
     
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
@@ -144,7 +157,7 @@ class LoginView(generics.GenericAPIView):
             email = serializer.validated_data['email']
             password = serializer.validated_data['password']
             
-            user = authenticate(request, username=email, password=password)
+            user = authenticate_user(request, email, password)
             
             if user is None:
                 return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
@@ -152,21 +165,24 @@ class LoginView(generics.GenericAPIView):
             if not user.is_verified:
                 return Response({'error': 'Email not verified'}, status=status.HTTP_401_UNAUTHORIZED)
             
-            refresh = RefreshToken.for_user(user)
+            refresh = complete_login(request, user)
             
-            return Response({
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-                'user': {
-                    'id': user.custom_id,
-                    'email': user.email,
-                    'full_name': user.full_name,
-                    'role': user.role,
-                    'has_school': hasattr(user, 'school')
-                }
-            }, status=status.HTTP_200_OK)
+            return self.logged_in_response(user, refresh)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def logged_in_response(self, user, refresh):
+        return Response({
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            'user': {
+                'id': user.custom_id,
+                'email': user.email,
+                'full_name': user.full_name,
+                'role': user.role,
+                'has_school': hasattr(user, 'school')
+            }
+        }, status=status.HTTP_200_OK)
 
 
 class LogoutAPIView(APIView):
@@ -180,7 +196,8 @@ class LogoutAPIView(APIView):
         # For JWT Authentication with refresh token
         if 'refresh' in request.data:
             try:
-                from rest_framework_simplejwt.tokens import RefreshToken
+                # Checked against the Bloom filter; blacklisting updates it
+                from core.tokens import RefreshToken
                 refresh_token = request.data["refresh"]
                 token = RefreshToken(refresh_token)
                 token.blacklist()
@@ -190,8 +207,12 @@ class LogoutAPIView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
-        # For Session Authentication
-        logout(request)
+        # Drop the user from the cached authentication lookups
+        forget_user(request.user.pk)
+        
+        # For Session Authentication; API paths have no session (see core.middleware)
+        if hasattr(request, 'session'):
+            logout(request)
         
         # Force the client to delete the token by returning specific instructions
         response = Response(
@@ -217,6 +238,8 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 class ForgotPasswordView(generics.GenericAPIView):
     serializer_class = ForgotPasswordSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [IPSlidingWindowThrottle, EmailSlidingWindowThrottle]
+    throttle_scope = 'email_code'
     
     def post(self, request):
         serializer = self.serializer_class(data=request.data, context={'request': request})
@@ -230,13 +253,8 @@ class ForgotPasswordView(generics.GenericAPIView):
                 # Try sending email first
                 send_password_reset_email(user.email, otp) 
                 
-                # Create password reset record
-                expires_at = timezone.now() + timedelta(minutes=30)
-                PasswordReset.objects.create(
-                    user=user, 
-                    otp=otp, 
-                    expires_at=expires_at
-                )  # Store OTP instead of token
+                # Store the password reset code
+                get_otp_store().issue(user, RESET_PASSWORD, otp, ttl=30 * 60)
                 
                 return Response({
                     "message": "Password reset email sent successfully. Please check your email for the reset code.",
@@ -259,20 +277,92 @@ class ResetPasswordView(generics.GenericAPIView):
         serializer = self.serializer_class(data=request.data, context={'request': request})
         if serializer.is_valid():
             user = serializer.context['user']
-            reset = serializer.context['reset']
             
             # Update user password
             user.set_password(serializer.validated_data['new_password'])
             user.save()
             
             # Mark reset code as used
-            reset.is_used = True
-            reset.save()
+            get_otp_store().consume(user, RESET_PASSWORD)
             
-            return Response({
-                "message": "Password reset successfully. You can now login with your new password.",
-                "email": user.email
-            }, status=status.HTTP_200_OK)
+            return self.reset_response(user)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def reset_response(self, user):
+        return Response({
+            "message": "Password reset successfully. You can now login with your new password.",
+            "email": user.email
+        }, status=status.HTTP_200_OK)
+
+
+# Async variants of the endpoints that hash passwords (see ASYNC_AUTH_VIEWS).
+# Hashing runs on core.hashing.hashing_executor: bounded, and answering 503
+# when full, so a burst of logins can't stall the event loop or other requests.
+
+class AsyncRegisterUserView(AsyncAPIView, RegisterUserView):
+    
+    async def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        if await sync_to_async(serializer.is_valid)():
+            # Hash first: if the executor is busy, no email has gone out yet
+            password_hash = await hashing_executor.run(make_password, serializer.validated_data['password'])
+            try:
+                # Generate OTP
+                otp = generate_otp()
+                
+                # Try sending email first (no database, so off the sync thread)
+                await sync_to_async(send_verification_email, thread_sensitive=False)(
+                    serializer.validated_data['email'], otp
+                )
+                
+                # If email is sent successfully, save the user
+                user = await sync_to_async(serializer.save)(password_hash=password_hash)
+                
+                # Store the verification code
+                await sync_to_async(get_otp_store().issue)(user, VERIFY_EMAIL, otp, ttl=60 * 60)
+                
+                return self.registered_response(serializer)
+            except Exception as e:
+                return self.email_failed_response(e)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncLoginView(AsyncAPIView, LoginView):
     
+    async def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if serializer.is_valid():
+            email = serializer.validated_data['email']
+            password = serializer.validated_data['password']
+            
+            user = await aauthenticate_user(email, password)
+            
+            if user is None:
+                return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+            
+            if not user.is_verified:
+                return Response({'error': 'Email not verified'}, status=status.HTTP_401_UNAUTHORIZED)
+            
+            refresh = await sync_to_async(complete_login)(request, user)
+            
+            return self.logged_in_response(user, refresh)
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncResetPasswordView(AsyncAPIView, ResetPasswordView):
     
+    async def post(self, request):
+        serializer = self.serializer_class(data=request.data, context={'request': request})
+        if await sync_to_async(serializer.is_valid)():
+            user = serializer.context['user']
+            
+            # Update user password
+            user.password = await hashing_executor.run(make_password, serializer.validated_data['new_password'])
+            await user.asave()
+            
+            # Mark reset code as used
+            await sync_to_async(get_otp_store().consume)(user, RESET_PASSWORD)
+            
+            return self.reset_response(user)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)